@@ -0,0 +1,446 @@
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from workbench.projects.pga.data.html_parsers import PARSERS
+from workbench.projects.pga.data.feature_creator import (FeatureCreator,
+                                                         rolling_features)
+from workbench.projects.pga.data.synthetic import write_synthetic_tree
+
+
+BASE_DATA_PATH = os.path.join(os.getenv('DATA'), 'pydata', 'projects', 'pga')
+HISTORY_PATH = os.path.join(BASE_DATA_PATH, 'benchmarks', 'history.jsonl')
+
+SCALES = {
+    'tiny': dict(n_players=30, n_seasons=3, n_stats=3, n_tourns=3),
+    'small': dict(n_players=100, n_seasons=5, n_stats=10, n_tourns=5),
+    'medium': dict(n_players=400, n_seasons=10, n_stats=50, n_tourns=20),
+    'large': dict(n_players=1000, n_seasons=20, n_stats=200, n_tourns=45),
+}
+
+# Research / read path modules and the network, html parsing and compiler
+# dependencies they should not import until used
+READ_MODULES = ('workbench.projects.pga.data.data_reader',
+                'workbench.projects.pga.data.stat_downloader',
+                'workbench.projects.pga.data.event_downloader',
+                'workbench.projects.pga.data.feature_creator')
+HEAVY_MODULES = ('aiohttp', 'requests', 'gevent', 'bs4', 'lxml', 'numba',
+                 'pyarrow.dataset', 'http.server')
+
+
+def _timeit(func, *args, **kwargs):
+    start = time.perf_counter()
+    out = func(*args, **kwargs)
+    return time.perf_counter() - start, out
+
+
+def _best(func, repeat, *args, **kwargs):
+    '''
+    Return (min secs over repeat calls, output of the last call)
+    '''
+    times = []
+    for _ in range(repeat):
+        secs, out = _timeit(func, *args, **kwargs)
+        times.append(secs)
+    return min(times), out
+
+
+def _profile(func, *args, **kwargs):
+    '''
+    Return (secs, peak traced memory in MB, output) of a function call
+    '''
+    tracemalloc.start()
+    try:
+        secs, out = _timeit(func, *args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+    return secs, peak, out
+
+
+def list_html_files(html_base, max_files=None):
+    '''
+    Return html file paths under an html base directory
+    '''
+    html_paths = []
+    for label in sorted(os.listdir(html_base)):
+        label_dir = os.path.join(html_base, label)
+        for fl in sorted(os.listdir(label_dir)):
+            html_paths.append(os.path.join(label_dir, fl))
+    return html_paths[:max_files]
+
+
+def benchmark_parsers(html_paths, parse_keys, backends=('bs4', 'lxml')):
+    '''
+    Time each parser backend over a corpus of html files and check that
+        every backend returns the same result as the first one.
+    '''
+    results = {}
+    outputs = {}
+    for backend in backends:
+        parser = PARSERS[backend]
+
+        def run():
+            out = []
+            for html_path in html_paths:
+                page = parser['read'](html_path)
+                out.append([parser[k](page) for k in parse_keys])
+            return out
+        secs, outputs[backend] = _timeit(run)
+        results[backend] = dict(secs=secs, files=len(html_paths),
+                                files_per_sec=len(html_paths) / secs)
+    for backend in backends[1:]:
+        results[backend]['matches'] = outputs[backend] == outputs[backends[0]]
+        results[backend]['speedup'] = (results[backends[0]]['secs'] /
+                                       results[backend]['secs'])
+    return results
+
+
+def benchmark_build_stat_df(data_reader, stat_ids,
+                            sizes=(15, 50, 100, 200, 400), min_year=None):
+    '''
+    Time DataReader.build_stat_df for an increasing number of stats. Linear
+        scaling shows up as a roughly constant secs_per_stat.
+    '''
+    results = []
+    for n_stats in sizes:
+        if n_stats > len(stat_ids):
+            break
+        secs, out = _timeit(data_reader.build_stat_df, stat_ids[:n_stats],
+                            min_year=min_year)
+        results.append(dict(n_stats=n_stats, secs=secs,
+                            secs_per_stat=secs / n_stats,
+                            rows=out.shape[0], cols=out.shape[1]))
+    return results
+
+
+def benchmark_parallel_load(data_path, stat_ids, tourn_ids,
+                            worker_counts=(2, 4, 8, 16, 32), n_procs=None,
+                            min_year=None):
+    '''
+    Time build_stat_df / build_result_df serially and with each number of
+        loader threads (and n_procs csv processes), checking the parallel
+        outputs equal the serial ones. Near linear scaling shows up as a
+        speedup close to the worker count.
+    '''
+    from workbench.projects.pga.data.data_reader import DataReader
+
+    results = []
+    base = None
+    for n_workers in (None,) + tuple(worker_counts):
+        dr = DataReader(data_path, cache_max_bytes=None, n_workers=n_workers,
+                        n_procs=None if n_workers is None else n_procs)
+        s_secs, s_out = _timeit(dr.build_stat_df, stat_ids, min_year)
+        r_secs, r_out = _timeit(dr.build_result_df, tourn_ids, min_year)
+        dr.ids.close()
+        if base is None:
+            base = (s_secs, r_secs, s_out, r_out)
+        results.append(dict(n_workers=n_workers, n_procs=n_procs,
+                            stat_secs=s_secs, result_secs=r_secs,
+                            stat_speedup=base[0] / s_secs,
+                            result_speedup=base[1] / r_secs,
+                            matches=s_out.equals(base[2]) and
+                            r_out.equals(base[3])))
+    return results
+
+
+def benchmark_chunked(data_reader, stat_ids, tourn_ids,
+                      n_partitions=(1, 4, 16, 64), min_year=None,
+                      features=()):
+    '''
+    Time and peak memory of ChunkedBuilder.build for each partition count.
+        Peak memory should fall roughly with the partition size.
+    '''
+    results = []
+    for n_parts in n_partitions:
+        builder = data_reader.chunked(n_partitions=n_parts)
+        secs, peak, paths = _profile(builder.build, stat_ids, tourn_ids,
+                                     min_year=min_year, features=features)
+        rows = sum(len(x) for x in builder.iter_output(['year']))
+        results.append(dict(n_partitions=n_parts, secs=secs, peak_mb=peak,
+                            files=len(paths), rows=rows))
+        builder.clear()
+    return results
+
+
+def backfill_stats_pivot(inp_data, fill_columns):
+    '''
+    Previous DataReader.backfill_stats: pivot, pad and merge back one stat
+        column at a time. Kept as the benchmark reference.
+    '''
+    filled_data = inp_data.copy()
+    filled_data.drop(columns=fill_columns, inplace=True)
+    stats_data = inp_data[['player_name', 'year'] + fill_columns].copy()
+    for fc in fill_columns:
+        sdata = stats_data[['player_name', 'year', fc]].copy()
+        sdata.drop_duplicates(inplace=True)
+        piv_data = sdata.pivot(index='year', columns='player_name',
+                               values=fc)
+        piv_data.fillna(method='pad', inplace=True)
+        piv_data = piv_data.unstack()
+        piv_data.name = fc
+        piv_data = piv_data.reset_index()
+        filled_data = filled_data.merge(piv_data)
+    return filled_data
+
+
+def benchmark_backfill(data_reader, stat_data):
+    '''
+    Time and peak memory of the grouped backfill against the pivot / merge
+        version on a build_stat_df frame, and whether the filled values match
+        (rows the pivot version adds for years a player has no stats are
+        ignored).
+    '''
+    fill_columns = [x for x in stat_data.columns if x.find('rank_') == 0]
+    p_secs, p_mb, p_out = _profile(backfill_stats_pivot, stat_data,
+                                   fill_columns)
+    g_secs, g_mb, g_out = _profile(data_reader.backfill_stats, stat_data)
+    p_out = p_out.set_index(['player_name', 'year'])[fill_columns]
+    g_out = g_out.set_index(['player_name', 'year'])[fill_columns]
+    p_out = p_out.reindex(g_out.index).astype(np.float32)
+    matches = bool(((p_out.values == g_out.values) |
+                    (pd.isnull(p_out.values) &
+                     pd.isnull(g_out.values))).all())
+    return dict(n_stats=len(fill_columns), rows=len(stat_data),
+                pivot_secs=p_secs, pivot_peak_mb=p_mb,
+                grouped_secs=g_secs, grouped_peak_mb=g_mb, matches=matches)
+
+
+def compare_rolling_engines(inp_data, value_col, specs,
+                            group_cols=('player_name',)):
+    '''
+    Time the kernel and pandas rolling feature engines on the same data and
+        return the max absolute difference of each feature column.
+    '''
+    k_secs, k_feats = _timeit(rolling_features, inp_data, value_col, specs,
+                              group_cols, engine='kernel')
+    p_secs, p_feats = _timeit(rolling_features, inp_data, value_col, specs,
+                              group_cols, engine='pandas')
+    max_diff = {}
+    for col in p_feats.columns:
+        k_vals, p_vals = k_feats[col].values, p_feats[col].values
+        assert (np.isnan(k_vals) == np.isnan(p_vals)).all()
+        diff = np.abs(k_vals - p_vals)
+        max_diff[col] = np.nanmax(diff) if (~np.isnan(diff)).any() else 0.
+    return dict(kernel_secs=k_secs, pandas_secs=p_secs, max_diff=max_diff)
+
+
+def benchmark_suite(scale='small', work_dir=None, repeat=3):
+    '''
+    Time the ingest, load and feature paths end to end on a synthetic tree:
+        a fresh import of data_reader, process_html (stats and events),
+        load_csv for every stat and tournament, build_stat_df,
+        build_result_df, build_base_data, backfill_stats and
+        FeatureCreator.sample_build. scale is a key of
+        SCALES or a dict of write_synthetic_tree arguments. The tree is
+        written to a temporary directory unless work_dir is passed. Stages
+        after process_html report the best of repeat runs, with the build
+        cache off so every run reads the csvs.
+    '''
+    from workbench.projects.pga.data.data_reader import DataReader
+
+    params = SCALES[scale] if isinstance(scale, str) else dict(scale)
+    tmp_dir = None
+    if work_dir is None:
+        tmp_dir = work_dir = tempfile.mkdtemp(prefix='pga_bench_')
+    try:
+        tree = write_synthetic_tree(work_dir, write_csvs=False, **params)
+        dr = DataReader(work_dir, cache_max_bytes=None)
+        stat_ids, tourn_ids = tree['stat_ids'], tree['tourn_ids']
+        secs = {}
+        secs['import_data_reader'] = check_imports(READ_MODULES[:1])[
+            READ_MODULES[0]]['secs']
+        secs['process_html_stats'] = _timeit(
+            dr.stat_manager.process_html)[0]
+        secs['process_html_events'] = _timeit(
+            dr.result_manager.process_html)[0]
+        # Refresh meta and indexes now that the csvs exist
+        dr.stat_manager.prep_for_research()
+        dr.result_manager.prep_for_research()
+
+        def load_stats():
+            for s_id in stat_ids:
+                dr.stat_manager.load_csv(s_id, use_store=False)
+
+        def load_events():
+            for t_id in tourn_ids:
+                dr.result_manager.load_csv(t_id, use_store=False)
+        secs['load_csv_stats'] = _best(load_stats, repeat)[0]
+        secs['load_csv_events'] = _best(load_events, repeat)[0]
+        secs['build_stat_df'], stat_data = _best(dr.build_stat_df, repeat,
+                                                 stat_ids)
+        secs['build_result_df'], result_data = _best(dr.build_result_df,
+                                                     repeat, tourn_ids)
+        secs['build_base_data'], base_data = _best(
+            dr.build_base_data, repeat, stat_data, result_data)
+        secs['backfill_stats'] = _best(dr.backfill_stats, repeat,
+                                       stat_data)[0]
+
+        def features():
+            FeatureCreator(base_data.copy()).sample_build()
+        secs['feature_creator'] = _best(features, repeat)[0]
+        dr.ids.close()
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return dict(scale=scale if isinstance(scale, str) else 'custom',
+                params=params, rows=dict(stats=len(stat_data),
+                                         results=len(result_data),
+                                         base=len(base_data)),
+                secs=secs)
+
+
+def import_profile(module):
+    '''
+    Import a module in a fresh interpreter under python -X importtime.
+        Return dict of every module imported to its cumulative import secs.
+    '''
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                          'import {}'.format(module)],
+                         capture_output=True, text=True)
+    if out.returncode != 0:
+        raise ImportError(out.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in out.stderr.splitlines():
+        if line.find('import time:') != 0 or line.find('cumulative') > 0:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def check_imports(modules=READ_MODULES, heavy=HEAVY_MODULES):
+    '''
+    Import each read path module fresh and return dict of module to its
+        import secs and the heavy modules it pulled in (should be empty)
+    '''
+    results = {}
+    for module in modules:
+        times = import_profile(module)
+        results[module] = dict(secs=times[module],
+                               heavy=[m for m in heavy if m in times])
+    return results
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                             cwd=os.path.dirname(os.path.abspath(__file__)),
+                             capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def read_history(history_path=HISTORY_PATH, scale=None):
+    '''
+    Return recorded suite results, oldest first, optionally for one scale
+    '''
+    if not os.path.isfile(history_path):
+        return []
+    with open(history_path, 'r') as h_fl:
+        records = [json.loads(line) for line in h_fl if line.strip()]
+    if scale is not None:
+        records = [r for r in records if r['scale'] == scale]
+    return records
+
+
+def record_benchmarks(result, history_path=HISTORY_PATH):
+    '''
+    Append a benchmark_suite result to the json lines history, stamped with
+        the time, git revision and host so runs can be compared over time
+    '''
+    record = dict(result, timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                  revision=_git_revision(), host=socket.gethostname())
+    history_dir = os.path.dirname(history_path)
+    if history_dir and not os.path.exists(history_dir):
+        os.makedirs(history_dir)
+    with open(history_path, 'a') as h_fl:
+        h_fl.write(json.dumps(record, sort_keys=True) + '\n')
+    return record
+
+
+def check_regressions(result, history_path=HISTORY_PATH, tolerance=0.25,
+                      last_n=5):
+    '''
+    Compare each stage of a suite result with the median of the last_n
+        recorded runs at the same scale on this host. Return a dict of
+        stages slower than the median by more than tolerance (a fraction),
+        with (secs, median secs, ratio).
+    '''
+    records = [r for r in read_history(history_path, result['scale'])
+               if r.get('host') == socket.gethostname() and
+               r.get('params') == result['params']][-last_n:]
+    regressions = {}
+    for stage, secs in result['secs'].items():
+        prev = [r['secs'][stage] for r in records if stage in r['secs']]
+        if len(prev) == 0:
+            continue
+        median = float(np.median(prev))
+        if median > 0 and secs > median * (1 + tolerance):
+            regressions[stage] = (secs, median, secs / median)
+    return regressions
+
+
+def run_suite(scales=('small',), history_path=HISTORY_PATH, tolerance=0.25):
+    '''
+    Run benchmark_suite at each scale, report regressions against history
+        and record the results. Return the regressions by scale.
+    '''
+    out = {}
+    for scale in scales:
+        result = benchmark_suite(scale)
+        regressions = check_regressions(result, history_path, tolerance)
+        record_benchmarks(result, history_path)
+        print(scale, result['rows'])
+        for stage, secs in sorted(result['secs'].items()):
+            flag = ''
+            if stage in regressions:
+                flag = '  REGRESSION x{:.2f} vs median {:.3f}'.format(
+                    regressions[stage][2], regressions[stage][1])
+            print('  {:<22}{:>9.3f}s{}'.format(stage, secs, flag))
+        out[scale] = regressions
+    return out
+
+
+if __name__ == '__main__':
+    from workbench.projects.pga.data.data_reader import DataReader
+
+    if sys.argv[1:] == ['imports']:
+        # i.e. python benchmarks.py imports
+        results = check_imports()
+        for module, res in results.items():
+            print('{:<50}{:>7.3f}s  heavy: {}'.format(module, res['secs'],
+                                                     res['heavy']))
+        sys.exit(1 if any(r['heavy'] for r in results.values()) else 0)
+    elif len(sys.argv) > 1:
+        # i.e. python benchmarks.py small medium
+        regressions = run_suite(sys.argv[1:])
+        sys.exit(1 if any(regressions.values()) else 0)
+
+    stat_html = list_html_files(os.path.join(BASE_DATA_PATH, 'stats', 'html'),
+                                max_files=2000)
+    event_html = list_html_files(os.path.join(BASE_DATA_PATH, 'events',
+                                              'html'), max_files=2000)
+    print(benchmark_parsers(stat_html, ['stat_table']))
+    print(benchmark_parsers(event_html, ['event_table', 'event_meta']))
+
+    dr = DataReader()
+    stat_info = dr.get_stat_info()
+    stat_ids = stat_info.stat_id[stat_info.n_files.fillna(0) > 0].tolist()
+    for res in benchmark_build_stat_df(dr, stat_ids, min_year=1999):
+        print(res)
+    tourn_info = dr.get_tourn_info()
+    tourn_ids = tourn_info.tourn_id[tourn_info.n_files.fillna(0) > 0].tolist()
+    for res in benchmark_parallel_load(BASE_DATA_PATH, stat_ids, tourn_ids,
+                                       n_procs=8, min_year=1999):
+        print(res)
+    print(benchmark_backfill(dr, dr.build_stat_df(stat_ids, min_year=1999)))
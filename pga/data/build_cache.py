@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import pandas as pd
+
+from workbench.projects.pga.data.metrics import METRICS
+
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY,
+                                           func TEXT,
+                                           size INTEGER,
+                                           last_access REAL)''',
+]
+
+
+def fingerprint_paths(paths):
+    '''
+    Hash of (path, mtime, size) for a list of files. Missing files hash as
+        missing so a file appearing or disappearing also changes it.
+    '''
+    sha = hashlib.sha1()
+    for path in paths:
+        try:
+            st = os.stat(path)
+            sha.update('{}:{}:{}\n'.format(path, st.st_mtime_ns,
+                                           st.st_size).encode())
+        except FileNotFoundError:
+            sha.update('{}:missing\n'.format(path).encode())
+    return sha.hexdigest()
+
+
+def cache_key(func_name, ids, min_year, fingerprints, **kwargs):
+    '''
+    Content address of a build output: hash of the function, its arguments
+        and the fingerprints of the source files it reads
+    '''
+    desc = dict(func=func_name, ids=list(ids), min_year=min_year,
+                fingerprints=list(fingerprints), kwargs=kwargs)
+    return hashlib.sha1(json.dumps(desc, sort_keys=True,
+                                   default=str).encode()).hexdigest()
+
+
+class BuildCache(object):
+    """
+    Size bounded on disk cache of DataFrames keyed by cache_key. Entries are
+        parquet files tracked in an SQLite index and the least recently used
+        entries are evicted once the total size passes max_bytes. Since keys
+        include source fingerprints, changed csvs or meta files simply miss
+        and the stale entries age out. The cache directory is only created
+        once the first entry is put.
+    """
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, 'index.sqlite')
+        self._conn = None
+        self.counts = dict(hits=0, misses=0, puts=0, evictions=0)
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            self._conn = sqlite3.connect(self.index_path)
+            for stmt in SCHEMA:
+                self._conn.execute(stmt)
+            self._conn.commit()
+        return self._conn
+
+    def exists(self):
+        return self._conn is not None or os.path.isfile(self.index_path)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + '.parquet')
+
+    def get(self, key):
+        '''
+        Return the cached DataFrame for key or None
+        '''
+        path = self.entry_path(key)
+        row = None
+        if self.exists():
+            row = self.conn.execute('SELECT key FROM entries WHERE key = ?',
+                                    (key,)).fetchone()
+        if row is None or not os.path.isfile(path):
+            self.counts['misses'] += 1
+            METRICS.inc('build_cache_misses')
+            return None
+        self.conn.execute('UPDATE entries SET last_access = ? WHERE key = ?',
+                          (time.time(), key))
+        self.conn.commit()
+        self.counts['hits'] += 1
+        METRICS.inc('build_cache_hits')
+        return pd.read_parquet(path)
+
+    def put(self, key, data, func=None):
+        path = self.entry_path(key)
+        conn = self.conn
+        data.to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+        conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                     (key, func, os.path.getsize(path), time.time()))
+        conn.commit()
+        self.counts['puts'] += 1
+        self.evict()
+
+    def get_or_build(self, key, build_func, func=None):
+        data = self.get(key)
+        if data is None:
+            data = build_func()
+            self.put(key, data, func)
+        return data
+
+    def evict(self, max_bytes=None):
+        '''
+        Remove least recently used entries until the cache fits max_bytes
+        '''
+        if not self.exists():
+            return
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        rows = self.conn.execute('SELECT key, size FROM entries ORDER BY '
+                                 'last_access DESC').fetchall()
+        total = 0
+        for key, size in rows:
+            total += size
+            if total > max_bytes:
+                self._remove(key)
+                self.counts['evictions'] += 1
+        self.conn.commit()
+
+    def clear(self):
+        self.evict(0)
+
+    def stats(self):
+        '''
+        Return hit / miss counts for this session and current cache size
+        '''
+        n_entries, n_bytes = 0, 0
+        if self.exists():
+            n_entries, n_bytes = self.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) '
+                'FROM entries').fetchone()
+        out = dict(self.counts)
+        lookups = out['hits'] + out['misses']
+        out['hit_rate'] = out['hits'] / float(lookups) if lookups else None
+        out['entries'] = n_entries
+        out['bytes'] = n_bytes
+        out['max_bytes'] = self.max_bytes
+        return out
+
+    def _remove(self, key):
+        path = self.entry_path(key)
+        if os.path.isfile(path):
+            os.remove(path)
+        self.conn.execute('DELETE FROM entries WHERE key = ?', (key,))
@@ -0,0 +1,198 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from workbench.projects.pga.data.feature_creator import FeatureCreator
+from workbench.projects.pga.data.metrics import METRICS, timed
+
+
+class ChunkedBuilder(object):
+    """
+    Out of core base data / feature builds for full history panels. Stats
+        and results are loaded one id at a time and spilled to n_partitions
+        player partitions (player_id modulo n_partitions) as parquet files
+        under work_dir, so the full panel is never held in memory. Each
+        partition is then combined, as-of joined and featurized on its own
+        and streamed to out_dir. All rows of a player land in the same
+        partition so joins, backfills and rolling features match an in
+        memory build. Peak memory is bounded by the largest partition, i.e.
+
+            cb = dr.chunked(n_partitions=32)
+            cb.build(stat_ids, tourn_ids, min_year=1999,
+                     features=[([('mean', 5), ('max', 10)], False)])
+            for part_data in cb.iter_output():
+                ...
+    """
+    def __init__(self, reader, work_dir, n_partitions=16):
+        self.reader = reader
+        self.work_dir = work_dir
+        self.spill_base = os.path.join(work_dir, 'spill')
+        self.out_dir = os.path.join(work_dir, 'output')
+        self.n_partitions = n_partitions
+        self.stat_cols = []
+        self.spilled = dict(stats=[], results=[])
+
+    def partition_dir(self, kind, part):
+        return os.path.join(self.spill_base, kind, 'part={}'.format(part))
+
+    def output_paths(self):
+        if not os.path.exists(self.out_dir):
+            return []
+        return [os.path.join(self.out_dir, x) for x in
+                sorted(os.listdir(self.out_dir)) if x.endswith('.parquet')]
+
+    def clear(self):
+        '''
+        Remove the spill and output directories. Anything else in work_dir
+            is left alone.
+        '''
+        for path in [self.spill_base, self.out_dir]:
+            shutil.rmtree(path, ignore_errors=True)
+        self.stat_cols = []
+        self.spilled = dict(stats=[], results=[])
+
+    #########################################################
+
+    @timed('chunked_spill_stats')
+    def spill_stats(self, stat_ids, min_year=None, drop_prev_cols=True):
+        '''
+        Load each stat and write its rows to the player partitions
+        '''
+        for s_id in tqdm(stat_ids):
+            sdata = self.reader.load_stat(s_id, min_year,
+                                          drop_prev_cols).reset_index()
+            self.stat_cols += [x for x in sdata.columns
+                               if x not in ('player_id', 'year')]
+            self._spill('stats', s_id, sdata)
+
+    @timed('chunked_spill_results')
+    def spill_results(self, tourn_ids, min_year=None):
+        '''
+        Load each tournament and write its rows to the player partitions
+        '''
+        for t_id in tqdm(tourn_ids):
+            rdata = self.reader.load_result(t_id, min_year)
+            rdata['player_id'] = self.reader.ids.player_ids(
+                rdata.player_name.values)
+            self._spill('results', t_id, rdata)
+
+    @timed('chunked_build_partition')
+    def build_partition(self, part, backfill_stats=False, features=(),
+                        max_gap=None):
+        '''
+        Join the spilled stats and results of one partition as of each
+            event and add rolling features for a list of (specs, by_tourn)
+            as in FeatureCreator.rolling_performance. Return None if the
+            partition has no stats or results.
+        '''
+        stat_frames = self._read_spill('stats', part)
+        result_frames = self._read_spill('results', part)
+        if len(stat_frames) == 0 or len(result_frames) == 0:
+            return
+        stat_data = self.reader.combine_stats(
+            [x.set_index(['player_id', 'year']) for x in stat_frames])
+        # Stats with no players in this partition still get their columns
+        for col in self.stat_cols:
+            if col not in stat_data.columns:
+                stat_data[col] = np.float32(np.nan)
+        stat_data = stat_data[['player_name', 'player_id', 'year'] +
+                              self.stat_cols]
+        result_data = self.reader.combine_results(
+            [x.drop(columns='player_id') for x in result_frames])
+        base_data = self.reader.join_base_data(stat_data, result_data,
+                                               backfill_stats, max_gap)
+        if len(features) > 0 and len(base_data) > 0:
+            fc = FeatureCreator(base_data)
+            for specs, by_tourn in features:
+                fc.rolling_performance(list(specs), by_tourn=by_tourn)
+            base_data = fc.data
+        return base_data
+
+    def build(self, stat_ids, tourn_ids, min_year=None, drop_prev_cols=True,
+              backfill_stats=False, features=(), keep_spill=False,
+              max_gap=None):
+        '''
+        Spill, then build and write each partition in turn to
+            out_dir/part=<n>.parquet. Only one partition is in memory at a
+            time. Return the output paths.
+        '''
+        self.clear()
+        self.spill_stats(stat_ids, min_year, drop_prev_cols)
+        self.spill_results(tourn_ids, min_year)
+        os.makedirs(self.out_dir, exist_ok=True)
+        for part in tqdm(range(self.n_partitions)):
+            base_data = self.build_partition(part, backfill_stats, features,
+                                             max_gap)
+            if base_data is None:
+                continue
+            out_path = os.path.join(self.out_dir,
+                                    'part={:05d}.parquet'.format(part))
+            base_data.to_parquet(out_path + '.tmp', index=False)
+            os.replace(out_path + '.tmp', out_path)
+            METRICS.inc('rows_built', len(base_data), frame='chunked')
+            del base_data
+        if not keep_spill:
+            shutil.rmtree(self.spill_base, ignore_errors=True)
+        return self.output_paths()
+
+    def iter_output(self, columns=None):
+        '''
+        Yield the built partitions one at a time
+        '''
+        for out_path in self.output_paths():
+            yield pd.read_parquet(out_path, columns=columns)
+
+    def collect(self, columns=None):
+        '''
+        Concatenate all built partitions, for outputs that fit in memory.
+            Rows are sorted as build_base_data sorts them.
+        '''
+        out = pd.concat(list(self.iter_output(columns)), ignore_index=True,
+                        sort=False)
+        if 'player_name' in out.columns and 'player_id' in out.columns:
+            out['player_name'] = self.reader.ids.name_categorical(
+                out.player_id.values)
+            out = out.sort_values(['player_name', 'year', 'end_date'],
+                                  kind='stable')
+        if 'tourn_id' in out.columns:
+            out['tourn_id'] = out.tourn_id.astype(str).astype('category')
+        return out.reset_index(drop=True)
+
+    #########################################################
+
+    def _spill(self, kind, item_id, data):
+        parts = data.player_id.values % self.n_partitions
+        for part in np.unique(parts):
+            part_dir = self.partition_dir(kind, part)
+            if not os.path.exists(part_dir):
+                os.makedirs(part_dir)
+            data[parts == part].to_parquet(
+                os.path.join(part_dir, '{}.parquet'.format(item_id)),
+                index=False)
+        self.spilled[kind].append(item_id)
+        METRICS.inc('rows_spilled', len(data), kind=kind)
+
+    def _read_spill(self, kind, part):
+        '''
+        Read a partition's spill files in the order the ids were spilled
+        '''
+        part_dir = self.partition_dir(kind, part)
+        spill_paths = [os.path.join(part_dir, '{}.parquet'.format(x))
+                       for x in self.spilled[kind]]
+        return [pd.read_parquet(x) for x in spill_paths if os.path.isfile(x)]
+
+
+if __name__ == '__main__':
+    from workbench.projects.pga.data.data_reader import DataReader
+
+    dr = DataReader()
+    stat_info = dr.get_stat_info()
+    tourn_info = dr.get_tourn_info()
+    cb = dr.chunked(n_partitions=32)
+    print(cb.build(
+        stat_info.stat_id[stat_info.n_files.fillna(0) > 0].tolist(),
+        tourn_info.tourn_id[tourn_info.n_files.fillna(0) > 0].tolist(),
+        min_year=1999, backfill_stats=True,
+        features=[([('mean', 5), ('max', 10), ('ewm', 10)], False)]))
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import random
+import asyncio
+import aiohttp
+from urllib.parse import urlparse
+
+from workbench.projects.pga.data.metrics import METRICS
+
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def write_atomic(path, content):
+    '''
+    Write bytes to a temp file next to path and rename it into place so
+        an interrupted write never leaves a truncated file behind.
+    '''
+    tmp_path = path + '.part'
+    with open(tmp_path, 'wb') as t_fl:
+        t_fl.write(content)
+    os.replace(tmp_path, path)
+
+
+class TokenBucket(object):
+    """
+    Token bucket rate limiter for a single host. Tokens refill at rate per
+        second up to capacity and each request consumes one token.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens +
+                                  (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class JobQueue(object):
+    """
+    Persisted queue of (url, file_path) download jobs. Pending jobs are
+        written to a json file so an interrupted crawl resumes where it
+        stopped. Finished jobs are flushed in batches.
+    """
+    def __init__(self, queue_path=None, flush_every=50):
+        self.queue_path = queue_path
+        self.flush_every = flush_every
+        self.jobs = {}
+        self._n_unflushed = 0
+        if queue_path and os.path.exists(queue_path):
+            with open(queue_path, 'r') as q_fl:
+                self.jobs = dict(json.load(q_fl))
+
+    def add(self, jobs):
+        for url, file_path in jobs:
+            self.jobs[url] = file_path
+        self.flush()
+
+    def pending(self):
+        return list(self.jobs.items())
+
+    def mark_done(self, url):
+        self.jobs.pop(url, None)
+        self._n_unflushed += 1
+        if self._n_unflushed >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self._n_unflushed = 0
+        if self.queue_path is None:
+            return
+        if len(self.jobs) == 0:
+            if os.path.exists(self.queue_path):
+                os.remove(self.queue_path)
+            return
+        content = json.dumps(sorted(self.jobs.items())).encode('utf-8')
+        write_atomic(self.queue_path, content)
+
+
+class Crawler(object):
+    """
+    Asyncio page fetcher shared by the stat and event downloaders. Uses a
+        single pooled http session, a global concurrency limit, per-host
+        token bucket rate limiting and retries with exponential backoff.
+        Downloads are written atomically and tracked in a persisted queue.
+        If an HttpCache is passed existing files are revalidated with
+        conditional GETs and only rewritten when their content changes.
+    """
+    def __init__(self, queue_path=None, cache=None, max_concurrency=16,
+                 host_rate=8., max_retries=4, backoff=0.5, timeout=30):
+        self.queue = JobQueue(queue_path)
+        self.cache = cache
+        self.changed = []
+        self.max_concurrency = max_concurrency
+        self.host_rate = host_rate
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+    def fetch_pages(self, urls):
+        '''
+        Fetch a list of urls and return dict of url -> page text. Pages
+            that fail after all retries are None.
+        '''
+        return asyncio.run(self._fetch_all(urls))
+
+    def download(self, jobs=()):
+        '''
+        Add (url, file_path) jobs to the persisted queue and download every
+            pending job, including any left over from an interrupted run.
+            Return list of urls that failed.
+        '''
+        self.queue.add(jobs)
+        return asyncio.run(self._download_all(self.queue.pending()))
+
+    def resume(self):
+        return self.download()
+
+    def open_session(self):
+        '''
+        Pooled aiohttp session for callers running their own event loop
+            with fetch (i.e. the streaming ingest pipeline)
+        '''
+        return self._setup()
+
+    async def fetch(self, session, url, headers=None):
+        return await self._fetch(session, url, headers)
+
+    #########################################################
+
+    def _setup(self):
+        self._buckets = {}
+        self._gone = set()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    def _bucket(self, url):
+        host = urlparse(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.host_rate)
+        return self._buckets[host]
+
+    async def _fetch_all(self, urls):
+        async with self._setup() as session:
+            pages = await asyncio.gather(*[self._fetch(session, u)
+                                           for u in urls])
+        return {u: (p[1].decode('utf-8', 'replace') if p is not None else
+                    None) for u, p in zip(urls, pages)}
+
+    async def _download_all(self, jobs):
+        async with self._setup() as session:
+            done = await asyncio.gather(*[self._download(session, u, p)
+                                          for u, p in jobs])
+        self.queue.flush()
+        if self.cache is not None:
+            self.cache.save()
+        return [u for (u, _), ok in zip(jobs, done) if not ok]
+
+    async def _download(self, session, url, file_path):
+        headers = None
+        exists = os.path.isfile(file_path)
+        if self.cache is not None and exists:
+            headers = self.cache.conditional_headers(url)
+        resp = await self._fetch(session, url, headers)
+        if resp is None:
+            # Drop pages that do not exist, keep transient failures queued
+            if url in self._gone:
+                self.queue.mark_done(url)
+            return False
+        (status, content, resp_headers) = resp
+        if self.cache is not None:
+            unchanged = (status == 304 or
+                         (exists and self.cache.is_unchanged(url, content)))
+            if unchanged:
+                METRICS.inc('pages_unchanged')
+                self.queue.mark_done(url)
+                return True
+            self.cache.update(url, content, resp_headers)
+        dir_path = os.path.dirname(file_path)
+        if dir_path and not os.path.exists(dir_path):
+            os.makedirs(dir_path, exist_ok=True)
+        write_atomic(file_path, content)
+        METRICS.inc('pages_written')
+        self.changed.append(file_path)
+        self.queue.mark_done(url)
+        return True
+
+    async def _fetch(self, session, url, headers=None):
+        '''
+        Return (status, content, response headers) or None if the page
+            could not be fetched
+        '''
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                await self._bucket(url).acquire()
+                start = time.perf_counter()
+                try:
+                    async with session.get(url, headers=headers) as resp:
+                        if resp.status not in RETRY_STATUS:
+                            if resp.status >= 400:
+                                self._gone.add(url)
+                                METRICS.inc('fetch_failures', status='gone')
+                                return
+                            content = await resp.read()
+                            METRICS.observe('fetch_seconds',
+                                            time.perf_counter() - start)
+                            METRICS.inc('pages_fetched')
+                            METRICS.inc('bytes_fetched', len(content))
+                            return (resp.status, content, resp.headers)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+            if attempt < self.max_retries:
+                METRICS.inc('fetch_retries')
+                delay = self.backoff * 2 ** attempt
+                await asyncio.sleep(delay + random.uniform(0, delay))
+        METRICS.inc('fetch_failures', status='retries_exhausted')
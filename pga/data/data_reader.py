@@ -1,33 +1,203 @@
 import os
 import numpy as np
 import pandas as pd
-from tqdm import tqdm
 
 from workbench.projects.pga.data.stat_downloader import StatDownloader
 from workbench.projects.pga.data.event_downloader import EventDownloader
+from workbench.projects.pga.data.build_cache import (BuildCache, cache_key,
+                                                     fingerprint_paths)
+from workbench.projects.pga.data.chunked import ChunkedBuilder
+from workbench.projects.pga.data.id_dictionary import IdDictionary, player_key
+from workbench.projects.pga.data.metrics import METRICS, timed
+from workbench.projects.pga.data.parallel import (run_threaded,
+                                                  start_process_pool)
+from workbench.projects.pga.data.query import Query
+from workbench.projects.pga.data.stat_tensor import (StatTensor,
+                                                     write_stat_tensor)
 
 
 BASE_DATA_PATH = os.path.join(os.getenv('DATA'), 'pydata', 'projects', 'pga')
+STAT_COLS = ['PLAYER NAME', 'year', 'RANK THIS WEEK', 'RANK LAST WEEK']
+RESULT_COL_MAP = {'PLAYER': 'player_name', 'POS': 'result',
+                  'POS_pct': 'result_pct', 'TOTALSCORE': 'score',
+                  'year': 'year', 'date': 'end_date', 'course': 'course_name',
+                  'par': 'course_par', 'event_id': 'event_id',
+                  'tourn_id': 'tourn_id'}
+# Days a stat snapshot stays current by default in the as-of join
+SEASON_DAYS = 365
+RESULT_COLS = ['player_name', 'event_id', 'tourn_id', 'result', 'result_pct',
+               'year', 'end_date']
+
+
+def stat_snapshot_dates(stat_data):
+    '''
+    Date each stat row became available. Uses a snapshot_date column if
+        present (i.e. weekly snapshots), otherwise yearly stats are taken
+        as final at the end of their year.
+    '''
+    if 'snapshot_date' in stat_data.columns:
+        return pd.to_datetime(stat_data.snapshot_date)
+    return pd.to_datetime(stat_data.year.astype(int).astype(str) + '-12-31')
+
+
+def asof_join_stats(result_data, stat_data, fill_forward=False,
+                    max_gap=None):
+    '''
+    Attach to each result row the latest stat snapshot available strictly
+        before the event end_date. If fill_forward, null stats in a
+        snapshot are filled from the player's earlier snapshots, across all
+        rank columns in one grouped pass. max_gap is how many seasons
+        (SEASON_DAYS) a stat value may predate the event, by default one
+        season, or no limit with fill_forward. Inputs are not modified.
+    '''
+    if max_gap is None and not fill_forward:
+        max_gap = 1
+    key = player_key(result_data, stat_data)
+    rank_cols = [x for x in stat_data.columns if x.find('rank_') == 0]
+    stats = stat_data[[key] + rank_cols].copy()
+    stats['_snapshot'] = stat_snapshot_dates(stat_data).values
+    stats.sort_values([key, '_snapshot'], inplace=True)
+    src_cols = []
+    if fill_forward:
+        if max_gap is not None:
+            # Date each filled value was actually observed
+            src_cols = ['_src_' + x for x in rank_cols]
+            snaps = stats['_snapshot'].values.astype('datetime64[ns]')
+            for col, src_col in zip(rank_cols, src_cols):
+                stats[src_col] = np.where(stats[col].notna(), snaps,
+                                          np.datetime64('NaT'))
+        fill_cols = rank_cols + src_cols
+        stats[fill_cols] = stats.groupby(key)[fill_cols].ffill()
+    stats.sort_values('_snapshot', kind='stable', inplace=True)
+
+    results = result_data.copy()
+    results['_end'] = pd.to_datetime(results.end_date)
+    results.sort_values('_end', kind='stable', inplace=True)
+    tolerance = None
+    if max_gap is not None:
+        tolerance = pd.Timedelta(days=SEASON_DAYS * max_gap)
+    out = pd.merge_asof(results, stats, left_on='_end', right_on='_snapshot',
+                        by=key, allow_exact_matches=False,
+                        tolerance=None if fill_forward else tolerance)
+    for col, src_col in zip(rank_cols, src_cols):
+        out[col] = out[col].mask(out._end - out[src_col] > tolerance)
+    return out.drop(columns=['_end', '_snapshot'] + src_cols)
 
 
 class DataReader(object):
-    """docstring for data_reader"""
-    def __init__(self, data_path=BASE_DATA_PATH):
+    """
+    Builds stat, result and base data frames. Players and tournaments are
+        encoded through a persistent IdDictionary: frames carry int32
+        player_id / tourn_key columns (used for joins) and categorical
+        player_name / tourn_id columns. Use to_output to get plain strings.
+        build_stat_df / build_result_df outputs are kept in an on disk
+        BuildCache (pass cache_max_bytes=None to disable).
+
+        The id dictionary, build cache, stat tensors and chunked builds are
+        written under cache_path (defaults to data_path), so data_path can
+        be a read-only mount. Nothing is created there until the id
+        dictionary is first used or a build is cached.
+
+        build_* load ids across n_workers threads when set (store and csv
+        reads release the GIL) and read / normalize csv files across
+        n_procs processes when set. Ids are encoded on the calling thread
+        in id order, so the output is the same as a serial build.
+    """
+    def __init__(self, data_path=BASE_DATA_PATH,
+                 cache_max_bytes=2 * 1024 ** 3, n_workers=None, n_procs=None,
+                 cache_path=None):
+        self.n_workers = n_workers
+        self.n_procs = n_procs
+        self.cache_path = cache_path or data_path
+        self.build_cache = None
+        if cache_max_bytes is not None:
+            self.build_cache = BuildCache(os.path.join(self.cache_path,
+                                                       'build_cache'),
+                                          cache_max_bytes)
+        self.tensor_dir = os.path.join(self.cache_path, 'tensors', 'stats')
+        self.chunk_dir = os.path.join(self.cache_path, 'chunked')
+        self.query_cache = {}
+        self.query_sources = {}
+        self._ids = None
         self.stat_manager = StatDownloader(os.path.join(data_path, 'stats'),
                                            research=True)
         self.result_manager = EventDownloader(os.path.join(data_path,
                                                            'events'),
                                               research=True)
 
+    @property
+    def ids(self):
+        if self._ids is None:
+            if not os.path.exists(self.cache_path):
+                os.makedirs(self.cache_path)
+            self._ids = IdDictionary(os.path.join(self.cache_path,
+                                                  'id_dictionary.sqlite'))
+        return self._ids
+
     def get_tourn_info(self):
         return self.result_manager.tourn_meta_df
 
     def get_event_info(self):
         return self.result_manager.event_meta_df
 
+    def get_event(self, tourn_id, year):
+        return self.result_manager.get_event(tourn_id, year)
+
     def get_stat_info(self):
         return self.stat_manager.stat_meta_df
 
+    def to_output(self, inp_data):
+        return self.ids.decode(inp_data)
+
+    def cache_stats(self):
+        return None if self.build_cache is None else self.build_cache.stats()
+
+    def _cached_build(self, func_name, ids, min_year, manager, build_func,
+                      **kwargs):
+        '''
+        Return build_func() through the build cache, keyed on the function,
+            its arguments, fingerprints of the source files of each id and
+            the id dictionary version (aliases change player ids)
+        '''
+        if self.build_cache is None:
+            return build_func()
+        fingerprints = [fingerprint_paths(manager.source_paths(x))
+                        for x in ids]
+        key = cache_key(func_name, ids, min_year, fingerprints,
+                        id_version=self.ids.version(), **kwargs)
+        return self.build_cache.get_or_build(key, build_func, func_name)
+
+    def _load_all(self, loader, ids, *args):
+        '''
+        Return [loader(id, *args, pool=pool)] in id order, across the thread
+            pool and with csv files parsed in the process pool if configured
+        '''
+        pool = None if self.n_procs is None else \
+            start_process_pool(self.n_procs)
+        try:
+            return run_threaded(lambda x: loader(x, *args, pool=pool), ids,
+                                self.n_workers)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    def load_result(self, tourn_id, min_year=None, pool=None):
+        '''
+        Load one tournament renamed to result columns. Only the needed
+            columns are read from the store.
+        '''
+        tdata = self.result_manager.load_csv(tourn_id, min_year=min_year,
+                                             columns=list(RESULT_COL_MAP),
+                                             pool=pool)
+        if not set(RESULT_COL_MAP.keys()).issubset(set(tdata.columns)):
+            raise KeyError('Expected cols not available in tourn df')
+        return tdata.rename(columns=RESULT_COL_MAP)[RESULT_COLS]
+
+    def combine_results(self, frames):
+        out = pd.concat(frames, ignore_index=True, sort=False)
+        return self.ids.encode(out[RESULT_COLS].copy())
+
+    @timed('build_result_df')
     def build_result_df(self, tourn_ids, min_year=None):
         '''
         Load a list of tournament data and filter to a minimum year.  Rename
@@ -36,54 +206,133 @@ class DataReader(object):
         if isinstance(tourn_ids, (float, int, str)):
             tourn_ids = [str(tourn_ids)]
 
-        col_map = {'PLAYER': 'player_name', 'POS': 'result',
-                   'POS_pct': 'result_pct', 'TOTALSCORE': 'score',
-                   'year': 'year', 'date': 'end_date', 'course': 'course_name',
-                   'par': 'course_par'}
-        out = pd.DataFrame([])
-        for t_id in tqdm(tourn_ids):
-            tdata = self.result_manager.load_csv(t_id, min_year=min_year)
-            if not set(col_map.keys()).issubset(set(tdata.columns)):
-                raise KeyError('Expected cols not available in tourn df')
-            tdata.rename(columns=col_map, inplace=True)
-            out = out.append(tdata, ignore_index=True, sort=False)
-
-        out = out[['player_name', 'event_id', 'tourn_id', 'result',
-                   'result_pct', 'year', 'end_date']]
+        def build():
+            return self.combine_results(self._load_all(self.load_result,
+                                                       tourn_ids, min_year))
+        out = self._cached_build('build_result_df', tourn_ids, min_year,
+                                 self.result_manager, build)
+        METRICS.inc('rows_built', len(out), frame='result')
         self.result_data = out
         return out
 
+    def load_stat(self, stat_id, min_year=None, drop_prev_cols=True):
+        '''
+        Load one stat as rank_<id> (and prev_rank_<id>) columns indexed on
+            (player_id, year). Only the needed columns are read from the
+            store.
+        '''
+        return self.encode_stat(self.read_stat(stat_id, min_year,
+                                               drop_prev_cols))
+
+    def read_stat(self, stat_id, min_year=None, drop_prev_cols=True,
+                  pool=None):
+        '''
+        Load one stat renamed to rank columns, with player names not yet
+            encoded, so it is safe to call from worker threads
+        '''
+        col_map = {'RANK THIS WEEK': 'rank_{}'.format(stat_id),
+                   'RANK LAST WEEK': 'prev_rank_{}'.format(stat_id)}
+        sdata = self.stat_manager.load_csv(stat_id, min_year=min_year,
+                                           columns=STAT_COLS, pool=pool)
+        if not set(STAT_COLS).issubset(set(sdata.columns)):
+            raise KeyError('Expected cols not available in stat df')
+        sdata = sdata[STAT_COLS].rename(columns=col_map)
+        if drop_prev_cols:
+            sdata = sdata.drop(columns=col_map['RANK LAST WEEK'])
+        return sdata
+
+    def encode_stat(self, sdata):
+        '''
+        Index a read_stat frame on (player_id, year). Runs on the thread
+            that owns the id dictionary. Spellings that encode to the same
+            player (aliases or name normalization) can leave a player twice
+            in a year, in which case the best rank is kept.
+        '''
+        sdata['player_id'] = self.ids.player_ids(sdata['PLAYER NAME'].values)
+        sdata = sdata.drop(columns='PLAYER NAME')
+        rank_col = [x for x in sdata.columns if x.find('rank_') == 0][0]
+        sdata = sdata.sort_values(rank_col, kind='stable', na_position='last')
+        sdata = sdata.drop_duplicates(['player_id', 'year']).sort_index()
+        return sdata.set_index(['player_id', 'year'])
+
+    def combine_stats(self, frames):
+        '''
+        Outer join load_stat frames on (player_id, year) in a single concat
+        '''
+        out = pd.concat(frames, axis=1, join='outer', sort=False)
+        out = out.sort_index().reset_index()
+        out['player_id'] = out.player_id.astype(np.int32)
+        rank_cols = [x for x in out.columns if x.find('rank_') >= 0]
+        out[rank_cols] = out[rank_cols].astype(np.float32)
+        out.insert(0, 'player_name', self.ids.name_categorical(
+            out.player_id.values))
+        out = out.sort_values(['player_name', 'year'], kind='stable')
+        return out.reset_index(drop=True)
+
+    @timed('build_stat_df')
     def build_stat_df(self, stat_ids, min_year=None, drop_prev_cols=True):
         '''
         Load a list of stat data and filter to a minimum year. Join stats
-            along column axis outer joining on player name and year.
+            along column axis outer joining on player name and year. Each
+            stat is indexed on (player_id, year) and all are joined in a
+            single concat.
         '''
         if isinstance(stat_ids, (float, int, str)):
             stat_ids = [str(stat_ids)]
 
-        col_map = {'PLAYER NAME': 'player_name'}
-        out = pd.DataFrame([], columns=['player_name', 'year'])
-        for s_id in tqdm(stat_ids):
-            col_map['RANK THIS WEEK'] = 'rank_{}'.format(s_id)
-            col_map['RANK LAST WEEK'] = 'prev_rank_{}'.format(s_id)
-            sdata = self.stat_manager.load_csv(s_id, min_year=min_year)
-            if not set(col_map.keys()).issubset(set(sdata.columns)):
-                raise KeyError('Expected cols not available in tourn df')
-            sdata = sdata[['PLAYER NAME', 'year', 'RANK THIS WEEK',
-                           'RANK LAST WEEK']]
-            sdata.rename(columns=col_map, inplace=True)
-            out = out.merge(sdata, on=['player_name', 'year'], how='outer')
-        if drop_prev_cols:
-            drop_cols = [x for x in out.columns if x.find('prev_rank') == 0]
-            out.drop(columns=drop_cols, inplace=True)
+        def build():
+            frames = self._load_all(self.read_stat, stat_ids, min_year,
+                                    drop_prev_cols)
+            return self.combine_stats([self.encode_stat(x) for x in frames])
+        out = self._cached_build('build_stat_df', stat_ids, min_year,
+                                 self.stat_manager, build,
+                                 drop_prev_cols=drop_prev_cols)
+        METRICS.inc('rows_built', len(out), frame='stat')
         self.stat_data = out
         return out
 
+    def query(self):
+        '''
+        Start a lazy Query over this reader, i.e.
+            dr.query().stats(ids).events(ids).since(2000).collect()
+        '''
+        return Query(self)
+
+    def clear_query_cache(self):
+        self.query_cache.clear()
+
+    def chunked(self, work_dir=None, n_partitions=16):
+        '''
+        Out of core builder for panels too large to join in memory, see
+            ChunkedBuilder
+        '''
+        return ChunkedBuilder(self, work_dir or self.chunk_dir, n_partitions)
+
+    def export_stat_tensor(self, stat_data=None, tensor_dir=None):
+        '''
+        Write stat data (default the last build_stat_df) as a memory mapped
+            float32 player x season x stat tensor for model training
+        '''
+        if stat_data is None:
+            if not hasattr(self, 'stat_data'):
+                raise ValueError('No stat data available')
+            stat_data = self.stat_data
+        return write_stat_tensor(stat_data, tensor_dir or self.tensor_dir)
+
+    def load_stat_tensor(self, tensor_dir=None):
+        return StatTensor(tensor_dir or self.tensor_dir)
+
+    @timed('build_base_data')
     def build_base_data(self, stat_data=None, result_data=None,
-                        backfill_stats=False):
+                        backfill_stats=False, max_gap=None):
         '''
         Combine stat and result data to produce a base data df that will
-            be used as basic of feature creation and modeling.
+            be used as basic of feature creation and modeling. Each result
+            is joined as-of its end_date to the latest stats available
+            before the event, so no stats from the event's own season
+            leak in. backfill_stats fills missing stats from the player's
+            earlier snapshots. max_gap is how many seasons old stats may be
+            (default one season, or no limit with backfill_stats).
         '''
         if stat_data is None:
             if not hasattr(self, 'stat_data'):
@@ -93,45 +342,58 @@ class DataReader(object):
             if not hasattr(self, 'result_data'):
                 raise ValueError('No stat data available')
             result_data = self.result_data
-        # Merge data sets
-        stat_data.year += 1
-        stat_data = stat_data[stat_data.year < max(stat_data.year)]
-        base_data = pd.merge(stat_data, result_data,
-                             on=['player_name', 'year'], how='outer')
-        if backfill_stats:
-            base_data = self.backfill_stats(base_data)
-        base_data = base_data.dropna()
-        base_data = base_data.sort_values(['player_name',
-                                          'year']).reset_index(drop=True)
+        base_data = self.join_base_data(stat_data, result_data,
+                                        backfill_stats, max_gap)
+        METRICS.inc('rows_built', len(base_data), frame='base')
         self.base_data = base_data
         return base_data
 
-    def backfill_stats(self, inp_data, stat_col=None):
+    def join_base_data(self, stat_data, result_data, backfill_stats=False,
+                       max_gap=None):
+        base_data = asof_join_stats(result_data, stat_data,
+                                    fill_forward=backfill_stats,
+                                    max_gap=max_gap)
+        base_data = base_data.dropna()
+        base_data = base_data.sort_values(['player_name', 'year', 'end_date'],
+                                          kind='stable')
+        return base_data.reset_index(drop=True)
+
+    @timed('backfill_stats')
+    def backfill_stats(self, inp_data, stat_col=None, max_gap=None,
+                       inplace=False):
         '''
-        Fill in values of stat_col with previous years data if null
+        Fill in null values of stat_col (default all rank_ columns) with the
+            player's previous years data. Sorts once by (player_name, year)
+            and forward fills all columns in one grouped pass. Filled columns
+            are float32. max_gap limits how many years back a value may come
+            from. With inplace the input frame is sorted and filled.
         '''
-        assert set(['player_name', 'year']).issubset(set(inp_data.columns))
+        key = player_key(inp_data)
+        assert set([key, 'year']).issubset(set(inp_data.columns))
 
         if stat_col is None:
             fill_columns = [x for x in inp_data.columns if
                             x.find('rank_') == 0]
         elif not isinstance(stat_col, list):
             fill_columns = [stat_col]
+        else:
+            fill_columns = stat_col
 
-        filled_data = inp_data.copy()
-        filled_data.drop(columns=fill_columns, inplace=True)
-        stats_data = inp_data[['player_name', 'year'] + fill_columns].copy()
-        for fc in fill_columns:
-            sdata = stats_data[['player_name', 'year', fc]].copy()
-            sdata.drop_duplicates(inplace=True)
-            piv_data = sdata.pivot(index='year', columns='player_name',
-                                   values=fc)
-            piv_data.fillna(method='pad', inplace=True)
-            piv_data = piv_data.unstack()
-            piv_data.name = fc
-            piv_data = piv_data.reset_index()
-            filled_data = filled_data.merge(piv_data)
-        return filled_data
+        data = inp_data if inplace else inp_data.copy()
+        data.sort_values([key, 'year'], kind='stable', inplace=True)
+        data.reset_index(drop=True, inplace=True)
+        players = data[key].values
+        vals = data[fill_columns].astype(np.float32)
+        filled = vals.groupby(players).ffill()
+        if max_gap is not None:
+            years = data.year.values.astype(np.float32)[:, None]
+            val_years = pd.DataFrame(np.where(vals.notna(), years, np.nan),
+                                     columns=fill_columns)
+            last_years = val_years.groupby(players).ffill().values
+            filled = filled.mask(years - last_years > max_gap)
+        for col in fill_columns:
+            data[col] = filled[col].values
+        return data
 
 
 if __name__ == '__main__':
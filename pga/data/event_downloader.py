@@ -1,14 +1,24 @@
 import os
 import re
-import csv
-import gevent
-import urllib
-import requests
 import pandas as pd
+import datetime as dt
 from tqdm import tqdm
-from bs4 import BeautifulSoup
+from functools import partial
 
 import workbench.utils.read_write as rw
+from workbench.projects.pga.data.html_parsers import (DEFAULT_BACKEND,
+                                                      parse_event_table,
+                                                      parse_event_meta,
+                                                      parse_file,
+                                                      process_event_files,
+                                                      read_event_meta,
+                                                      write_event_meta)
+from workbench.projects.pga.data.meta_index import MetaIndex
+from workbench.projects.pga.data.metrics import METRICS, timed
+from workbench.projects.pga.data.normalize import normalize_positions
+from workbench.projects.pga.data.parallel import run_chunked
+from workbench.projects.pga.data.parquet_store import (ParquetStore,
+                                                       merge_store_csv)
 
 
 #######################
@@ -16,11 +26,34 @@ PGA_BASE_URL = 'https://www.pgatour.com'
 PGA_DATA_STUB = '%s/jcr:content/mainParsys/pastresults.selectedYear.%s.html'
 DEFAULT_DATA_DIR = os.path.join(os.getenv('DATA'), 'pydata', 'projects', 'pga',
                                 'events')
+######################
 
 
-def gather_pages(url, filename):
-    urllib.request.urlretrieve(url, filename)
-######################
+def normalize_event_csv(ev_csv):
+    '''
+    Normalize finishing positions of a single event and drop duplicate
+        players
+    '''
+    normalize_positions(ev_csv)
+    ev_csv.drop_duplicates(['PLAYER'], inplace=True)
+    return ev_csv
+
+
+def read_event_csv(event_path):
+    '''
+    Read and normalize a single event csv. Module level so it can run in a
+        process pool.
+    '''
+    return normalize_event_csv(pd.read_csv(event_path))
+
+
+def add_event_meta(ev_csv, year, e_dat):
+    ev_csv['year'] = year
+    ev_csv['event_id'] = e_dat['event_id']
+    ev_csv['date'] = e_dat['date']
+    ev_csv['course'] = e_dat['course']
+    ev_csv['par'] = e_dat['par']
+    return ev_csv
 
 
 class EventDownloader(object):
@@ -33,6 +66,9 @@ class EventDownloader(object):
         self.data_dir = data_dir
         self.csv_base = os.path.join(data_dir, 'csv')
         self.html_base = os.path.join(data_dir, 'html')
+        self.meta_base = os.path.join(data_dir, 'meta')
+        self.store = ParquetStore(os.path.join(data_dir, 'parquet'),
+                                  'tourn_id')
         if research:
             self.prep_for_research()
 
@@ -58,6 +94,9 @@ class EventDownloader(object):
         Get a list of all links and event names for all available years from
             PGA website. Return events that have hyperlinks.
         """
+        import requests
+        from bs4 import BeautifulSoup
+
         schedule_url = PGA_BASE_URL + '/tournaments/schedule.html'
         page = requests.get(schedule_url)
         html = BeautifulSoup(page.text, 'lxml')
@@ -118,27 +157,48 @@ class EventDownloader(object):
                                  sample_year=t_year)
         return tourn_meta
 
-    def download_html(self, tourn_ids=None, min_yr=1980):
+    @timed('event_download_html')
+    def download_html(self, tourn_ids=None, min_yr=1980, refresh_recent=False):
         """
         Download event data for specific tournament ids or all available
             if tourn_ids is None.  Filter to min_yr, some tournaments
-            have erroneous years in  deep history.
+            have erroneous years in  deep history. If refresh_recent, files
+            for the current and last season are revalidated and only
+            rewritten if changed.
         """
+        from bs4 import BeautifulSoup
+        from workbench.projects.pga.data.crawler import Crawler
+        from workbench.projects.pga.data.http_cache import HttpCache
+
         self.check_tourn_meta()
         if tourn_ids is None:
             tourn_ids = list(self.tourn_meta.keys())
         else:
             tourn_ids = self.verify_ids(tourn_ids=tourn_ids)
 
+        # Pull sample year pages to get the years available for each event
+        crawler = Crawler(os.path.join(self.data_dir, 'crawl_queue.json'),
+                          HttpCache(os.path.join(self.data_dir,
+                                                 'http_cache.json')))
+        refresh_yr = dt.datetime.now().year - 1
+        pilot_urls = {}
+        for t_id in tourn_ids:
+            t_link_head = self.tourn_meta[t_id]['link_head']
+            t_smpl_yr = self.tourn_meta[t_id]['sample_year']
+            pilot_urls[t_id] = PGA_DATA_STUB % (t_link_head, t_smpl_yr)
+        pages = crawler.fetch_pages(list(pilot_urls.values()))
+
         no_dropdown = []
+        url_paths = []
         for t_id in tqdm(tourn_ids):
             t_label = self.tourn_meta[t_id]['tourn_label']
             t_link_head = self.tourn_meta[t_id]['link_head']
-            t_smpl_yr = self.tourn_meta[t_id]['sample_year']
-            e_data_url = PGA_DATA_STUB % (t_link_head, t_smpl_yr)
+            e_data_url = pilot_urls[t_id]
             # Confirm year select exists on page
-            page = requests.get(e_data_url)
-            html = BeautifulSoup(page.text, 'lxml')
+            if pages[e_data_url] is None:
+                no_dropdown.append(e_data_url)
+                continue
+            html = BeautifulSoup(pages[e_data_url], 'lxml')
             year_select = html.find('select', id='pastResultsYearSelector')
             if year_select is None:
                 no_dropdown.append(e_data_url)
@@ -146,28 +206,56 @@ class EventDownloader(object):
             # Filter to min_yr
             years_avail = [x['value'] for x in year_select.find_all('option')]
             years_avail = [x for x in years_avail if int(x) >= min_yr]
-            # Create new directory if it does not exist
             dir_path = os.path.join(self.html_base, t_label)
-            if not os.path.exists(dir_path) and len(years_avail) > 0:
-                os.makedirs(dir_path)
-            url_paths = []
             for e_yr in years_avail:
                 e_data_url = PGA_DATA_STUB % (t_link_head, e_yr)
                 # Check if already downloaded
                 file_path = "%s/%s.html" % (dir_path, e_yr)
-                if not os.path.isfile(file_path):
+                refresh = refresh_recent and int(e_yr) >= refresh_yr
+                if refresh or not os.path.isfile(file_path):
                     url_paths.append((e_data_url, file_path))
-            # Pull html pages in parallel
-            jobs = [gevent.spawn(gather_pages, tup[0], tup[1]) for tup in
-                    url_paths]
-            gevent.joinall(jobs)
-
+        # Pull html pages, resuming any interrupted crawl
+        failed = crawler.download(url_paths)
+        METRICS.inc('missing_year_select', len(no_dropdown), source='events')
+        METRICS.inc('download_failures', len(failed), source='events')
         print("Tournaments missing year select: {}".format(no_dropdown))
+        print("Failed downloads: {}".format(failed))
 
-    def process_html(self, tourn_ids=None):
+    @timed('event_ingest_season')
+    def ingest_season(self, year, tourn_ids=None, n_workers=None,
+                      archive_html=False, backend=DEFAULT_BACKEND):
+        '''
+        Download, parse, normalize and store one season of events in a
+            single streaming pass (see ingest.EventIngest), then refresh the
+            meta files. Return report of failed and unparsable urls.
+        '''
+        from workbench.projects.pga.data.ingest import EventIngest
+
+        self.check_tourn_meta()
+        if tourn_ids is None:
+            tourn_ids = list(self.tourn_meta.keys())
+        else:
+            tourn_ids = self.verify_ids(tourn_ids=tourn_ids)
+        jobs = [(t_id, int(year), PGA_DATA_STUB % (
+            self.tourn_meta[t_id]['link_head'], year)) for t_id in tourn_ids]
+        ingest = EventIngest(self, n_workers=n_workers,
+                             archive_html=archive_html, backend=backend)
+        report = ingest.run(jobs)
+        self.build_update_meta_files()
+        print("Failed downloads: {}".format(report['failed']))
+        print("Unable to parse tables: {}".format(report['no_data']))
+        return report
+
+    @timed('event_process_html')
+    def process_html(self, tourn_ids=None, n_workers=None, chunk_size=50,
+                     backend=DEFAULT_BACKEND):
         '''
         Process all available html files for a tournament.  If tourn_ids is
-            None process all files.
+            None process all files. Event meta (date, par, course) is
+            written to a json sidecar in the meta directory from the same
+            parse. If n_workers is passed files are parsed in chunks across
+            a process pool. backend is 'lxml' (default) or 'bs4'. Return a
+            report of html files that could not be processed.
         '''
         self.check_tourn_meta()
         if tourn_ids is None:
@@ -175,12 +263,15 @@ class EventDownloader(object):
         else:
             tourn_ids = self.verify_ids(tourn_ids=tourn_ids)
 
-        no_data = []
-        for t_id in tqdm(tourn_ids):
+        no_html = []
+        jobs = []
+        for t_id in tourn_ids:
             t_label = self.tourn_meta[t_id]['tourn_label']
             t_html_dir = os.path.join(self.html_base, t_label)
             t_csv_dir = os.path.join(self.csv_base, t_label)
+            t_meta_dir = os.path.join(self.meta_base, t_label)
             if not os.path.isdir(t_html_dir):
+                no_html.append(t_html_dir)
                 continue
 
             html_fls = os.listdir(t_html_dir)
@@ -188,69 +279,90 @@ class EventDownloader(object):
                 html_path = os.path.join(self.html_base, t_label, e_hfl)
                 csv_path = os.path.join(t_csv_dir, e_hfl.replace('html',
                                                                  'csv'))
-                # Check if file already processed
-                if os.path.isfile(csv_path):
-                    continue
-                # Process html file
-                with open(html_path, 'r', encoding="utf-8") as h_fl:
-                    soup = BeautifulSoup(h_fl, 'lxml')
-                e_table_data = self._parse_html_table(soup)
-
-                if e_table_data is None:
-                    no_data.append(html_path)
+                meta_path = os.path.join(t_meta_dir, e_hfl.replace('html',
+                                                                   'json'))
+                # Check if file already processed and html unchanged since
+                if (os.path.isfile(csv_path) and os.path.getmtime(csv_path) >=
+                        os.path.getmtime(html_path)):
                     continue
-                elif len(e_table_data) <= 1:
-                    no_data.append(html_path)
-                    continue
-                # Create csv directory if needed
-                if not os.path.exists(t_csv_dir):
-                    os.makedirs(t_csv_dir)
-                with open(csv_path, 'w', encoding='utf-8', newline='') as c_fl:
-                    writer = csv.writer(c_fl, delimiter=',')
-                    for row in e_table_data:
-                        writer.writerow(row)
-
+                jobs.append((html_path, csv_path, meta_path))
+        parse_func = partial(process_event_files, backend=backend)
+        no_data = run_chunked(parse_func, jobs, n_workers, chunk_size)
+        METRICS.inc('pages_parsed', len(jobs), source='events')
+        METRICS.inc('parse_failures', len(no_data), source='events')
         print("Unable to parse tables: {}".format(no_data))
+        return dict(no_html=no_html, no_data=no_data)
 
+    @timed('event_update_meta')
     def build_update_meta_files(self):
         '''
-        Update tourn_meta files and generate a NEW event_meta file based
-            upone all available data in csv directory.  Old event_meta
-            file will be replaced.
+        Update tourn_meta and event_meta files based upon all available data
+            in the csv directory and parquet store. Changes are tracked in a
+            sqlite meta index so only tournaments whose csv or meta
+            directories (or store partition) changed are rescanned, and
+            event_ids stay stable across rebuilds. Event meta
+            is read from the sidecars written by process_html, html is only
+            parsed if one is missing.
         '''
         self.check_tourn_meta()
         tourn_ids = list(self.tourn_meta.keys())
-        self.event_meta = {}
+        index = MetaIndex(os.path.join(self.data_dir, 'meta_index.sqlite'))
+        if index.n_events() == 0 and hasattr(self, 'event_meta'):
+            index.seed_events(self.event_meta)
         for t_id in tqdm(tourn_ids):
             t_label = self.tourn_meta[t_id]['tourn_label']
             t_html_dir = os.path.join(self.html_base, t_label)
             t_csv_dir = os.path.join(self.csv_base, t_label)
-            if not os.path.exists(t_csv_dir):
+            t_meta_dir = os.path.join(self.meta_base, t_label)
+            part_path = self.store.partition_path(t_id)
+            store_changed = (os.path.isfile(part_path) and
+                             index.file_changed(part_path))
+            # Skip tournaments with no changes since the last update
+            if ('n_files' in self.tourn_meta[t_id] and
+                    not index.dir_changed(t_csv_dir) and
+                    not index.dir_changed(t_meta_dir) and
+                    not store_changed):
+                continue
+            # Events streamed by ingest_season are only in the store
+            e_years = self.store.partition_years(t_id)
+            if os.path.exists(t_csv_dir):
+                e_years |= set(int(x.replace('.csv', '')) for x in
+                               os.listdir(t_csv_dir))
+            if os.path.isfile(part_path):
+                index.mark_file(part_path)
+            if len(e_years) == 0:
                 self.tourn_meta[t_id]['n_files'] = 0
                 self.tourn_meta[t_id]['min_year'] = None
                 self.tourn_meta[t_id]['max_year'] = None
+                index.drop_missing_events(t_id, set())
+                index.mark_dir(t_csv_dir)
                 continue
-            csv_files = os.listdir(t_csv_dir)
-            min_yr = int(min(csv_files).replace('.csv', ''))
-            max_yr = int(max(csv_files).replace('.csv', ''))
-            self.tourn_meta[t_id]['n_files'] = len(csv_files)
-            self.tourn_meta[t_id]['min_year'] = min_yr
-            self.tourn_meta[t_id]['max_year'] = max_yr
-
-            for c_fl in csv_files:
-                e_yr = int(c_fl.replace('.csv', ''))
-                html_path = os.path.join(t_html_dir, '{}.html'.format(e_yr))
-                with open(html_path, 'r', encoding="utf-8") as h_fl:
-                    soup = BeautifulSoup(h_fl, 'lxml')
-                (date, par, course) = self._parse_html_meta(soup)
-                # Add new event meta entrty
-                e_id = len(self.event_meta)
-                self.event_meta[e_id] = dict(tourn_id=t_id,
-                                             tourn_label=t_label,
-                                             yea=e_yr,
-                                             date=date,
-                                             par=par,
-                                             course=course)
+            self.tourn_meta[t_id]['n_files'] = len(e_years)
+            self.tourn_meta[t_id]['min_year'] = min(e_years)
+            self.tourn_meta[t_id]['max_year'] = max(e_years)
+
+            index.drop_missing_events(t_id, e_years)
+            indexed_years = index.event_years(t_id)
+            for e_yr in sorted(e_years):
+                meta_path = os.path.join(t_meta_dir, '{}.json'.format(e_yr))
+                if os.path.isfile(meta_path):
+                    if (e_yr in indexed_years and
+                            not index.file_changed(meta_path)):
+                        continue
+                    (date, par, course) = read_event_meta(meta_path)
+                else:
+                    html_path = os.path.join(t_html_dir,
+                                             '{}.html'.format(e_yr))
+                    (date, par, course) = parse_file(html_path, 'event_meta')
+                    write_event_meta(meta_path, (date, par, course))
+                index.mark_file(meta_path)
+                # Add or update event meta entry, event_id is kept if known
+                index.upsert_event(t_id, t_label, e_yr, date, par, course)
+            index.mark_dir(t_csv_dir)
+            index.mark_dir(t_meta_dir)
+        self.event_meta = index.events()
+        self.build_event_index()
+        index.close()
         write_path = os.path.join(self.data_dir, 'tourn_meta.json')
         rw.write_dict_to_json(self.tourn_meta, write_path)
         write_path = os.path.join(self.data_dir, 'event_meta.json')
@@ -259,104 +371,115 @@ class EventDownloader(object):
     def _parse_html_table(self, inp_soup):
         '''
         Return headers and data rows from the html soup. If they cannot be
-            found or another issue arises return empty list
+            found or another issue arises return None
         '''
-        table = inp_soup.find('table', class_='table-styled')
-        if table is None:
-            return
-        # Extract table sections
-        table_head = table.find('thead')
-        table_body = table.find('tbody')
-        if table_head is None or table_body is None:
-            return
-        # Extract data
-        th_data = [t.text.strip() for t in table_head.find_all('th')]
-        data_rows = table_body.find_all('tr')
-        if len(th_data) == 0 or len(data_rows) == 0:
-            return
-        # Process header and data rows
-        rnd_th_ix = [x for x in th_data if x.find('ROUNDS') > -1]
-        if len(rnd_th_ix) == 0:
-            return
-        rnd_th_ix = th_data.index(rnd_th_ix[0])
-        rnd_indv_th = re.findall(r'\d', th_data[rnd_th_ix])
-        th_out = th_data[:rnd_th_ix] + rnd_indv_th + th_data[rnd_th_ix + 1:]
-        csv_lines = [th_out]
-        for rw in data_rows:
-            info = [cl.text.strip() for cl in rw.find_all('td')]
-            csv_lines.append(info)
-        return csv_lines
+        return parse_event_table(inp_soup)
 
     def _parse_html_meta(self, inp_soup):
         # Get tournament meta info
-        date = par = course = None
-        info_rows = inp_soup.find_all("span", class_="header-row")
-        for hr in info_rows:
-            match = re.search(r'Ending: ([\d/]+)', hr.text)
-            if match:
-                date = match.groups()[0]
-
-            match = re.search(r'PAR: ([\d]+)', hr.text)
-            if match:
-                par = int(match.groups()[0])
-
-            match = re.search(r'Course: (.*)', hr.text)
-            if match:
-                course = match.groups()[0]
-        return (date, par, course)
-
-    def load_csv(self, tourn_id, year=None, min_year=None):
+        return parse_event_meta(inp_soup)
+
+    @timed('event_build_store')
+    def build_parquet_store(self, tourn_ids=None):
+        '''
+        Load normalized csv data for each tournament and write it to the
+            parquet store, replacing any existing partition.
+        '''
+        self.check_tourn_meta()
+        if tourn_ids is None:
+            tourn_ids = list(self.tourn_meta.keys())
+        else:
+            tourn_ids = self.verify_ids(tourn_ids=tourn_ids)
+
+        no_csv = []
+        for t_id in tqdm(tourn_ids):
+            t_label = self.tourn_meta[t_id]['tourn_label']
+            if not os.path.exists(os.path.join(self.csv_base, t_label)):
+                no_csv.append(t_id)
+                continue
+            tourn_data = self.load_csv(t_id, use_store=False)
+            if len(tourn_data) == 0:
+                no_csv.append(t_id)
+                continue
+            self.store.write_partition(t_id, tourn_data)
+        print("No csv data found for tournament ids: {}".format(no_csv))
+
+    def load_csv(self, tourn_id, year=None, min_year=None, use_store=True,
+                 columns=None, pool=None):
         '''
         Load a csv data for a single tournament. If year is passed that single
             year is loaded. If no year arg then all available years are
-            loaded and filtered based on min_year.
+            loaded and filtered based on min_year. Reads from the parquet
+            store when the tournament has been migrated, plus any csv years
+            processed since the partition was written. If columns is
+            passed only those columns are returned (and read, from the
+            store). If pool (an Executor) is passed the csv files are read
+            and normalized across it. Years are stacked in order either
+            way.
         '''
         self.check_tourn_meta()
         self.check_event_meta()
         self.verify_ids(tourn_ids=tourn_id)
         tourn_label = self.tourn_meta[tourn_id]['tourn_label']
         tourn_dir_path = os.path.join(self.csv_base, tourn_label)
-        assert os.path.exists(tourn_dir_path)
+        store_data = None
+        store_years = set()
+        if use_store and self.store.has_partition(tourn_id):
+            # Years whose csv was re-processed since the partition was
+            # written are read from the csv instead
+            store_years = self.store.fresh_years(tourn_id, tourn_dir_path)
+            skip_years = self.store.partition_years(tourn_id) - store_years
+            store_data = self.store.read_partition(tourn_id, year=year,
+                                                   min_year=min_year,
+                                                   columns=columns,
+                                                   skip_years=skip_years)
+        else:
+            assert os.path.exists(tourn_dir_path)
         # If year empty load all years
-        if year is None:
-            load_files = os.listdir(tourn_dir_path)
+        if not os.path.exists(tourn_dir_path):
+            load_files = []
+        elif year is None:
+            load_files = sorted(os.listdir(tourn_dir_path))
         else:
             event_path = os.path.join(tourn_dir_path, '{}.csv'.format(year))
-            if not os.path.exists(event_path):
+            if os.path.exists(event_path):
+                load_files = ['{}.csv'.format(year)]
+            elif store_data is None:
                 raise FileNotFoundError('No file at {}'.format(event_path))
-            load_files = ['{}.csv'.format(year)]
-        # Load csv(s) and add some meta data
-        out_data = pd.DataFrame([])
-        repl_results = ['nan', 'CUT', 'W/D', 'DQ']
+            else:
+                load_files = []
+        # Look up all events first so a missing event fails before any reads
+        load_events = []
         for fl in load_files:
             yr = int(fl.replace('.csv', ''))
             if min_year:
                 if yr < int(min_year):
                     continue
-            e_row = self.event_meta_df.query("tourn_id == @tourn_id and " +
-                                             "year == @yr")
-            if len(e_row) != 1:
-                raise ValueError("Could not identify event")
-            e_dat = e_row.iloc[0]
-            event_path = os.path.join(tourn_dir_path, fl)
-            ev_csv = pd.read_csv(event_path)
-            # Add meta fields to event df and manage result column
-            finishes = set(ev_csv.POS) - set(repl_results)
-            last_place = ev_csv.POS.isin(finishes).sum() + 1
-            res_fltr = (lambda x: last_place if x in repl_results else
-                        int(x.replace('T','')))
-            ev_csv['POS'] = ev_csv.POS.astype(str).map(res_fltr)
-            ev_csv['year'] = yr
-            ev_csv['event_id'] = e_dat.event_id
-            ev_csv['date'] = e_dat.date
-            ev_csv['course'] = e_dat.course
-            ev_csv['par'] = e_dat.par
-            ev_csv['POS_pct'] = ev_csv.POS / float(last_place)
-            ev_csv.drop_duplicates(['PLAYER'], inplace=True)
-            out_data = out_data.append(ev_csv, ignore_index=True, sort=False)
+            if yr in store_years:
+                continue
+            load_events.append((fl, yr, self.get_event(tourn_id, yr)))
+        # Load csv(s) and add some meta data
+        event_paths = [os.path.join(tourn_dir_path, x[0]) for x in load_events]
+        if pool is None:
+            ev_csvs = map(read_event_csv, event_paths)
+        else:
+            ev_csvs = pool.map(read_event_csv, event_paths)
+        frames = [add_event_meta(ev_csv, yr, e_dat) for ev_csv, (_, yr, e_dat)
+                  in zip(ev_csvs, load_events)]
+        if len(frames) == 0:
+            out_data = pd.DataFrame([])
+        else:
+            out_data = pd.concat(frames, ignore_index=True, sort=False)
 
         out_data['tourn_label'] = tourn_label
         out_data['tourn_id'] = tourn_id
+        if columns is not None:
+            out_data = out_data[[c for c in out_data.columns if c in columns]]
+        if store_data is not None:
+            out_data = merge_store_csv(store_data, frames, out_data)
+            if year is not None and len(out_data) == 0:
+                raise FileNotFoundError('No data for tournament {} in '
+                                        '{}'.format(tourn_id, year))
         return out_data
 
     #########################################################
@@ -375,6 +498,52 @@ class EventDownloader(object):
         if not hasattr(self, 'event_meta'):
             raise NameError("No event_meta attribute found")
 
+    def build_event_index(self):
+        """
+        Build the (tourn_id, year) -> event lookup from event_meta. Raise
+            ValueError if an event appears more than once.
+        """
+        self.check_event_meta()
+        event_index = {}
+        for e_id, e_dat in self.event_meta.items():
+            # Legacy meta files store the year under 'yea'
+            e_yr = int(e_dat['year'] if 'year' in e_dat else e_dat['yea'])
+            key = (str(e_dat['tourn_id']), e_yr)
+            if key in event_index:
+                raise ValueError("Duplicate events for tourn_id {} year "
+                                 "{}".format(*key))
+            event_index[key] = dict(e_dat, event_id=str(e_id), year=e_yr)
+        self.event_index = event_index
+        return event_index
+
+    def get_event(self, tourn_id, year):
+        """
+        Return event meta dict for a tournament and year
+        """
+        if not hasattr(self, 'event_index'):
+            self.build_event_index()
+        key = (str(tourn_id), int(year))
+        if key not in self.event_index:
+            raise KeyError("No event in event_meta for tourn_id {} year {}, "
+                           "rerun build_update_meta_files".format(*key))
+        return self.event_index[key]
+
+    def source_paths(self, tourn_id):
+        """
+        Files a load_csv of tourn_id depends on: the meta files, the parquet
+            partition and the yearly csvs
+        """
+        self.check_tourn_meta()
+        paths = [os.path.join(self.data_dir, 'tourn_meta.json'),
+                 os.path.join(self.data_dir, 'event_meta.json'),
+                 self.store.partition_path(tourn_id)]
+        tourn_label = self.tourn_meta.get(tourn_id, {}).get('tourn_label')
+        tourn_dir_path = os.path.join(self.csv_base, str(tourn_label))
+        if tourn_label is not None and os.path.isdir(tourn_dir_path):
+            paths += [os.path.join(tourn_dir_path, fl) for fl in
+                      sorted(os.listdir(tourn_dir_path))]
+        return paths
+
     def verify_ids(self, tourn_ids=None, event_ids=None):
         """
         Verify all ids are contained in the associated meta object
@@ -410,6 +579,7 @@ class EventDownloader(object):
         if os.path.exists(event_meta_path):
             event_meta = rw.read_dict_from_json(event_meta_path)
             self.event_meta = event_meta
+            self.build_event_index()
 
     def get_tourn_meta_df(self, tourn_meta=None):
         """
@@ -437,6 +607,7 @@ class EventDownloader(object):
         out_df = pd.DataFrame(event_meta).transpose()
         out_df.index.name = 'event_id'
         out_df.reset_index(inplace=True)
+        out_df.rename(columns={'yea': 'year'}, inplace=True)
         return out_df
 
 
@@ -3,6 +3,84 @@ import numpy as np
 import pandas as pd
 
 from gearbox import convert_date_array
+from workbench.projects.pga.data.id_dictionary import player_key
+from workbench.projects.pga.data.kernels import (KERNEL_FUNCS, group_offsets,
+                                                 grouped_rolling)
+from workbench.projects.pga.data.metrics import timed
+
+
+ROLL_FUNCS = ['min', 'max', 'mean', 'median', 'std', 'count', 'last', 'ewm']
+
+
+def rolling_features(inp_data, value_col, specs, group_cols=('player_name',),
+                     prefix='ev_perf', engine='kernel'):
+    '''
+    Compute rolling window features of value_col over the prior rows of each
+        group. inp_data must be sorted by group_cols then date. specs is a
+        list of (func, window) with func in ROLL_FUNCS (window is the span
+        for 'ewm', 'last' is the value window rows back). The current row is
+        excluded so features only use history. With engine='kernel' funcs
+        supported by the compiled kernels are computed there, the rest
+        with pandas. Return a DataFrame aligned to inp_data with one column
+        per spec named <prefix>_<func>_<window>.
+    '''
+    for func, window in specs:
+        assert func in ROLL_FUNCS
+    group_cols = list(group_cols)
+    if engine == 'kernel':
+        kernel_specs = [x for x in specs if x[0] in KERNEL_FUNCS]
+    else:
+        kernel_specs = []
+    pandas_specs = [x for x in specs if x not in kernel_specs]
+    feats = {}
+    if len(kernel_specs) > 0:
+        feats.update(_kernel_features(inp_data, value_col, kernel_specs,
+                                      group_cols))
+    if len(pandas_specs) > 0:
+        feats.update(_pandas_features(inp_data, value_col, pandas_specs,
+                                      group_cols))
+    out = pd.DataFrame({'{}_{}_{}'.format(prefix, f, w): feats[(f, w)]
+                        for f, w in specs}, index=inp_data.index)
+    return out
+
+
+def _pandas_features(inp_data, value_col, specs, group_cols):
+    keys = [inp_data[c] for c in group_cols]
+    prev = inp_data[value_col].groupby(keys, sort=False,
+                                       observed=True).shift(1)
+    prev_grp = prev.groupby(keys, sort=False, observed=True)
+    feats = {}
+    for func, window in specs:
+        if func == 'last':
+            feats[(func, window)] = prev_grp.shift(window - 1)
+            continue
+        if func == 'ewm':
+            feat = prev_grp.ewm(span=window, min_periods=1).mean()
+        else:
+            feat = getattr(prev_grp.rolling(window, min_periods=1), func)()
+        feat = feat.reset_index(level=list(range(len(group_cols))),
+                                drop=True)
+        feats[(func, window)] = feat.reindex(inp_data.index)
+    return feats
+
+
+def _kernel_features(inp_data, value_col, specs, group_cols):
+    # Order rows so each group is contiguous, keeping date order within
+    codes = inp_data.groupby(group_cols, sort=False,
+                             observed=True).ngroup().values
+    order = np.argsort(codes, kind='stable')
+    offsets = group_offsets(codes[order])
+    values = inp_data[value_col].values.astype(np.float64)[order]
+    feats = {}
+    # One pass per window computes every func at that window
+    for window in sorted(set(w for _, w in specs)):
+        funcs = [f for f, w in specs if w == window]
+        res = grouped_rolling(values, offsets, window, funcs)
+        for func in funcs:
+            feat = np.empty(len(order))
+            feat[order] = res[func]
+            feats[(func, window)] = feat
+    return feats
 
 
 class FeatureCreator(object):
@@ -12,7 +90,11 @@ class FeatureCreator(object):
                     result_col]
         assert set(req_cols).issubset(inp_data.columns)
         inp_data.end_date = convert_date_array(inp_data.end_date)
-        inp_data.sort_values(['player_name', 'end_date'], inplace=True)
+        # Group on the integer ids when the data was encoded by DataReader
+        self.player_col = player_key(inp_data)
+        self.tourn_col = 'tourn_key' if 'tourn_key' in inp_data else \
+            'tourn_id'
+        inp_data.sort_values([self.player_col, 'end_date'], inplace=True)
         inp_data.reset_index(inplace=True, drop=True)
         self.stat_cols = [x for x in inp_data if x.find('rank_') == 0]
         self.result_col = result_col
@@ -31,41 +113,32 @@ class FeatureCreator(object):
         Return prior performance in same tournament using some math func and
         a window. i.e Min/Avg Tournament performance in last 5
         '''
-        assert func in ['min', 'max', 'mean', 'median']
-        grp_data = self._base[['player_name', 'tourn_id', self.result_col]]
-        grp = grp_data.groupby(['player_name', 'tourn_id'])
-
-        pivot = pivot.shift(1)
-        if pad_events:
-            pivot.fillna(method='pad', inplace=True)
-
-        eval_str = 'pivot.rolling({}, min_periods=1).{}()'.format(window, func)
-        feat = eval(eval_str)
-        feat = feat.unstack()
-        feat.name = 'ev_perf_{}_{}'.format(func, window)
-        feat = feat.reset_index()
-        self.data = pd.merge(self.data, feat, on=['player_name', 'end_date'],
-                             how='left')
-
-    def event_performance(self, func, window, pad_events=True):
+        self.rolling_performance([(func, window)], by_tourn=True)
+
+    def event_performance(self, func, window):
         '''
         Return math func across all events recently.  i.e Avg, Max, Min
         over last 5 events (across all tournamnets)
         '''
-        assert func in ['min', 'max', 'mean', 'median']
-        pivot = self._base.pivot(index='end_date', columns='player_name',
-                                 values=self.result_col)
-        pivot = pivot.shift(1)
-        if pad_events:
-            pivot.fillna(method='pad', inplace=True)
-
-        eval_str = 'pivot.rolling({}, min_periods=1).{}()'.format(window, func)
-        feat = eval(eval_str)
-        feat = feat.unstack()
-        feat.name = 'ev_perf_{}_{}'.format(func, window)
-        feat = feat.reset_index()
-        self.data = pd.merge(self.data, feat, on=['player_name', 'end_date'],
-                             how='left')
+        self.rolling_performance([(func, window)], by_tourn=False)
+
+    @timed('rolling_features')
+    def rolling_performance(self, specs, by_tourn=False, engine='kernel'):
+        '''
+        Add a block of rolling result features for a list of (func, window)
+        specs computed over each player's prior events, or prior events in
+        the same tournament if by_tourn.
+        '''
+        if by_tourn:
+            group_cols = [self.player_col, self.tourn_col]
+            prefix = 'tourn_perf'
+        else:
+            group_cols, prefix = [self.player_col], 'ev_perf'
+        feats = rolling_features(self._base, self.result_col, specs,
+                                 group_cols, prefix, engine)
+        self.data = self.data.drop(columns=feats.columns, errors='ignore')
+        self.data = pd.concat([self.data, feats], axis=1)
+        return feats
 
     def tourn_binaries(self, tourn_id):
         '''
@@ -82,10 +155,8 @@ class FeatureCreator(object):
 
 
     def sample_build(self):
-        # self.event_performance('mean', 1)
-        # self.event_performance('median', 10)
-        # self.event_performance('max', 5)
-        # self.event_performance('min', 5)
+        self.rolling_performance([('mean', 1), ('median', 10), ('max', 5),
+                                  ('min', 5), ('ewm', 10)])
         self.tourn_performance('max', 5)
 
 
@@ -106,24 +177,3 @@ if __name__ == '__main__':
     fc = FeatureCreator(data)
 
     fc.sample_build()
-
-
-
-
-    def _get_meta(self, stat_data):
-        grp_data = stat_data.groupby('stat_id')
-        meta = grp_data.year.value_counts()
-        meta = meta.to_frame(name='count')
-        meta.reset_index(inplace=True)
-        return meta
-
-    def get_available_stat_ids(self):
-        return list(self.meta.stat_id.unique())
-
-
-
-
-dr.build_stat_data([2568, 103])
-dat = dr.stat_data.copy()
-
-fc = FeatureCreator(dat)
\ No newline at end of file
@@ -0,0 +1,266 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+from gearbox import convert_date_array
+from workbench.projects.pga.data.feature_creator import (ROLL_FUNCS,
+                                                         rolling_features)
+from workbench.projects.pga.data.id_dictionary import player_key
+
+
+EVENT_COLS = ['end_date', 'tourn_id', 'event_id', 'year']
+
+
+def window_stat(history, func, window):
+    '''
+    Return func over the last `window` values of a history list, matching
+        rolling_features semantics (nulls skipped, 'last' is the value
+        window rows back)
+    '''
+    if func == 'last':
+        return history[-window] if len(history) >= window else np.nan
+    vals = np.array(history[-window:], dtype=np.float64)
+    vals = vals[~np.isnan(vals)]
+    if func == 'count':
+        return float(len(vals))
+    if len(vals) == 0 or (func == 'std' and len(vals) < 2):
+        return np.nan
+    if func == 'std':
+        return vals.std(ddof=1)
+    return getattr(np, func)(vals)
+
+
+class FeatureStore(object):
+    """
+    Persisted result features keyed by (player, end_date). Alongside the
+        features the store keeps per player and per player-tournament state
+        (recent result buffers, ewm accumulators and last stat values) so a
+        new week of events can be appended without recomputing history.
+        build() does a full recompute and verify() checks the stored
+        features against one. Players are keyed on player_id when the data
+        was encoded by DataReader (player_name is then only a label), so
+        aliased or renamed players keep a single history, as in
+        rolling_features.
+    """
+    def __init__(self, store_dir, ev_specs=(), tourn_specs=(),
+                 result_col='result'):
+        for func, _ in list(ev_specs) + list(tourn_specs):
+            assert func in ROLL_FUNCS
+        self.store_dir = store_dir
+        self.ev_specs = list(ev_specs)
+        self.tourn_specs = list(tourn_specs)
+        self.result_col = result_col
+        self.features_path = os.path.join(store_dir, 'features.parquet')
+        self.state_path = os.path.join(store_dir, 'state.pkl')
+
+    def load(self):
+        self.features = pd.read_parquet(self.features_path)
+        with open(self.state_path, 'rb') as s_fl:
+            self.state = pickle.load(s_fl)
+        self.player_col = self.state['player_col']
+        return self.features
+
+    def save(self):
+        if not os.path.exists(self.store_dir):
+            os.makedirs(self.store_dir)
+        self.features.to_parquet(self.features_path + '.tmp', index=False)
+        os.replace(self.features_path + '.tmp', self.features_path)
+        with open(self.state_path + '.tmp', 'wb') as s_fl:
+            pickle.dump(self.state, s_fl)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def build(self, inp_data):
+        '''
+        Full recompute of features and state from the complete history
+        '''
+        self.player_col = player_key(inp_data)
+        data = self._prep(inp_data)
+        self.features = self.compute_features(data)
+        self.state = self._build_state(data)
+        self.save()
+        return self.features
+
+    def update(self, new_data):
+        '''
+        Append features for new events using the persisted state. New events
+            must be later than every stored event for the same player.
+        '''
+        if not hasattr(self, 'state'):
+            self.load()
+        if self.player_col not in new_data.columns:
+            raise ValueError('New data has no {} column'.format(
+                self.player_col))
+        data = self._prep(new_data)
+        data = data.sort_values(['end_date', self.player_col], kind='stable')
+        stat_cols = self.state['stat_cols']
+        id_cols = self._id_cols()
+        rows = []
+        for rec in data.to_dict('records'):
+            player = rec[self.player_col]
+            p_key = (player, rec['tourn_id'])
+            last_date = self.state['last_date'].get(player)
+            if last_date is not None and rec['end_date'] <= last_date:
+                raise ValueError('Event on {} for {} is not after stored '
+                                 'history'.format(rec['end_date'], player))
+            out = {c: rec[c] for c in id_cols}
+            # Carry forward last known stat values
+            last_stats = self.state['last_stats'].setdefault(player, {})
+            for col in stat_cols:
+                if pd.isnull(rec.get(col, np.nan)):
+                    out[col] = last_stats.get(col, np.nan)
+                else:
+                    out[col] = last_stats[col] = rec[col]
+            self._fill_features(out, 'ev_perf', self.ev_specs, player)
+            self._fill_features(out, 'tourn_perf', self.tourn_specs, p_key)
+            self._push(player, p_key, rec[self.result_col])
+            self.state['last_date'][player] = rec['end_date']
+            rows.append(out)
+        new_feats = pd.DataFrame(rows, columns=self.features.columns)
+        self.features = pd.concat([self.features, new_feats],
+                                  ignore_index=True, sort=False)
+        self.features = self.features.sort_values(self._key_cols(),
+                                                  kind='stable')
+        self.features.reset_index(drop=True, inplace=True)
+        self.save()
+        return new_feats
+
+    def verify(self, full_data, rtol=1e-9):
+        '''
+        Recompute features from the full history and return True if they
+            match the stored (incrementally built) features
+        '''
+        if not hasattr(self, 'features'):
+            self.load()
+        full = self.compute_features(self._prep(full_data))
+        stored = self.features
+        if full.shape != stored.shape or list(full.columns) != \
+                list(stored.columns):
+            return False
+        for col in full.columns:
+            if col in self._id_cols():
+                if not (full[col].values == stored[col].values).all():
+                    return False
+                continue
+            a = full[col].values.astype(np.float64)
+            b = stored[col].values.astype(np.float64)
+            if not np.allclose(a, b, rtol=rtol, equal_nan=True):
+                return False
+        return True
+
+    def compute_features(self, data):
+        '''
+        Full recompute of stat and rolling result features for prepped data
+        '''
+        stat_cols = [x for x in data.columns if x.find('rank_') == 0]
+        out = data[self._id_cols()].copy()
+        out[stat_cols] = data.groupby(self.player_col, observed=True)[
+            stat_cols].ffill()
+        ev_feats = rolling_features(data, self.result_col, self.ev_specs,
+                                    [self.player_col], 'ev_perf')
+        tourn_feats = rolling_features(data, self.result_col,
+                                       self.tourn_specs,
+                                       [self.player_col, 'tourn_id'],
+                                       'tourn_perf')
+        return pd.concat([out, ev_feats, tourn_feats], axis=1)
+
+    #########################################################
+
+    def _key_cols(self):
+        return [self.player_col, 'end_date']
+
+    def _id_cols(self):
+        if self.player_col == 'player_id':
+            return ['player_name', 'player_id'] + EVENT_COLS
+        return ['player_name'] + EVENT_COLS
+
+    def _prep(self, inp_data):
+        data = inp_data.copy()
+        data['end_date'] = convert_date_array(data.end_date)
+        data = data.sort_values(self._key_cols(), kind='stable')
+        return data.reset_index(drop=True)
+
+    def _max_window(self, specs):
+        windows = [w for f, w in specs if f != 'ewm']
+        return max(windows) if len(windows) > 0 else 0
+
+    def _ewm_spans(self, specs):
+        return sorted(set(w for f, w in specs if f == 'ewm'))
+
+    def _build_state(self, data):
+        state = dict(player_col=self.player_col,
+                     stat_cols=[x for x in data.columns
+                                if x.find('rank_') == 0])
+        grp = data.groupby(self.player_col, observed=True)
+        state['last_date'] = grp.end_date.max().to_dict()
+        last_stats = grp[state['stat_cols']].last()
+        state['last_stats'] = {p: {k: v for k, v in row.items()
+                                   if not pd.isnull(v)}
+                               for p, row in last_stats.iterrows()}
+        for name, specs, keys in [('ev', self.ev_specs, [self.player_col]),
+                                  ('tourn', self.tourn_specs,
+                                   [self.player_col, 'tourn_id'])]:
+            state[name + '_buffer'] = self._tail_buffers(
+                data, keys, self._max_window(specs))
+            state[name + '_ewm'] = self._ewm_state(
+                data, keys, self._ewm_spans(specs))
+        return state
+
+    def _tail_buffers(self, data, keys, max_window):
+        if max_window == 0:
+            return {}
+        tails = data.groupby(keys, observed=True)[self.result_col].apply(
+            lambda x: list(x.values[-max_window:]))
+        return tails.to_dict()
+
+    def _ewm_state(self, data, keys, spans):
+        '''
+        ewm (adjust=True) numerator / denominator after each group's full
+            history, so later values can be folded in one at a time
+        '''
+        state = {}
+        if len(spans) == 0:
+            return state
+        grp = data.groupby(keys, observed=True)
+        age = grp.cumcount(ascending=False).values
+        vals = data[self.result_col].values.astype(np.float64)
+        valid = ~np.isnan(vals)
+        for span in spans:
+            decay = (1 - 2. / (span + 1)) ** age
+            num = pd.Series(np.where(valid, vals * decay, 0.)).groupby(
+                [data[k] for k in keys], observed=True).sum()
+            den = pd.Series(np.where(valid, decay, 0.)).groupby(
+                [data[k] for k in keys], observed=True).sum()
+            for key in num.index:
+                state.setdefault(key, {})[span] = (num[key], den[key])
+        return state
+
+    def _fill_features(self, out, prefix, specs, key):
+        name = prefix.split('_')[0]
+        history = self.state[name + '_buffer'].get(key, [])
+        ewm = self.state[name + '_ewm'].get(key, {})
+        for func, window in specs:
+            col = '{}_{}_{}'.format(prefix, func, window)
+            if func == 'ewm':
+                num, den = ewm.get(window, (0., 0.))
+                out[col] = num / den if den > 0 else np.nan
+            else:
+                out[col] = window_stat(history, func, window)
+
+    def _push(self, player, p_key, result):
+        for name, specs, key in [('ev', self.ev_specs, player),
+                                 ('tourn', self.tourn_specs, p_key)]:
+            max_window = self._max_window(specs)
+            if max_window > 0:
+                history = self.state[name + '_buffer'].setdefault(key, [])
+                history.append(result)
+                del history[:-max_window]
+            spans = self._ewm_spans(specs)
+            ewm = self.state[name + '_ewm'].setdefault(key, {})
+            for span in spans:
+                num, den = ewm.get(span, (0., 0.))
+                decay = 1 - 2. / (span + 1)
+                if pd.isnull(result):
+                    ewm[span] = (num * decay, den * decay)
+                else:
+                    ewm[span] = (num * decay + result, den * decay + 1)
@@ -0,0 +1,292 @@
+import os
+import re
+import csv
+import json
+
+
+DEFAULT_BACKEND = 'lxml'
+
+
+def _xp_class(cls_name):
+    return ('contains(concat(" ", normalize-space(@class), " "), " {} ")'
+            .format(cls_name))
+
+
+def _strip_scripts(tree):
+    '''
+    Drop script / style elements (keeping their tail text) so text_content
+        matches the bs4 backend, which skips script and style strings
+    '''
+    import lxml.etree
+
+    lxml.etree.strip_elements(tree, 'script', 'style', with_tail=False)
+    return tree
+
+
+def read_soup(html_path):
+    from bs4 import BeautifulSoup
+
+    with open(html_path, 'r', encoding="utf-8") as h_fl:
+        return BeautifulSoup(h_fl, 'lxml')
+
+
+def read_tree(html_path):
+    import lxml.html
+
+    with open(html_path, 'r', encoding="utf-8") as h_fl:
+        return _strip_scripts(lxml.html.document_fromstring(h_fl.read()))
+
+
+def write_event_meta(meta_path, meta):
+    meta_dir = os.path.dirname(meta_path)
+    if not os.path.exists(meta_dir):
+        os.makedirs(meta_dir, exist_ok=True)
+    (date, par, course) = meta
+    # Write then rename so rewrites also bump the directory mtime
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as m_fl:
+        json.dump(dict(date=date, par=par, course=course), m_fl)
+    os.replace(tmp_path, meta_path)
+
+
+def read_event_meta(meta_path):
+    with open(meta_path, 'r', encoding='utf-8') as m_fl:
+        meta = json.load(m_fl)
+    return (meta['date'], meta['par'], meta['course'])
+
+
+def write_csv(csv_path, csv_lines):
+    csv_dir = os.path.dirname(csv_path)
+    if not os.path.exists(csv_dir):
+        os.makedirs(csv_dir, exist_ok=True)
+    tmp_path = csv_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as c_fl:
+        writer = csv.writer(c_fl, delimiter=',')
+        for row in csv_lines:
+            writer.writerow(row)
+    os.replace(tmp_path, csv_path)
+
+
+def parse_stat_table(inp_soup):
+    '''
+    Return headers and data rows from the statsTable in a stat page soup.
+        Return None if there is no table.
+    '''
+    table = inp_soup.find('table', id='statsTable')
+    if table is None:
+        return
+    hdrs = [th.text for th in table.find('thead').find_all('th')]
+    csv_lines = [hdrs]
+    for tr in table.find('tbody').find_all('tr'):
+        info = [td.text.strip() for td in tr.find_all('td')]
+        csv_lines.append(info)
+    return csv_lines
+
+
+def parse_event_table(inp_soup):
+    '''
+    Return headers and data rows from the html soup. If they cannot be
+        found or another issue arises return None
+    '''
+    table = inp_soup.find('table', class_='table-styled')
+    if table is None:
+        return
+    # Extract table sections
+    table_head = table.find('thead')
+    table_body = table.find('tbody')
+    if table_head is None or table_body is None:
+        return
+    # Extract data
+    th_data = [t.text.strip() for t in table_head.find_all('th')]
+    data_rows = table_body.find_all('tr')
+    if len(th_data) == 0 or len(data_rows) == 0:
+        return
+    # Process header and data rows
+    rnd_th_ix = [x for x in th_data if x.find('ROUNDS') > -1]
+    if len(rnd_th_ix) == 0:
+        return
+    rnd_th_ix = th_data.index(rnd_th_ix[0])
+    rnd_indv_th = re.findall(r'\d', th_data[rnd_th_ix])
+    th_out = th_data[:rnd_th_ix] + rnd_indv_th + th_data[rnd_th_ix + 1:]
+    csv_lines = [th_out]
+    for rw in data_rows:
+        info = [cl.text.strip() for cl in rw.find_all('td')]
+        csv_lines.append(info)
+    return csv_lines
+
+
+def parse_event_meta(inp_soup):
+    '''
+    Return (end date, par, course) from the header rows of an event page
+    '''
+    date = par = course = None
+    info_rows = inp_soup.find_all("span", class_="header-row")
+    for hr in info_rows:
+        match = re.search(r'Ending: ([\d/]+)', hr.text)
+        if match:
+            date = match.groups()[0]
+
+        match = re.search(r'PAR: ([\d]+)', hr.text)
+        if match:
+            par = int(match.groups()[0])
+
+        match = re.search(r'Course: (.*)', hr.text)
+        if match:
+            course = match.groups()[0]
+    return (date, par, course)
+
+
+def parse_stat_table_lxml(inp_tree):
+    '''
+    lxml/XPath version of parse_stat_table that only visits the statsTable
+        header and body cells.
+    '''
+    table = inp_tree.xpath('(//table[@id="statsTable"])[1]')
+    if len(table) == 0:
+        return
+    table_head = table[0].xpath('(.//thead)[1]')
+    table_body = table[0].xpath('(.//tbody)[1]')
+    if len(table_head) == 0 or len(table_body) == 0:
+        return
+    hdrs = [th.text_content() for th in table_head[0].iter('th')]
+    csv_lines = [hdrs]
+    for tr in table_body[0].iter('tr'):
+        info = [td.text_content().strip() for td in tr.iter('td')]
+        csv_lines.append(info)
+    return csv_lines
+
+
+def parse_event_table_lxml(inp_tree):
+    '''
+    lxml/XPath version of parse_event_table
+    '''
+    xp_table = '(//table[{}])[1]'.format(_xp_class('table-styled'))
+    table = inp_tree.xpath(xp_table)
+    if len(table) == 0:
+        return
+    table_head = table[0].xpath('(.//thead)[1]')
+    table_body = table[0].xpath('(.//tbody)[1]')
+    if len(table_head) == 0 or len(table_body) == 0:
+        return
+    th_data = [t.text_content().strip() for t in table_head[0].iter('th')]
+    data_rows = list(table_body[0].iter('tr'))
+    if len(th_data) == 0 or len(data_rows) == 0:
+        return
+    rnd_th_ix = [x for x in th_data if x.find('ROUNDS') > -1]
+    if len(rnd_th_ix) == 0:
+        return
+    rnd_th_ix = th_data.index(rnd_th_ix[0])
+    rnd_indv_th = re.findall(r'\d', th_data[rnd_th_ix])
+    th_out = th_data[:rnd_th_ix] + rnd_indv_th + th_data[rnd_th_ix + 1:]
+    csv_lines = [th_out]
+    for rw in data_rows:
+        info = [cl.text_content().strip() for cl in rw.iter('td')]
+        csv_lines.append(info)
+    return csv_lines
+
+
+def parse_event_meta_lxml(inp_tree):
+    '''
+    lxml/XPath version of parse_event_meta
+    '''
+    date = par = course = None
+    info_rows = inp_tree.xpath('//span[{}]'.format(_xp_class('header-row')))
+    for hr in info_rows:
+        hr_text = hr.text_content()
+        match = re.search(r'Ending: ([\d/]+)', hr_text)
+        if match:
+            date = match.groups()[0]
+
+        match = re.search(r'PAR: ([\d]+)', hr_text)
+        if match:
+            par = int(match.groups()[0])
+
+        match = re.search(r'Course: (.*)', hr_text)
+        if match:
+            course = match.groups()[0]
+    return (date, par, course)
+
+
+PARSERS = {
+    'bs4': dict(read=read_soup, stat_table=parse_stat_table,
+                event_table=parse_event_table, event_meta=parse_event_meta),
+    'lxml': dict(read=read_tree, stat_table=parse_stat_table_lxml,
+                 event_table=parse_event_table_lxml,
+                 event_meta=parse_event_meta_lxml),
+}
+
+
+def read_page(html_path, backend=DEFAULT_BACKEND):
+    '''
+    Read an html file with the backend and return (parsers, page). If the
+        lxml backend cannot read the file fall back to BeautifulSoup.
+    '''
+    import lxml.etree
+
+    try:
+        page = PARSERS[backend]['read'](html_path)
+    except (lxml.etree.ParserError, ValueError):
+        if backend == 'bs4':
+            raise
+        backend = 'bs4'
+        page = PARSERS[backend]['read'](html_path)
+    return PARSERS[backend], page
+
+
+def read_page_text(html_text, backend=DEFAULT_BACKEND):
+    '''
+    read_page for html already in memory (i.e. a fetched page)
+    '''
+    import lxml.html
+    import lxml.etree
+    from bs4 import BeautifulSoup
+
+    if backend == 'lxml':
+        try:
+            return PARSERS['lxml'], _strip_scripts(
+                lxml.html.document_fromstring(html_text))
+        except (lxml.etree.ParserError, ValueError):
+            pass
+    return PARSERS['bs4'], BeautifulSoup(html_text, 'lxml')
+
+
+def parse_file(html_path, parse_key, backend=DEFAULT_BACKEND):
+    '''
+    Read an html file and run a single parser on it
+    '''
+    parsers, page = read_page(html_path, backend)
+    return parsers[parse_key](page)
+
+
+def process_stat_files(jobs, backend=DEFAULT_BACKEND):
+    '''
+    Parse a list of (html_path, csv_path) stat pages and write csv files.
+        Return list of html paths with no parsable data.
+    '''
+    no_data = []
+    for html_path, csv_path in jobs:
+        csv_lines = parse_file(html_path, 'stat_table', backend)
+        # Check that there is a non-empty table
+        if csv_lines is None or len(csv_lines) <= 1:
+            no_data.append(html_path)
+            continue
+        write_csv(csv_path, csv_lines)
+    return no_data
+
+
+def process_event_files(jobs, backend=DEFAULT_BACKEND):
+    '''
+    Parse a list of (html_path, csv_path, meta_path) event pages and write
+        csv files and meta sidecars from a single parse of each page.
+        Return list of html paths with no parsable data.
+    '''
+    no_data = []
+    for html_path, csv_path, meta_path in jobs:
+        parsers, page = read_page(html_path, backend)
+        csv_lines = parsers['event_table'](page)
+        if csv_lines is None or len(csv_lines) <= 1:
+            no_data.append(html_path)
+            continue
+        write_csv(csv_path, csv_lines)
+        write_event_meta(meta_path, parsers['event_meta'](page))
+    return no_data
@@ -0,0 +1,46 @@
+import os
+import json
+import hashlib
+
+from workbench.projects.pga.data.crawler import write_atomic
+
+
+class HttpCache(object):
+    """
+    Per url store of http validators (ETag / Last-Modified) and content
+        hashes. Used by the crawler to issue conditional GETs and to skip
+        rewriting files whose content has not changed.
+    """
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.entries = {}
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'r') as c_fl:
+                self.entries = json.load(c_fl)
+
+    def conditional_headers(self, url):
+        entry = self.entries.get(url, {})
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def is_unchanged(self, url, content):
+        entry = self.entries.get(url)
+        if entry is None:
+            return False
+        return entry.get('sha1') == hashlib.sha1(content).hexdigest()
+
+    def update(self, url, content, resp_headers):
+        self.entries[url] = dict(etag=resp_headers.get('ETag'),
+                                 last_modified=resp_headers.get(
+                                     'Last-Modified'),
+                                 sha1=hashlib.sha1(content).hexdigest())
+
+    def save(self):
+        if self.cache_path is None:
+            return
+        content = json.dumps(self.entries, sort_keys=True).encode('utf-8')
+        write_atomic(self.cache_path, content)
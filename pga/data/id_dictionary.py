@@ -0,0 +1,245 @@
+import re
+import json
+import hashlib
+import sqlite3
+import unicodedata
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS players (player_id INTEGER PRIMARY KEY
+                                           AUTOINCREMENT,
+                                           name TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS player_keys (name_key TEXT PRIMARY KEY,
+                                               player_id INTEGER)''',
+    '''CREATE TABLE IF NOT EXISTS aliases (name_key TEXT PRIMARY KEY,
+                                           player_id INTEGER)''',
+    '''CREATE TABLE IF NOT EXISTS tournaments (tourn_key INTEGER PRIMARY KEY
+                                               AUTOINCREMENT,
+                                               tourn_id TEXT UNIQUE)''',
+]
+NAME_SUFFIXES = ['jr', 'sr', 'ii', 'iii', 'iv', 'v']
+
+
+def normalize_name(name):
+    '''
+    Key used to match spelling variants of a player name across sources.
+        Accents and punctuation are dropped, hyphens become spaces, case,
+        whitespace and initials are folded and 'Last, First' is turned
+        around.
+        i.e. 'Love III, Davis' / 'Davis Love III' -> 'davis love iii'
+    '''
+    name = unicodedata.normalize('NFKD', str(name))
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    name = name.lower().replace('-', ' ')
+    parts = [p.strip() for p in name.split(',')]
+    if len(parts) == 2 and re.sub(r'[^a-z]', '', parts[1]) not in \
+            NAME_SUFFIXES:
+        name = parts[1] + ' ' + parts[0]
+    name = re.sub(r"[^a-z0-9 ]", '', name.replace('.', ' '))
+    # Run initials together so 'K.J.' and 'K. J.' match
+    name = re.sub(r'\b([a-z]) (?=[a-z]\b)', r'\1', ' '.join(name.split()))
+    return name
+
+
+def player_key(*frames):
+    '''
+    Column to join / group players on: the int32 player_id if every frame
+        carries it, else player_name
+    '''
+    if all('player_id' in df.columns for df in frames):
+        return 'player_id'
+    return 'player_name'
+
+
+class IdDictionary(object):
+    """
+    Persistent player / tournament dictionary. Players get a stable integer
+        player_id keyed on the normalized name, so spelling variants from the
+        stat and event pages share an id (explicit aliases can be added for
+        variants normalization doesn't catch). Tournaments get a stable
+        tourn_key per tourn_id. Ids are assigned once and never reused. The
+        display name of a player is the first spelling seen.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # Other processes may hold the write lock while assigning ids
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        for stmt in SCHEMA:
+            self.conn.execute(stmt)
+        self.conn.commit()
+        self._keys = dict(self.conn.execute(
+            'SELECT name_key, player_id FROM player_keys'))
+        self._names = dict(self.conn.execute(
+            'SELECT player_id, name FROM players'))
+        self._tourns = dict(self.conn.execute(
+            'SELECT tourn_id, tourn_key FROM tournaments'))
+        self._aliases = dict(self.conn.execute(
+            'SELECT name_key, player_id FROM aliases'))
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        '''
+        Hold the database write lock, so processes sharing the dictionary
+            assign each new player / tournament once
+        '''
+        self.conn.commit()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    def add_alias(self, name, canonical_name):
+        '''
+        Map a spelling of a player name onto the id of canonical_name
+        '''
+        p_id = int(self.player_ids([canonical_name])[0])
+        key = normalize_name(name)
+        with self._transaction():
+            for table in ['player_keys', 'aliases']:
+                self.conn.execute('INSERT OR REPLACE INTO {} VALUES (?, ?)'
+                                  .format(table), (key, p_id))
+        self._keys[key] = p_id
+        self._aliases[key] = p_id
+        return p_id
+
+    def version(self):
+        '''
+        Hash of the explicit aliases. Ids of existing players only change
+            through add_alias (new players get new ids), so frames encoded
+            under the same version have the same ids. Aliases added by other
+            processes are read from the database first.
+        '''
+        aliases = dict(self.conn.execute(
+            'SELECT name_key, player_id FROM aliases'))
+        if aliases != self._aliases:
+            self._aliases = aliases
+            self._keys.update(aliases)
+        desc = json.dumps(sorted(self._aliases.items()))
+        return hashlib.sha1(desc.encode()).hexdigest()
+
+    def player_ids(self, names, add=True):
+        '''
+        Return int32 player_ids for an array of names, assigning ids to new
+            players if add (otherwise unknown names are -1). Names missing
+            from memory are looked up in the database first, since another
+            process may have added them.
+        '''
+        uniq, inverse = np.unique(np.asarray(names, dtype=object).astype(str),
+                                  return_inverse=True)
+        keys = [normalize_name(x) for x in uniq]
+        missing = [(k, n) for k, n in zip(keys, uniq) if k not in self._keys]
+        if len(missing) > 0:
+            for key, _ in missing:
+                self._select_player(key)
+            missing = [(k, n) for k, n in missing if k not in self._keys]
+        if len(missing) > 0 and add:
+            with self._transaction():
+                for key, name in missing:
+                    if self._select_player(key) is not None:
+                        continue
+                    cur = self.conn.execute(
+                        'INSERT INTO players (name) VALUES (?)', (name,))
+                    self.conn.execute(
+                        'INSERT OR IGNORE INTO player_keys VALUES (?, ?)',
+                        (key, cur.lastrowid))
+                    self._select_player(key)
+        ids = np.array([self._keys.get(k, -1) for k in keys], dtype=np.int32)
+        return ids[inverse]
+
+    def player_names(self, player_ids):
+        '''
+        Return display names for an array of player_ids
+        '''
+        missing = set(int(x) for x in player_ids) - set(self._names)
+        if len(missing) > 0:
+            self._names.update(self.conn.execute(
+                'SELECT player_id, name FROM players WHERE player_id IN '
+                '({})'.format(','.join('?' * len(missing))), list(missing)))
+        return np.array([self._names.get(int(p_id)) for p_id in player_ids],
+                        dtype=object)
+
+    def tourn_keys(self, tourn_ids, add=True):
+        '''
+        Return int32 tourn_keys for an array of tourn_ids
+        '''
+        uniq, inverse = np.unique(np.asarray(tourn_ids, dtype=object)
+                                  .astype(str), return_inverse=True)
+        missing = [x for x in uniq if x not in self._tourns]
+        for t_id in missing:
+            self._select_tourn(t_id)
+        missing = [x for x in missing if x not in self._tourns]
+        if len(missing) > 0 and add:
+            with self._transaction():
+                for t_id in missing:
+                    self.conn.execute('INSERT OR IGNORE INTO tournaments '
+                                      '(tourn_id) VALUES (?)', (t_id,))
+                    self._select_tourn(t_id)
+        keys = np.array([self._tourns.get(x, -1) for x in uniq],
+                        dtype=np.int32)
+        return keys[inverse]
+
+    def _select_player(self, key):
+        row = self.conn.execute('SELECT k.player_id, p.name FROM player_keys '
+                                'k JOIN players p ON k.player_id = '
+                                'p.player_id WHERE k.name_key = ?',
+                                (key,)).fetchone()
+        if row is not None:
+            self._keys[key] = row[0]
+            self._names[row[0]] = row[1]
+            return row[0]
+
+    def _select_tourn(self, t_id):
+        row = self.conn.execute('SELECT tourn_key FROM tournaments WHERE '
+                                'tourn_id = ?', (t_id,)).fetchone()
+        if row is not None:
+            self._tourns[t_id] = row[0]
+            return row[0]
+
+    def encode(self, inp_data, name_col='player_name', tourn_col='tourn_id'):
+        '''
+        Add int32 player_id (and tourn_key) columns to a frame in place and
+            store the name / tourn_id columns as categoricals. Names are
+            replaced by the player's display name.
+        '''
+        p_ids = self.player_ids(inp_data[name_col].values)
+        inp_data['player_id'] = p_ids
+        inp_data[name_col] = self.name_categorical(p_ids)
+        if tourn_col in inp_data.columns:
+            inp_data['tourn_key'] = self.tourn_keys(inp_data[tourn_col].values)
+            inp_data[tourn_col] = inp_data[tourn_col].astype(str).astype(
+                'category')
+        return inp_data
+
+    def decode(self, inp_data):
+        '''
+        Return a copy of a frame with categorical columns turned back into
+            plain strings and the integer id columns dropped, for output
+        '''
+        out = inp_data.drop(columns=['player_id', 'tourn_key'],
+                            errors='ignore')
+        for col in out.columns:
+            if isinstance(out[col].dtype, pd.CategoricalDtype):
+                out[col] = out[col].astype(str)
+        return out
+
+    def name_categorical(self, p_ids):
+        '''
+        Categorical of display names for an array of player_ids
+        '''
+        uniq, inverse = np.unique(p_ids, return_inverse=True)
+        names = self.player_names(uniq)
+        # Categories in name order so sorting on the column sorts by name
+        order = np.argsort(names.astype(str), kind='stable')
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order))
+        return pd.Categorical.from_codes(rank[inverse], names[order])
@@ -0,0 +1,256 @@
+import io
+import os
+import csv
+import sys
+import time
+import asyncio
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from workbench.projects.pga.data.crawler import Crawler, write_atomic
+from workbench.projects.pga.data.event_downloader import (EventDownloader,
+                                                          add_event_meta,
+                                                          normalize_event_csv)
+from workbench.projects.pga.data.html_parsers import (DEFAULT_BACKEND,
+                                                      read_page_text,
+                                                      write_event_meta)
+from workbench.projects.pga.data.meta_index import MetaIndex
+from workbench.projects.pga.data.metrics import METRICS, timed
+
+
+def parse_event_page(content, backend=DEFAULT_BACKEND):
+    '''
+    Parse a fetched event page to a normalized results frame and its meta
+        (date, par, course). The table goes through the csv reader in
+        memory so dtypes match frames loaded from csv files. Return None if
+        the page has no results table.
+    '''
+    parsers, page = read_page_text(content.decode('utf-8', 'replace'),
+                                   backend)
+    csv_lines = parsers['event_table'](page)
+    if csv_lines is None or len(csv_lines) <= 1:
+        return
+    buf = io.StringIO()
+    csv.writer(buf, delimiter=',').writerows(csv_lines)
+    buf.seek(0)
+    ev_csv = normalize_event_csv(pd.read_csv(buf))
+    return ev_csv, parsers['event_meta'](page)
+
+
+class EventIngest(object):
+    """
+    Streaming event ingestion. Fetched pages flow through bounded queues to
+        parse workers and on to a batched writer into the parquet store, with
+        no html or csv files in between. The queue bounds give backpressure
+        so memory stays flat however many pages are queued. Event ids are
+        assigned in the meta index as events are written and a meta sidecar
+        is written for each. If archive_html the raw pages are also written
+        to the html tree on the side.
+    """
+    def __init__(self, downloader, crawler=None, n_workers=None,
+                 queue_size=32, batch_events=50, archive_html=False,
+                 backend=DEFAULT_BACKEND):
+        self.downloader = downloader
+        self.crawler = crawler or Crawler()
+        self.n_workers = n_workers
+        self.queue_size = queue_size
+        self.batch_events = batch_events
+        self.archive_html = archive_html
+        self.backend = backend
+
+    def run(self, jobs):
+        '''
+        Ingest a list of (tourn_id, year, url) jobs. Return report of urls
+            that failed to download or had no results table and the number
+            of events written.
+        '''
+        self.failed = []
+        self.no_data = []
+        self.n_events = 0
+        executor = None
+        if self.n_workers:
+            executor = ProcessPoolExecutor(self.n_workers)
+        # sqlite and store writes stay on one thread off the event loop
+        self._write_pool = ThreadPoolExecutor(1)
+        try:
+            asyncio.run(self._run(jobs, executor))
+        finally:
+            self._write_pool.submit(self._close_index).result()
+            self._write_pool.shutdown()
+            if executor is not None:
+                executor.shutdown()
+        return dict(failed=self.failed, no_data=self.no_data,
+                    n_events=self.n_events)
+
+    @timed('ingest_write_batch')
+    def write_batch(self, batch):
+        '''
+        Assign event ids and add meta to a batch of parsed events, then
+            merge them into each tournament's store partition replacing any
+            rows for the same years
+        '''
+        index = self._index()
+        by_tourn = {}
+        for t_id, year, ev_csv, meta in batch:
+            (date, par, course) = meta
+            t_label = self.downloader.tourn_meta[t_id]['tourn_label']
+            e_id = index.upsert_event(t_id, t_label, year, date, par, course)
+            write_event_meta(os.path.join(self.downloader.meta_base, t_label,
+                                          '{}.json'.format(year)), meta)
+            e_dat = dict(event_id=str(e_id), date=date, par=par,
+                         course=course)
+            by_tourn.setdefault(t_id, []).append(add_event_meta(ev_csv, year,
+                                                                e_dat))
+        index.conn.commit()
+        for t_id, frames in by_tourn.items():
+            new_data = pd.concat(frames, ignore_index=True, sort=False)
+            new_data['tourn_label'] = self.downloader.tourn_meta[t_id][
+                'tourn_label']
+            new_data['tourn_id'] = t_id
+            old_data = self._existing(t_id)
+            if old_data is not None:
+                old_data = old_data[~old_data.year.isin(new_data.year)]
+                new_data = pd.concat([old_data, new_data], ignore_index=True,
+                                     sort=False)
+            self.downloader.store.write_partition(t_id, new_data)
+        self.n_events += len(batch)
+        METRICS.inc('events_ingested', len(batch))
+
+    #########################################################
+
+    def _index(self):
+        if not hasattr(self, '_meta_index'):
+            self._meta_index = MetaIndex(os.path.join(
+                self.downloader.data_dir, 'meta_index.sqlite'))
+            if (self._meta_index.n_events() == 0 and
+                    hasattr(self.downloader, 'event_meta')):
+                self._meta_index.seed_events(self.downloader.event_meta)
+        return self._meta_index
+
+    def _close_index(self):
+        if hasattr(self, '_meta_index'):
+            self._meta_index.close()
+            del self._meta_index
+
+    def _existing(self, t_id):
+        '''
+        Current data for a tournament: the store partition, or its csv files
+            if it has not been migrated (so the first streamed write does not
+            hide them)
+        '''
+        if self.downloader.store.has_partition(t_id):
+            return self.downloader.store.read_partition(t_id)
+        t_label = self.downloader.tourn_meta[t_id]['tourn_label']
+        if os.path.isdir(os.path.join(self.downloader.csv_base, t_label)):
+            return self.downloader.load_csv(t_id, use_store=False)
+
+    async def _run(self, jobs, executor):
+        job_q = asyncio.Queue()
+        for job in jobs:
+            job_q.put_nowait(job)
+        page_q = asyncio.Queue(self.queue_size)
+        parsed_q = asyncio.Queue(self.queue_size)
+        async with self.crawler.open_session() as session:
+            fetchers = [asyncio.ensure_future(self._fetcher(session, job_q,
+                                                            page_q))
+                        for _ in range(self.crawler.max_concurrency)]
+            parsers = [asyncio.ensure_future(self._parser(page_q, parsed_q,
+                                                          executor))
+                       for _ in range(max(1, self.n_workers or 1))]
+            writer = asyncio.ensure_future(self._writer(parsed_q))
+            closer = asyncio.ensure_future(self._close_stages(
+                fetchers, parsers, writer, page_q, parsed_q))
+            # Wait on every stage so a failed one can't leave the others
+            # blocked on a full queue, cancelling the rest if one fails
+            done, pending = await asyncio.wait(
+                fetchers + parsers + [writer, closer],
+                return_when=asyncio.FIRST_EXCEPTION)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+
+    async def _close_stages(self, fetchers, parsers, writer, page_q,
+                            parsed_q):
+        '''
+        Signal each stage to finish once the stage feeding it is done
+        '''
+        await asyncio.gather(*fetchers)
+        for _ in parsers:
+            await page_q.put(None)
+        await asyncio.gather(*parsers)
+        await parsed_q.put(None)
+        await writer
+
+    async def _fetcher(self, session, job_q, page_q):
+        loop = asyncio.get_running_loop()
+        while not job_q.empty():
+            t_id, year, url = job_q.get_nowait()
+            resp = await self.crawler.fetch(session, url)
+            if resp is None:
+                self.failed.append(url)
+                continue
+            content = resp[1]
+            if self.archive_html:
+                t_label = self.downloader.tourn_meta[t_id]['tourn_label']
+                html_path = os.path.join(self.downloader.html_base, t_label,
+                                         '{}.html'.format(year))
+                await loop.run_in_executor(None, self._archive, html_path,
+                                           content)
+            await page_q.put((t_id, year, url, content))
+
+    async def _parser(self, page_q, parsed_q, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await page_q.get()
+            if item is None:
+                return
+            t_id, year, url, content = item
+            start = time.perf_counter()
+            try:
+                parsed = await loop.run_in_executor(
+                    executor, parse_event_page, content, self.backend)
+            except Exception as err:
+                # A malformed page (i.e. more cells than headers) is
+                # reported like a page without a table
+                print('Unable to parse {}: {!r}'.format(url, err))
+                parsed = None
+            METRICS.observe('parse_seconds', time.perf_counter() - start,
+                            source='events')
+            METRICS.inc('pages_parsed', source='events')
+            if parsed is None:
+                METRICS.inc('parse_failures', source='events')
+                self.no_data.append(url)
+                continue
+            await parsed_q.put((t_id, year) + parsed)
+
+    async def _writer(self, parsed_q):
+        loop = asyncio.get_running_loop()
+        batch = []
+        while True:
+            item = await parsed_q.get()
+            if item is not None:
+                batch.append(item)
+            if len(batch) > 0 and (item is None or
+                                   len(batch) >= self.batch_events):
+                await loop.run_in_executor(self._write_pool,
+                                           self.write_batch, batch)
+                batch = []
+            if item is None:
+                return
+
+    def _archive(self, html_path, content):
+        html_dir = os.path.dirname(html_path)
+        if not os.path.exists(html_dir):
+            os.makedirs(html_dir, exist_ok=True)
+        write_atomic(html_path, content)
+
+
+if __name__ == '__main__':
+    # i.e. python ingest.py 2019
+    ed = EventDownloader(research=True)
+    print(ed.ingest_season(int(sys.argv[1])))
+    METRICS.write_report(os.path.join(ed.data_dir, 'ingest_report.json'))
+    METRICS.write_prometheus(os.path.join(ed.data_dir, 'ingest.prom'))
@@ -0,0 +1,112 @@
+import warnings
+import numpy as np
+
+
+KERNEL_FUNCS = ['min', 'max', 'mean', 'median', 'count', 'last']
+
+
+def group_offsets(codes):
+    '''
+    Return group boundary offsets (n_groups + 1) for an array of group
+        codes where each group is contiguous
+    '''
+    codes = np.asarray(codes)
+    if len(codes) == 0:
+        return np.zeros(1, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    return np.r_[starts, len(codes)].astype(np.int64)
+
+
+def _rolling_loop(values, offsets, window, func_codes):
+    n_funcs = func_codes.shape[0]
+    out = np.full((n_funcs, values.shape[0]), np.nan)
+    buf = np.empty(window)
+    for g in range(offsets.shape[0] - 1):
+        start, end = offsets[g], offsets[g + 1]
+        for i in range(start, end):
+            # Collect non-null prior values in the window
+            n_valid = 0
+            for k in range(max(start, i - window), i):
+                if not np.isnan(values[k]):
+                    buf[n_valid] = values[k]
+                    n_valid += 1
+            for j in range(n_funcs):
+                f = func_codes[j]
+                if f == 4:
+                    out[j, i] = n_valid
+                elif f == 5:
+                    if i - window >= start:
+                        out[j, i] = values[i - window]
+                elif n_valid == 0:
+                    continue
+                elif f == 0:
+                    out[j, i] = buf[:n_valid].min()
+                elif f == 1:
+                    out[j, i] = buf[:n_valid].max()
+                elif f == 2:
+                    out[j, i] = buf[:n_valid].mean()
+                elif f == 3:
+                    out[j, i] = np.median(buf[:n_valid])
+    return out
+
+
+def _rolling_numpy(values, offsets, window, func_codes):
+    n_rows = values.shape[0]
+    grp_start = np.repeat(offsets[:-1], np.diff(offsets))
+    pos = np.arange(n_rows)
+    # Matrix of lagged values, column k holds the value k + 1 rows back
+    lagged = np.full((n_rows, window), np.nan)
+    for k in range(1, window + 1):
+        valid = pos - k >= grp_start
+        lagged[valid, k - 1] = values[pos[valid] - k]
+    out = np.full((func_codes.shape[0], n_rows), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for j, f in enumerate(func_codes):
+            if f == 0:
+                out[j] = np.nanmin(lagged, axis=1)
+            elif f == 1:
+                out[j] = np.nanmax(lagged, axis=1)
+            elif f == 2:
+                out[j] = np.nanmean(lagged, axis=1)
+            elif f == 3:
+                out[j] = np.nanmedian(lagged, axis=1)
+            elif f == 4:
+                out[j] = (~np.isnan(lagged)).sum(axis=1)
+            elif f == 5:
+                out[j] = lagged[:, window - 1]
+    return out
+
+
+_rolling_kernel = None
+
+
+def _get_kernel():
+    '''
+    Compile the numba kernel on first use so importing this module does not
+        pull in numba. Falls back to the numpy version without numba.
+    '''
+    global _rolling_kernel
+    if _rolling_kernel is None:
+        try:
+            import numba
+            _rolling_kernel = numba.njit(cache=True)(_rolling_loop)
+        except ImportError:
+            _rolling_kernel = _rolling_numpy
+    return _rolling_kernel
+
+
+def grouped_rolling(values, offsets, window, funcs):
+    '''
+    Compute window statistics over the prior `window` rows of each group in
+        a single pass. values must be ordered so each group is contiguous
+        and offsets gives the group boundaries. The current row is excluded
+        and nulls are skipped. 'last' is the value `window` rows back.
+        Return dict of func -> float64 array.
+    '''
+    func_codes = np.array([KERNEL_FUNCS.index(f) for f in funcs],
+                          dtype=np.int64)
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+    out = _get_kernel()(values, offsets, int(window), func_codes)
+    return {f: out[j] for j, f in enumerate(funcs)}
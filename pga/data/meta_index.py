@@ -0,0 +1,145 @@
+import os
+import hashlib
+import sqlite3
+
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY,
+                                        mtime_ns INTEGER)''',
+    '''CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY,
+                                         mtime_ns INTEGER,
+                                         size INTEGER,
+                                         sha1 TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS events (event_id INTEGER PRIMARY KEY
+                                          AUTOINCREMENT,
+                                          tourn_id TEXT,
+                                          tourn_label TEXT,
+                                          year INTEGER,
+                                          date TEXT,
+                                          par INTEGER,
+                                          course TEXT,
+                                          UNIQUE (tourn_id, year))''',
+]
+EVENT_COLS = ['tourn_id', 'tourn_label', 'year', 'date', 'par', 'course']
+
+
+def file_sha1(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as fl:
+        for block in iter(lambda: fl.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class MetaIndex(object):
+    """
+    SQLite index of directory / file state and event meta. Used to refresh
+        meta files incrementally: only directories whose mtime changed are
+        listed and only files whose mtime, size and hash changed are read.
+        event_ids are assigned once per (tourn_id, year) and never reused.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        for stmt in SCHEMA:
+            self.conn.execute(stmt)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def dir_changed(self, path):
+        row = self.conn.execute('SELECT mtime_ns FROM dirs WHERE path = ?',
+                                (path,)).fetchone()
+        if not os.path.exists(path):
+            return row is not None
+        return row is None or row[0] != os.stat(path).st_mtime_ns
+
+    def mark_dir(self, path):
+        if not os.path.exists(path):
+            self.conn.execute('DELETE FROM dirs WHERE path = ?', (path,))
+            return
+        self.conn.execute('INSERT OR REPLACE INTO dirs VALUES (?, ?)',
+                          (path, os.stat(path).st_mtime_ns))
+
+    def file_changed(self, path):
+        '''
+        Return True if the file is new or its content changed since it was
+            last marked. Hashes are only computed when mtime or size moved.
+        '''
+        row = self.conn.execute('SELECT mtime_ns, size, sha1 FROM files '
+                                'WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return True
+        st = os.stat(path)
+        if (row[0], row[1]) == (st.st_mtime_ns, st.st_size):
+            return False
+        if row[2] == file_sha1(path):
+            self.mark_file(path)
+            return False
+        return True
+
+    def mark_file(self, path):
+        st = os.stat(path)
+        self.conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                          (path, st.st_mtime_ns, st.st_size,
+                           file_sha1(path)))
+
+    def n_events(self):
+        return self.conn.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    def seed_events(self, event_meta):
+        '''
+        Load existing event_meta dict so previously published event_ids are
+            kept. Legacy entries may store the year under 'yea'.
+        '''
+        for e_id, e_dat in event_meta.items():
+            year = e_dat.get('year', e_dat.get('yea'))
+            self.conn.execute(
+                'INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (int(e_id), e_dat['tourn_id'], e_dat['tourn_label'], year,
+                 e_dat['date'], e_dat['par'], e_dat['course']))
+
+    def upsert_event(self, tourn_id, tourn_label, year, date, par, course):
+        '''
+        Insert or update the event for (tourn_id, year) keeping its event_id
+            if it already exists. Return the event_id.
+        '''
+        row = self.conn.execute('SELECT event_id FROM events WHERE '
+                                'tourn_id = ? AND year = ?',
+                                (tourn_id, year)).fetchone()
+        if row is None:
+            cur = self.conn.execute(
+                'INSERT INTO events (tourn_id, tourn_label, year, date, par, '
+                'course) VALUES (?, ?, ?, ?, ?, ?)',
+                (tourn_id, tourn_label, year, date, par, course))
+            return cur.lastrowid
+        self.conn.execute('UPDATE events SET tourn_label = ?, date = ?, '
+                          'par = ?, course = ? WHERE event_id = ?',
+                          (tourn_label, date, par, course, row[0]))
+        return row[0]
+
+    def drop_missing_events(self, tourn_id, years):
+        '''
+        Remove events for a tournament whose year is no longer available
+        '''
+        rows = self.conn.execute('SELECT event_id, year FROM events WHERE '
+                                 'tourn_id = ?', (tourn_id,)).fetchall()
+        for e_id, yr in rows:
+            if yr not in years:
+                self.conn.execute('DELETE FROM events WHERE event_id = ?',
+                                  (e_id,))
+
+    def event_years(self, tourn_id):
+        rows = self.conn.execute('SELECT year FROM events WHERE tourn_id = ?',
+                                 (tourn_id,)).fetchall()
+        return set(r[0] for r in rows)
+
+    def events(self):
+        '''
+        Return dict of event_id -> event meta dict
+        '''
+        rows = self.conn.execute('SELECT event_id, {} FROM events ORDER BY '
+                                 'event_id'.format(', '.join(EVENT_COLS)))
+        return {r[0]: dict(zip(EVENT_COLS, r[1:])) for r in rows}
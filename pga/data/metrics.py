@@ -0,0 +1,197 @@
+import os
+import time
+import threading
+import functools
+
+import workbench.utils.read_write as rw
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5.,
+                   10., 30., 60., 300.)
+PROM_PREFIX = 'pga_'
+
+
+def _escape(value):
+    '''
+    Escape a label value for the Prometheus text format
+    '''
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def _series(name, labels):
+    if len(labels) == 0:
+        return name
+    return '{}{{{}}}'.format(name, ','.join(
+        '{}="{}"'.format(k, _escape(v)) for k, v in sorted(labels.items())))
+
+
+class Metrics(object):
+    """
+    In process registry of counters and histograms for the download, parse
+        and build pipelines. Series are a name plus optional labels, i.e.
+        inc('pages_fetched', source='events'). Stage timers observe into the
+        stage_seconds histogram labelled by stage. Export with report /
+        write_report (json) or to_prometheus / write_prometheus /
+        serve_prometheus (Prometheus text format).
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.counters = {}
+            self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = dict(count=0, sum=0., min=value, max=value,
+                            buckets=[0] * len(self.buckets))
+                self.histograms[key] = hist
+            hist['count'] += 1
+            hist['sum'] += value
+            hist['min'] = min(hist['min'], value)
+            hist['max'] = max(hist['max'], value)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist['buckets'][i] += 1
+
+    def timer(self, stage, **labels):
+        return _Timer(self, stage, labels)
+
+    def report(self):
+        '''
+        Return dict of counters and histogram summaries
+        '''
+        with self.lock:
+            counters = {_series(n, dict(l)): v for (n, l), v in
+                        sorted(self.counters.items())}
+            histograms = {}
+            for (name, labels), hist in sorted(self.histograms.items()):
+                summary = dict(hist)
+                summary['mean'] = hist['sum'] / hist['count']
+                summary['buckets'] = {str(b): c for b, c in
+                                      zip(self.buckets, hist['buckets'])}
+                histograms[_series(name, dict(labels))] = summary
+        return dict(started=self.started, elapsed=time.time() - self.started,
+                    counters=counters, histograms=histograms)
+
+    def write_report(self, path):
+        rw.write_dict_to_json(self.report(), path)
+
+    def to_prometheus(self):
+        '''
+        Render all series in the Prometheus text exposition format
+        '''
+        lines = []
+        with self.lock:
+            for name in sorted(set(n for n, _ in self.counters)):
+                lines.append('# TYPE {}{}_total counter'.format(PROM_PREFIX,
+                                                               name))
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append('{} {}'.format(_series(
+                            PROM_PREFIX + name + '_total', dict(labels)),
+                            value))
+            for name in sorted(set(n for n, _ in self.histograms)):
+                p_name = PROM_PREFIX + name
+                lines.append('# TYPE {} histogram'.format(p_name))
+                for (n, labels), hist in sorted(self.histograms.items()):
+                    if n != name:
+                        continue
+                    labels = dict(labels)
+                    for bound, count in zip(self.buckets, hist['buckets']):
+                        lines.append('{} {}'.format(_series(
+                            p_name + '_bucket', dict(labels, le=bound)),
+                            count))
+                    lines.append('{} {}'.format(_series(
+                        p_name + '_bucket', dict(labels, le='+Inf')),
+                        hist['count']))
+                    lines.append('{} {}'.format(_series(p_name + '_sum',
+                                                        labels), hist['sum']))
+                    lines.append('{} {}'.format(_series(p_name + '_count',
+                                                        labels),
+                                                hist['count']))
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        '''
+        Write a .prom file, i.e. for the node_exporter textfile collector
+        '''
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as p_fl:
+            p_fl.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def serve_prometheus(self, port=9108, host='127.0.0.1'):
+        '''
+        Serve /metrics from a daemon thread. Return the server.
+        '''
+        import http.server
+
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class _Timer(object):
+
+    def __init__(self, metrics, stage, labels):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.secs = time.perf_counter() - self.start
+        self.metrics.observe('stage_seconds', self.secs, stage=self.stage,
+                             **self.labels)
+        if exc_type is not None:
+            self.metrics.inc('stage_failures', stage=self.stage,
+                             **self.labels)
+        return False
+
+
+METRICS = Metrics()
+
+
+def timed(stage):
+    '''
+    Decorator timing every call of a function as a stage in METRICS
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with METRICS.timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
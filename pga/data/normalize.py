@@ -0,0 +1,62 @@
+import pandas as pd
+
+
+POS_STATUS = ['made_cut', 'CUT', 'WD', 'DQ', 'MDF', 'unknown']
+RANK_STATUS = ['ranked', 'missing']
+STATUS_MAP = {'CUT': 'CUT', 'W/D': 'WD', 'WD': 'WD', 'DQ': 'DQ', 'MDF': 'MDF'}
+
+
+def parse_ranks(inp_ranks):
+    '''
+    Split raw rank / position strings (i.e. '4', 'T4', 'CUT', nan) into a
+        nullable integer Series and a boolean tied flag
+    '''
+    raw = inp_ranks.astype(str).str.strip().str.upper()
+    tied = raw.str.startswith('T').fillna(False).astype(bool)
+    nums = pd.to_numeric(raw.str.replace('T', '', regex=False),
+                         errors='coerce')
+    return nums.round().astype('Int32'), tied
+
+
+def normalize_stat_ranks(yr_data, rank_cols=('RANK THIS WEEK',
+                                             'RANK LAST WEEK')):
+    '''
+    Convert rank columns of a single stat year in place. Ranks are nullable
+        integers (NA when missing, i.e. no rank last week) rather than a
+        filled in last place, so they never look like a real rank. Adds for
+        each rank column:
+        <col> TIED - tied rank flag
+        <col> STATUS - categorical ranked/missing
+    '''
+    for col in rank_cols:
+        nums, tied = parse_ranks(yr_data[col])
+        yr_data[col] = nums.values
+        yr_data[col + ' TIED'] = tied.values
+        yr_data[col + ' STATUS'] = pd.Categorical(
+            nums.notna().map({True: 'ranked', False: 'missing'}).values,
+            categories=RANK_STATUS)
+    return yr_data
+
+
+def normalize_positions(ev_data, pos_col='POS'):
+    '''
+    Convert finishing positions of a single event in place. Adds:
+        POS_num - nullable finishing position (NA for CUT/WD/DQ/missing)
+        POS_tied - tied finish flag
+        POS_status - categorical made_cut/CUT/WD/DQ/MDF/unknown
+        POS - POS_num with non finishers set to last place
+        POS_pct - POS / last place
+        Last place is the number of players with a finishing position + 1.
+    '''
+    raw = ev_data[pos_col].astype(str).str.strip().str.upper()
+    nums, tied = parse_ranks(ev_data[pos_col])
+    status = raw.map(STATUS_MAP)
+    status = status.where(nums.isna(), 'made_cut').fillna('unknown')
+    last_place = int(nums.notna().sum()) + 1
+    ev_data[pos_col + '_num'] = nums.values
+    ev_data[pos_col + '_tied'] = tied.values
+    ev_data[pos_col + '_status'] = pd.Categorical(status.values,
+                                                  categories=POS_STATUS)
+    ev_data[pos_col] = nums.fillna(last_place).astype('int32').values
+    ev_data[pos_col + '_pct'] = ev_data[pos_col] / float(last_place)
+    return ev_data
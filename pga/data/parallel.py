@@ -0,0 +1,49 @@
+from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def chunk_jobs(jobs, chunk_size):
+    return [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+
+def run_chunked(func, jobs, n_workers=None, chunk_size=50):
+    '''
+    Split jobs into chunks and call func(chunk) for each one, which should
+        return a list. If n_workers is None chunks are run in this process,
+        otherwise across a process pool. Results are concatenated in job
+        order either way.
+    '''
+    chunks = chunk_jobs(list(jobs), chunk_size)
+    if n_workers is None:
+        results = [func(c) for c in tqdm(chunks)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(tqdm(executor.map(func, chunks),
+                                total=len(chunks)))
+    out = []
+    for res in results:
+        out.extend(res)
+    return out
+
+
+def run_threaded(func, items, n_workers=None):
+    '''
+    Call func(item) for each item. If n_workers is None items are run in
+        this thread, otherwise across a thread pool. Results are returned in
+        item order either way.
+    '''
+    items = list(items)
+    if n_workers is None:
+        return [func(x) for x in tqdm(items)]
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        return list(tqdm(executor.map(func, items), total=len(items)))
+
+
+def start_process_pool(n_workers):
+    '''
+    Return a process pool with its workers already started from this
+        thread, so they are not forked later from inside worker threads
+    '''
+    executor = ProcessPoolExecutor(max_workers=n_workers)
+    list(executor.map(abs, range(n_workers)))
+    return executor
@@ -0,0 +1,187 @@
+import os
+import numpy as np
+import pandas as pd
+
+from workbench.projects.pga.data.metrics import METRICS
+
+
+BASE_DATA_PATH = os.path.join(os.getenv('DATA'), 'pydata', 'projects', 'pga')
+
+
+class ParquetStore(object):
+    """
+    Consolidated columnar store for processed stat/event data. Each id
+        (stat_id or tourn_id) is a hive style partition holding a single
+        parquet file sorted by year with one row group per year, so id
+        filters prune on path and year filters prune on row group stats.
+    """
+    def __init__(self, store_dir, partition_col):
+        self.store_dir = store_dir
+        self.partition_col = partition_col
+
+    def partition_path(self, part_id):
+        part_dir = '{}={}'.format(self.partition_col, part_id)
+        return os.path.join(self.store_dir, part_dir, 'data.parquet')
+
+    def has_partition(self, part_id):
+        return os.path.isfile(self.partition_path(part_id))
+
+    def available_ids(self):
+        if not os.path.exists(self.store_dir):
+            return []
+        prefix = '{}='.format(self.partition_col)
+        return [x.replace(prefix, '') for x in os.listdir(self.store_dir)
+                if x.find(prefix) == 0]
+
+    def write_partition(self, part_id, inp_data):
+        '''
+        Write (replace) the data for a single id. Object columns are written
+            as strings so every partition has a consistent typed schema.
+        '''
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        assert 'year' in inp_data.columns
+        data = inp_data.sort_values('year', kind='stable')
+        data = data.reset_index(drop=True)
+        for col in data.columns:
+            if data[col].dtype == object:
+                data[col] = data[col].astype('string')
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        part_path = self.partition_path(part_id)
+        if not os.path.exists(os.path.dirname(part_path)):
+            os.makedirs(os.path.dirname(part_path))
+        # Write to temp file and rename so readers never see partial files
+        tmp_path = part_path + '.tmp'
+        with METRICS.timer('store_write', store=self.partition_col):
+            with pq.ParquetWriter(tmp_path, table.schema) as writer:
+                for yr in data.year.unique():
+                    yr_table = table.filter(pc.equal(table['year'], yr))
+                    writer.write_table(yr_table)
+            os.replace(tmp_path, part_path)
+        METRICS.inc('rows_written', len(data), store=self.partition_col)
+
+    def read_partition(self, part_id, year=None, min_year=None, columns=None,
+                       skip_years=()):
+        '''
+        Read the data for a single id, filtering to a single year or all
+            years greater than or equal to min_year, less any skip_years.
+            Requested columns missing from the partition are skipped.
+            String columns come back as object columns with nan for missing
+            values, as read from csv.
+        '''
+        import pyarrow.dataset as ds
+
+        part_path = self.partition_path(part_id)
+        if not os.path.isfile(part_path):
+            raise FileNotFoundError('No partition at {}'.format(part_path))
+        dataset = ds.dataset(part_path, format='parquet')
+        if columns is not None:
+            columns = [c for c in columns if c in dataset.schema.names]
+        table = dataset.to_table(columns=columns, filter=self._year_filter(
+            year, min_year, skip_years))
+        out = table.to_pandas()
+        for col in out.columns:
+            if isinstance(out[col].dtype, pd.StringDtype):
+                is_na = out[col].isna().values
+                out[col] = out[col].astype(object)
+                out.loc[is_na, col] = np.nan
+        return out
+
+    def partition_years(self, part_id):
+        '''
+        Years held in a partition, from the row group statistics (one row
+            group per year) when available
+        '''
+        import pyarrow.parquet as pq
+
+        if not self.has_partition(part_id):
+            return set()
+        meta = pq.ParquetFile(self.partition_path(part_id)).metadata
+        if 'year' in meta.schema.names:
+            col_ix = meta.schema.names.index('year')
+            years = set()
+            for i in range(meta.num_row_groups):
+                stats = meta.row_group(i).column(col_ix).statistics
+                if stats is None or not stats.has_min_max or \
+                        stats.min != stats.max:
+                    break
+                years.add(int(stats.min))
+            else:
+                return years
+        years = self.read_partition(part_id, columns=['year']).year
+        return set(int(x) for x in years.unique())
+
+    def read(self, part_ids, year=None, min_year=None, columns=None):
+        '''
+        Read and stack the data for a list of ids
+        '''
+        frames = [self.read_partition(p, year, min_year, columns)
+                  for p in part_ids]
+        return pd.concat(frames, ignore_index=True, sort=False)
+
+    def fresh_years(self, part_id, csv_dir):
+        '''
+        Years held in a partition whose csv in csv_dir (<year>.csv) is not
+            newer than the partition, i.e. has not been re-processed since
+            the partition was written
+        '''
+        if not self.has_partition(part_id):
+            return set()
+        part_mtime = os.path.getmtime(self.partition_path(part_id))
+        years = set()
+        for yr in self.partition_years(part_id):
+            csv_path = os.path.join(csv_dir, '{}.csv'.format(yr))
+            if not os.path.isfile(csv_path) or \
+                    os.path.getmtime(csv_path) <= part_mtime:
+                years.add(yr)
+        return years
+
+    def _year_filter(self, year=None, min_year=None, skip_years=()):
+        import pyarrow.dataset as ds
+
+        out = None
+        if year is not None:
+            out = ds.field('year') == int(year)
+        elif min_year:
+            out = ds.field('year') >= int(min_year)
+        if len(skip_years) > 0:
+            skip = ~ds.field('year').isin([int(x) for x in skip_years])
+            out = skip if out is None else out & skip
+        return out
+
+
+def merge_store_csv(store_data, csv_frames, csv_data):
+    '''
+    Stack a partition read with the csv years it does not cover or holds
+        an older version of (i.e. processed after migration), in year
+        order
+    '''
+    if len(csv_frames) == 0:
+        return store_data
+    if len(store_data) == 0:
+        return csv_data
+    out = pd.concat([store_data, csv_data], ignore_index=True, sort=False)
+    if 'year' in out.columns:
+        out = out.sort_values('year', kind='stable')
+    return out.reset_index(drop=True)
+
+
+def migrate_csv_to_parquet(data_path=BASE_DATA_PATH, stat_ids=None,
+                           tourn_ids=None):
+    '''
+    One-shot build of the stat and event parquet stores from the existing
+        csv trees. Ranks and positions are normalized on the way in.
+    '''
+    from workbench.projects.pga.data.stat_downloader import StatDownloader
+    from workbench.projects.pga.data.event_downloader import EventDownloader
+
+    sd = StatDownloader(os.path.join(data_path, 'stats'), research=True)
+    ed = EventDownloader(os.path.join(data_path, 'events'), research=True)
+    sd.build_parquet_store(stat_ids)
+    ed.build_parquet_store(tourn_ids)
+
+
+if __name__ == '__main__':
+    migrate_csv_to_parquet()
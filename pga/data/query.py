@@ -0,0 +1,193 @@
+from workbench.projects.pga.data.build_cache import fingerprint_paths
+from workbench.projects.pga.data.feature_creator import FeatureCreator
+
+
+class Query(object):
+    """
+    Lazy query over a DataReader. Builder methods return a new Query and
+        nothing is loaded until collect(), i.e.
+
+            dr.query().stats(['101', '102']).events(['63', '64']) \
+                .since(2000).asof_join(backfill=True) \
+                .features([('mean', 5)]).collect()
+
+        collect() compiles a plan (see explain) that:
+            - only loads stats whose columns survive select()
+            - pushes the since() year filter down to the loaders
+            - reuses loaded stats / tournaments and joined frames from the
+              reader's query_cache, so another stat subset or a later
+              since() year does not reload data already in memory. Cached
+              frames are keyed on the source file fingerprints BuildCache
+              uses (and the id dictionary version), so changed csvs or
+              store partitions are read again.
+    """
+    def __init__(self, reader, spec=None):
+        self.reader = reader
+        self.spec = dict(stat_ids=[], tourn_ids=[], min_year=None,
+                         backfill=False, max_gap=None, drop_prev_cols=True,
+                         features=[], columns=None)
+        if spec is not None:
+            self.spec.update(spec)
+
+    def _with(self, **kwargs):
+        spec = dict(self.spec)
+        spec.update(kwargs)
+        return Query(self.reader, spec)
+
+    def stats(self, stat_ids, drop_prev_cols=True):
+        if isinstance(stat_ids, (float, int, str)):
+            stat_ids = [stat_ids]
+        return self._with(stat_ids=[str(x) for x in stat_ids],
+                          drop_prev_cols=drop_prev_cols)
+
+    def events(self, tourn_ids):
+        if isinstance(tourn_ids, (float, int, str)):
+            tourn_ids = [tourn_ids]
+        return self._with(tourn_ids=[str(x) for x in tourn_ids])
+
+    def since(self, min_year):
+        return self._with(min_year=int(min_year))
+
+    def asof_join(self, backfill=False, max_gap=None):
+        '''
+        Join stats onto events as of each event's end date. Implied when
+            both stats and events are queried. max_gap is as in
+            DataReader.build_base_data.
+        '''
+        return self._with(backfill=backfill, max_gap=max_gap)
+
+    def features(self, specs, by_tourn=False, engine='kernel'):
+        '''
+        Add rolling result features for a list of (func, window) specs
+        '''
+        feats = self.spec['features'] + [(tuple(specs), by_tourn, engine)]
+        return self._with(features=feats)
+
+    def select(self, columns):
+        return self._with(columns=list(columns))
+
+    #########################################################
+
+    def plan(self):
+        '''
+        Compile the query to a list of (step, args) tuples
+        '''
+        spec = self.spec
+        stat_ids = spec['stat_ids']
+        if spec['columns'] is not None:
+            # Prune stats that are not selected
+            stat_ids = [s for s in stat_ids if 'rank_{}'.format(s) in
+                        spec['columns'] or 'prev_rank_{}'.format(s) in
+                        spec['columns']]
+        if len(spec['features']) > 0 and len(spec['tourn_ids']) == 0:
+            raise ValueError('features need events')
+        steps = []
+        if len(stat_ids) > 0:
+            steps.append(('load_stats', (tuple(stat_ids), spec['min_year'],
+                                         spec['drop_prev_cols'])))
+        if len(spec['tourn_ids']) > 0:
+            steps.append(('load_events', (tuple(spec['tourn_ids']),
+                                          spec['min_year'])))
+            if len(stat_ids) > 0:
+                steps.append(('asof_join', (spec['backfill'],
+                                            spec['max_gap'])))
+        for feat in spec['features']:
+            steps.append(('features', feat))
+        if spec['columns'] is not None:
+            steps.append(('select', tuple(spec['columns'])))
+        return steps
+
+    def explain(self):
+        return '\n'.join('{} {}'.format(step, args)
+                         for step, args in self.plan())
+
+    def collect(self):
+        '''
+        Execute the plan and return a DataFrame
+        '''
+        keys = {}
+        for step, args in self.plan():
+            if step in ('load_stats', 'load_events'):
+                func = self._load_stats if step == 'load_stats' else \
+                    self._load_events
+                kind = 'stat' if step == 'load_stats' else 'event'
+                key = (step,) + args + self._sources(kind, args[0])
+                keys[step] = key
+                out = self._cached(key, func, *args)
+            elif step == 'asof_join':
+                stats = self.reader.query_cache[keys['load_stats']]
+                events = self.reader.query_cache[keys['load_events']]
+                key = (step, keys['load_stats'], keys['load_events']) + args
+                out = self._cached(key, self.reader.join_base_data, stats,
+                                   events, *args)
+            elif step == 'features':
+                key = (step, key) + args
+                out = self._cached(key, self._features, out, *args)
+            elif step == 'select':
+                out = out[[c for c in args if c in out.columns]]
+        # Cached frames are shared between queries
+        return out.copy()
+
+    def _sources(self, kind, item_ids):
+        '''
+        Id dictionary version and source fingerprints of each stat /
+            tournament. Cached frames are dropped when any of them changed
+            since the last query, as they can no longer be hit.
+        '''
+        manager = self.reader.stat_manager if kind == 'stat' else \
+            self.reader.result_manager
+        known = self.reader.query_sources
+        current = {('ids',): self.reader.ids.version()}
+        for item_id in item_ids:
+            current[(kind, item_id)] = fingerprint_paths(
+                manager.source_paths(item_id))
+        if any(known.get(k, v) != v for k, v in current.items()):
+            self.reader.query_cache.clear()
+        known.update(current)
+        return (current[('ids',)],) + tuple(current[(kind, x)]
+                                            for x in item_ids)
+
+    def _cached(self, key, func, *args):
+        cache = self.reader.query_cache
+        if key not in cache:
+            cache[key] = func(*args)
+        return cache[key]
+
+    def _load_cached(self, kind, item_id, min_year, loader, *args):
+        '''
+        Load a single stat / tournament, filtering a cached load with an
+            earlier (or no) min_year instead of reading again
+        '''
+        cache = self.reader.query_cache
+        sources = self.reader.query_sources
+        key = (kind, item_id, sources[('ids',)],
+               sources[(kind, item_id)]) + args
+        if key in cache:
+            c_min, frame = cache[key]
+            if c_min == min_year:
+                return frame
+            if c_min is None or (min_year is not None and c_min < min_year):
+                years = frame.index.get_level_values('year') if \
+                    kind == 'stat' else frame.year
+                return frame[years >= min_year]
+        frame = loader(item_id, min_year, *args)
+        cache[key] = (min_year, frame)
+        return frame
+
+    def _load_stats(self, stat_ids, min_year, drop_prev_cols):
+        frames = [self._load_cached('stat', s_id, min_year,
+                                    self.reader.load_stat, drop_prev_cols)
+                  for s_id in stat_ids]
+        return self.reader.combine_stats(frames)
+
+    def _load_events(self, tourn_ids, min_year):
+        frames = [self._load_cached('event', t_id, min_year,
+                                    self.reader.load_result)
+                  for t_id in tourn_ids]
+        return self.reader.combine_results(frames)
+
+    def _features(self, base_data, specs, by_tourn, engine):
+        fc = FeatureCreator(base_data.copy())
+        fc.rolling_performance(list(specs), by_tourn=by_tourn, engine=engine)
+        return fc.data
+
@@ -1,20 +1,25 @@
 import os
-import csv
 import json
-import gevent
-import urllib
-import requests
 import pandas as pd
 import datetime as dt
 from tqdm import tqdm
-from bs4 import BeautifulSoup
+from functools import partial
 
 import workbench.utils.read_write as rw
+from workbench.projects.pga.data.html_parsers import (DEFAULT_BACKEND,
+                                                      process_stat_files)
+from workbench.projects.pga.data.meta_index import MetaIndex
+from workbench.projects.pga.data.metrics import METRICS, timed
+from workbench.projects.pga.data.normalize import normalize_stat_ranks
+from workbench.projects.pga.data.parallel import run_chunked
+from workbench.projects.pga.data.parquet_store import (ParquetStore,
+                                                       merge_store_csv)
 
 
 #######################
 FOLDER_REPLACE_CHARS = {' ': '', ':': '', '/': '', '\\': '', '?': '', '*': '',
                         '<=': '_LT_', '>=': '_GT_', '<': '_LT_', '>': '_GT_'}
+PGA_STAT_STUB = 'http://www.pgatour.com/stats/stat.%s.%s.html'  # stat, yr
 DEFAULT_DATA_DIR = os.path.join(os.getenv('DATA'), 'pydata', 'projects', 'pga',
                                 'stats')
 
@@ -25,8 +30,16 @@ def replace_multiple(inp_string, replacements):
     return inp_string
 
 
-def gather_pages(url, filename):
-    urllib.request.urlretrieve(url, filename)
+def read_stat_year(stat_fl_path, year):
+    '''
+    Read and normalize a single stat year csv. Module level so it can run
+        in a process pool.
+    '''
+    yr_csv = pd.read_csv(stat_fl_path)
+    normalize_stat_ranks(yr_csv)
+    yr_csv['year'] = year
+    yr_csv.drop_duplicates(['PLAYER NAME'], inplace=True)
+    return yr_csv
 ######################
 
 
@@ -40,6 +53,8 @@ class StatDownloader(object):
         self.data_dir = data_dir
         self.csv_base = os.path.join(data_dir, 'csv')
         self.html_base = os.path.join(data_dir, 'html')
+        self.store = ParquetStore(os.path.join(data_dir, 'parquet'),
+                                  'stat_id')
         # Configure for research if needed
         if research:
             self.prep_for_research()
@@ -54,6 +69,9 @@ class StatDownloader(object):
             category information, stat ids and stat names within each
             category
         """
+        import requests
+        from bs4 import BeautifulSoup
+
         url_stub = 'http://www.pgatour.com/stats/categories.%s.html'
         category_labels = ['RPTS_INQ', 'ROTT_INQ', 'RAPP_INQ', 'RARG_INQ',
                            'RPUT_INQ', 'RSCR_INQ', 'RSTR_INQ', 'RMNY_INQ']
@@ -82,12 +100,18 @@ class StatDownloader(object):
         rw.write_dict_to_json(info, stat_meta_path)
         self.stat_meta = info
 
-    def download_html(self, stat_ids=None):
+    @timed('stat_download_html')
+    def download_html(self, stat_ids=None, refresh_recent=False):
         """
         Create directories in the html base directory for each of the stat_ids
             and download individual html files for each year that stat is
-            available
+            available. If refresh_recent, files for the current and last
+            season are revalidated and only rewritten if changed.
         """
+        from bs4 import BeautifulSoup
+        from workbench.projects.pga.data.crawler import Crawler
+        from workbench.projects.pga.data.http_cache import HttpCache
+
         # Validate stat_ids argument ad validate
         self.check_stat_meta()
         if stat_ids is None:
@@ -95,16 +119,25 @@ class StatDownloader(object):
         else:
             self.verify_ids(stat_ids)
 
-        # Iterate through stats and download available files
-        url_stub = "http://www.pgatour.com/stats/stat.%s.%s.html"  # stat, yr
+        # Pull pilot year pages to get the years available for each stat
+        url_stub = PGA_STAT_STUB
         pilot_year = dt.datetime.now().year - 1
+        crawler = Crawler(os.path.join(self.data_dir, 'crawl_queue.json'),
+                          HttpCache(os.path.join(self.data_dir,
+                                                 'http_cache.json')))
+        pilot_urls = {s_id: url_stub % (s_id, pilot_year) for s_id in stat_ids}
+        pages = crawler.fetch_pages(list(pilot_urls.values()))
+
         no_stats = []
+        url_paths = []
         for s_id in tqdm(stat_ids):
             s_id_label = self.stat_meta[s_id]['stat_label']
             csv_dir_path = os.path.join(self.html_base, s_id_label)
-            url = url_stub % (s_id, pilot_year)
-            page = requests.get(url)
-            soup = BeautifulSoup(page.text, 'lxml')
+            url = pilot_urls[s_id]
+            if pages[url] is None:
+                no_stats.append(url)
+                continue
+            soup = BeautifulSoup(pages[url], 'lxml')
 
             # Get all available years
             yr_select = soup.find("select", class_="statistics-details-select")
@@ -113,25 +146,29 @@ class StatDownloader(object):
                 continue
             years = [x['value'] for x in yr_select.find_all("option")]
 
-            # Create new directory if needed and pull individual files
-            if not os.path.exists(csv_dir_path):
-                os.makedirs(csv_dir_path)
-
-            url_paths = []
             for yr in years:
                 url = url_stub % (s_id, yr)
                 html_path = "%s/%s.html" % (csv_dir_path, yr)
-                # Check if already downloaded
-                if not os.path.isfile(html_path):
+                # Check if already downloaded or due a refresh
+                refresh = refresh_recent and int(yr) >= pilot_year
+                if refresh or not os.path.isfile(html_path):
                     url_paths.append((url, html_path))
-            jobs = [gevent.spawn(gather_pages, x[0], x[1]) for x in url_paths]
-            gevent.joinall(jobs)
+        # Pull individual files, resuming any interrupted crawl
+        failed = crawler.download(url_paths)
+        METRICS.inc('missing_year_select', len(no_stats), source='stats')
+        METRICS.inc('download_failures', len(failed), source='stats')
         print("No stats found at URLs: {}".format(no_stats))
+        print("Failed downloads: {}".format(failed))
 
-    def process_html(self, stat_ids=None):
+    @timed('stat_process_html')
+    def process_html(self, stat_ids=None, n_workers=None, chunk_size=50,
+                     backend=DEFAULT_BACKEND):
         """
         Extract statistics from html files and write out csv files using the
-            same directory structure in csv base
+            same directory structure in csv base. If n_workers is passed
+            files are parsed in chunks across a process pool. backend is
+            'lxml' (default) or 'bs4'. Return a report of html directories
+            / files that could not be processed.
         """
         # Validate stat_ids argument and validate
         self.check_stat_meta()
@@ -141,8 +178,8 @@ class StatDownloader(object):
             self.verify_ids(stat_ids)
 
         no_html = []
-        no_data = []
-        for s_id in tqdm(stat_ids):
+        jobs = []
+        for s_id in stat_ids:
             stat_label = self.stat_meta[s_id]['stat_label']
             html_dir = os.path.join(self.html_base, stat_label)
             # Check to make sure html directoy exists
@@ -152,54 +189,42 @@ class StatDownloader(object):
             html_fls = os.listdir(html_dir)
 
             for s_hfl in html_fls:
-                csv_lines = []
                 html_path = os.path.join(html_dir, s_hfl)
                 csv_dir = os.path.join(self.csv_base, stat_label)
                 csv_path = os.path.join(csv_dir, s_hfl.replace('html', 'csv'))
-                # Check if file already processed
-                if os.path.isfile(csv_path):
+                # Check if file already processed and html unchanged since
+                if (os.path.isfile(csv_path) and os.path.getmtime(csv_path) >=
+                        os.path.getmtime(html_path)):
                     continue
-                # Load html data
-                with open(html_path, 'r', encoding="utf-8") as h_fl:
-                    soup = BeautifulSoup(h_fl, 'lxml')
-                table = soup.find('table', id='statsTable')
-                # Check if there is a table
-                if table is None:
-                    no_data.append(html_path)
-                    continue
-                # Process html
-                hdrs = [th.text for th in table.find('thead').find_all('th')]
-                csv_lines.append(hdrs)
-                for tr in table.find('tbody').find_all('tr'):
-                    info = [td.text.strip() for td in tr.find_all('td')]
-                    csv_lines.append(info)
-                # Check that the table is non-empty
-                if len(csv_lines) <= 1:
-                    no_data.append(html_path)
-                    continue
-                # Write to csv - make directory if needed
-                if not os.path.exists(csv_dir):
-                    os.makedirs(csv_dir)
-                with open(csv_path, 'w', encoding='utf-8', newline='') as c_fl:
-                    writer = csv.writer(c_fl, delimiter=',')
-                    for row in csv_lines:
-                        writer.writerow(row)
+                jobs.append((html_path, csv_path))
+        parse_func = partial(process_stat_files, backend=backend)
+        no_data = run_chunked(parse_func, jobs, n_workers, chunk_size)
+        METRICS.inc('pages_parsed', len(jobs), source='stats')
+        METRICS.inc('parse_failures', len(no_data), source='stats')
         print("No HTML data found: {}".format(no_html), '\n')
         print("Unable to parse tables: {}".format(no_data))
+        return dict(no_html=no_html, no_data=no_data)
 
+    @timed('stat_update_meta')
     def update_meta_file(self):
         """
         Iterate through stat_ids and add information on files to the meta
             json - number of files, min_year, max_year.  Overwrite existing
-            meta file.
+            meta file. Only stat directories that changed since the last
+            update (tracked in the sqlite meta index) are rescanned.
         """
         # Validate stat_ids argument and validate
         self.check_stat_meta()
         stat_ids = list(self.stat_meta.keys())
 
+        index = MetaIndex(os.path.join(self.data_dir, 'meta_index.sqlite'))
         for s_id in stat_ids:
             stat_label = self.stat_meta[s_id]['stat_label']
             csv_dir = os.path.join(self.csv_base, stat_label)
+            if ('n_files' in self.stat_meta[s_id] and
+                    not index.dir_changed(csv_dir)):
+                continue
+            index.mark_dir(csv_dir)
             if not os.path.exists(csv_dir):
                 self.stat_meta[s_id]['n_files'] = 0
                 self.stat_meta[s_id]['min_year'] = None
@@ -211,46 +236,104 @@ class StatDownloader(object):
             self.stat_meta[s_id]['n_files'] = len(dir_files)
             self.stat_meta[s_id]['min_year'] = min_yr
             self.stat_meta[s_id]['max_year'] = max_yr
+        index.close()
         write_path = os.path.join(self.data_dir, 'stat_meta.json')
         rw.write_dict_to_json(self.stat_meta, write_path)
 
-    def load_csv(self, stat_id, year=None, min_year=None):
+    @timed('stat_build_store')
+    def build_parquet_store(self, stat_ids=None):
+        '''
+        Load normalized csv data for each stat_id and write it to the
+            parquet store, replacing any existing partition.
+        '''
+        self.check_stat_meta()
+        if stat_ids is None:
+            stat_ids = list(self.stat_meta.keys())
+        else:
+            self.verify_ids(stat_ids)
+
+        no_csv = []
+        for s_id in tqdm(stat_ids):
+            stat_label = self.stat_meta[s_id]['stat_label']
+            if not os.path.exists(os.path.join(self.csv_base, stat_label)):
+                no_csv.append(s_id)
+                continue
+            stat_data = self.load_csv(s_id, use_store=False)
+            if len(stat_data) == 0:
+                no_csv.append(s_id)
+                continue
+            self.store.write_partition(s_id, stat_data)
+        print("No csv data found for stat ids: {}".format(no_csv))
+
+    def load_csv(self, stat_id, year=None, min_year=None, use_store=True,
+                 columns=None, pool=None):
         '''
         Load a csv data for a single stat_id. If no year is passed, all
             all available years greater than min_year will be loaded.
+            Reads from the parquet store when the stat has been migrated,
+            plus any csv years processed since the partition was written.
+            If columns is passed only those columns are returned (and
+            read, from the store). If pool (an Executor) is passed the csv
+            files are read and normalized across it. Years are stacked in
+            order either way.
         '''
         self.check_stat_meta()
         self.verify_ids(stat_id)
         stat_label = self.stat_meta[stat_id]['stat_label']
         stat_dir_path = os.path.join(self.csv_base, stat_label)
-        assert os.path.exists(stat_dir_path)
-        if year is None:
-            load_files = os.listdir(stat_dir_path)
+        store_data = None
+        store_years = set()
+        if use_store and self.store.has_partition(stat_id):
+            # Years whose csv was re-processed since the partition was
+            # written are read from the csv instead
+            store_years = self.store.fresh_years(stat_id, stat_dir_path)
+            skip_years = self.store.partition_years(stat_id) - store_years
+            store_data = self.store.read_partition(stat_id, year=year,
+                                                   min_year=min_year,
+                                                   columns=columns,
+                                                   skip_years=skip_years)
+        else:
+            assert os.path.exists(stat_dir_path)
+        if not os.path.exists(stat_dir_path):
+            load_files = []
+        elif year is None:
+            load_files = sorted(os.listdir(stat_dir_path))
         else:
             stat_fl_path = os.path.join(stat_dir_path, '{}.csv'.format(year))
-            if not os.path.exists(stat_fl_path):
+            if os.path.exists(stat_fl_path):
+                load_files = ['{}.csv'.format(year)]
+            elif store_data is None:
                 raise FileNotFoundError('No file at {}'.format(stat_fl_path))
-            load_files = ['{}.csv'.format(year)]
-        repl_results = ['nan']
+            else:
+                load_files = []
         # Load csv(s) and add some meta data
-        out_data = pd.DataFrame([])
+        load_paths, load_years = [], []
         for fl in load_files:
             yr = int(fl.replace('.csv', ''))
             if min_year:
                 if yr < int(min_year):
                     continue
-            stat_fl_path = os.path.join(stat_dir_path, fl)
-            yr_csv = pd.read_csv(stat_fl_path)
-            last_place = len(yr_csv) + 1
-            res_fltr = (lambda x: last_place if x in repl_results else
-                        int(x.replace('T','')))
-            yr_csv['RANK THIS WEEK'] = yr_csv['RANK THIS WEEK'].astype(str).map(res_fltr)
-            yr_csv['RANK LAST WEEK'] = yr_csv['RANK LAST WEEK'].astype(str).map(res_fltr)
-            yr_csv['year'] = yr
-            yr_csv.drop_duplicates(['PLAYER NAME'], inplace=True)
-            out_data = out_data.append(yr_csv, ignore_index=True, sort=False)
+            if yr in store_years:
+                continue
+            load_paths.append(os.path.join(stat_dir_path, fl))
+            load_years.append(yr)
+        if pool is None:
+            frames = list(map(read_stat_year, load_paths, load_years))
+        else:
+            frames = list(pool.map(read_stat_year, load_paths, load_years))
+        if len(frames) == 0:
+            out_data = pd.DataFrame([])
+        else:
+            out_data = pd.concat(frames, ignore_index=True, sort=False)
         out_data['stat_label'] = stat_label
         out_data['stat_id'] = stat_id
+        if columns is not None:
+            out_data = out_data[[c for c in out_data.columns if c in columns]]
+        if store_data is not None:
+            out_data = merge_store_csv(store_data, frames, out_data)
+            if year is not None and len(out_data) == 0:
+                raise FileNotFoundError('No data for stat {} in {}'.format(
+                    stat_id, year))
         return out_data
 
     ################################################################
@@ -262,6 +345,21 @@ class StatDownloader(object):
         if not hasattr(self, 'stat_meta'):
             raise NameError("No stat_meta attribute found")
 
+    def source_paths(self, stat_id):
+        """
+        Files a load_csv of stat_id depends on: the meta file, the parquet
+            partition and the yearly csvs
+        """
+        self.check_stat_meta()
+        paths = [os.path.join(self.data_dir, 'stat_meta.json'),
+                 self.store.partition_path(stat_id)]
+        stat_label = self.stat_meta.get(stat_id, {}).get('stat_label')
+        stat_dir_path = os.path.join(self.csv_base, str(stat_label))
+        if stat_label is not None and os.path.isdir(stat_dir_path):
+            paths += [os.path.join(stat_dir_path, fl) for fl in
+                      sorted(os.listdir(stat_dir_path))]
+        return paths
+
     def verify_ids(self, inp_ids):
         """
         Verify all ids are contained in the associated meta object
@@ -0,0 +1,107 @@
+import os
+import numpy as np
+
+import workbench.utils.read_write as rw
+
+
+VALUES_FILE = 'values.f32'
+INDEX_FILES = ['players.json', 'seasons.json', 'stats.json']
+
+
+def write_stat_tensor(stat_data, tensor_dir):
+    '''
+    Write a build_stat_df frame as a dense float32 player x season x stat
+        array (nan where missing) plus index sidecars for each axis. The
+        values file is written to a temp path and renamed into place.
+    '''
+    if not os.path.exists(tensor_dir):
+        os.makedirs(tensor_dir)
+    stat_cols = [x for x in stat_data.columns if x.find('rank_') >= 0]
+    player_ids, p_idx = np.unique(stat_data.player_id.values,
+                                  return_inverse=True)
+    seasons = np.arange(stat_data.year.min(), stat_data.year.max() + 1)
+    s_idx = stat_data.year.values - seasons[0]
+    first = np.unique(p_idx, return_index=True)[1]
+    names = stat_data.player_name.astype(str).values[first]
+
+    shape = (len(player_ids), len(seasons), len(stat_cols))
+    values_path = os.path.join(tensor_dir, VALUES_FILE)
+    values = np.memmap(values_path + '.tmp', dtype=np.float32, mode='w+',
+                       shape=shape)
+    values[:] = np.nan
+    values[p_idx, s_idx, :] = stat_data[stat_cols].values.astype(np.float32)
+    values.flush()
+    del values
+    os.replace(values_path + '.tmp', values_path)
+
+    rw.write_dict_to_json({'player_id': player_ids.tolist(),
+                           'player_name': names.tolist()},
+                          os.path.join(tensor_dir, INDEX_FILES[0]))
+    rw.write_dict_to_json({'year': seasons.tolist()},
+                          os.path.join(tensor_dir, INDEX_FILES[1]))
+    rw.write_dict_to_json({'stat': stat_cols, 'shape': list(shape)},
+                          os.path.join(tensor_dir, INDEX_FILES[2]))
+    return shape
+
+
+class StatTensor(object):
+    """
+    Read only memory map of a tensor written by write_stat_tensor. Every
+        process opening the same file shares one page cache copy. Year
+        ranges and contiguous runs of stats are returned as views of the
+        map; other stat subsets copy only the selected values.
+    """
+    def __init__(self, tensor_dir):
+        self.tensor_dir = tensor_dir
+        players, seasons, stats = [
+            rw.read_dict_from_json(os.path.join(tensor_dir, fl))
+            for fl in INDEX_FILES]
+        self.player_ids = np.array(players['player_id'], dtype=np.int32)
+        self.player_names = np.array(players['player_name'], dtype=object)
+        self.seasons = np.array(seasons['year'], dtype=np.int32)
+        self.stats = list(stats['stat'])
+        self.values = np.memmap(os.path.join(tensor_dir, VALUES_FILE),
+                                dtype=np.float32, mode='r',
+                                shape=tuple(stats['shape']))
+        self._stat_pos = {s: i for i, s in enumerate(self.stats)}
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def season_slice(self, min_year=None, max_year=None):
+        lo = 0 if min_year is None else \
+            np.searchsorted(self.seasons, min_year, side='left')
+        hi = len(self.seasons) if max_year is None else \
+            np.searchsorted(self.seasons, max_year, side='right')
+        return slice(lo, hi)
+
+    def stat_index(self, stats=None):
+        '''
+        Slice for a contiguous run of stats (or all), else an index array
+        '''
+        if stats is None:
+            return slice(None)
+        pos = np.array([self._stat_pos[s] for s in stats], dtype=np.int64)
+        if len(pos) > 0 and (np.diff(pos) == 1).all():
+            return slice(pos[0], pos[-1] + 1)
+        return pos
+
+    def player_index(self, player_ids):
+        pos = np.searchsorted(self.player_ids, player_ids)
+        pos = np.clip(pos, 0, len(self.player_ids) - 1)
+        if not (self.player_ids[pos] == player_ids).all():
+            raise KeyError('player_ids not in tensor')
+        return pos
+
+    def select(self, stats=None, min_year=None, max_year=None):
+        '''
+        Return (values, seasons, stats) for a stat subset and year range.
+            values is players x seasons x stats.
+        '''
+        s_slice = self.season_slice(min_year, max_year)
+        st_idx = self.stat_index(stats)
+        values = self.values[:, s_slice, st_idx]
+        sel_stats = self.stats[st_idx] if isinstance(st_idx, slice) else \
+            [self.stats[i] for i in st_idx]
+        return values, self.seasons[s_slice], sel_stats
@@ -0,0 +1,182 @@
+import os
+import sys
+import numpy as np
+
+import workbench.utils.read_write as rw
+from workbench.projects.pga.data.html_parsers import (write_csv,
+                                                      write_event_meta)
+
+
+STAT_HEADER = ['RANK THIS WEEK', 'RANK LAST WEEK', 'PLAYER NAME', 'ROUNDS',
+               'AVERAGE']
+EVENT_HEADER = ['PLAYER', 'POS', '1', '2', '3', '4', 'TOTALSCORE', 'TO PAR',
+                'OFFICIAL MONEY', 'FEDEX POINTS']
+HTML_TEMPLATE = '<html><head><title>{}</title></head><body>{}</body></html>'
+
+
+def _html_table(hdrs, rows, attrs):
+    head = ''.join('<th>{}</th>'.format(h) for h in hdrs)
+    body = ''.join('<tr>{}</tr>'.format(''.join('<td>{}</td>'.format(c)
+                                                for c in row))
+                   for row in rows)
+    return '<table {}><thead><tr>{}</tr></thead><tbody>{}</tbody>' \
+           '</table>'.format(attrs, head, body)
+
+
+def _rank_strings(values):
+    '''
+    Competition ranks of values (low is best) as strings with T for ties
+    '''
+    order = np.argsort(values, kind='stable')
+    ranks = np.empty(len(values), dtype=np.int64)
+    sorted_vals = values[order]
+    first = np.r_[True, sorted_vals[1:] != sorted_vals[:-1]]
+    ranks[order] = np.maximum.accumulate(np.where(first,
+                                                  np.arange(len(values)), 0))
+    ranks += 1
+    counts = np.bincount(ranks)
+    return ['T{}'.format(r) if counts[r] > 1 else str(r) for r in ranks]
+
+
+def stat_page(stat_name, years, rows):
+    select = '<select class="statistics-details-select">{}</select>'.format(
+        ''.join('<option value="{0}">{0}</option>'.format(y) for y in years))
+    table = _html_table(STAT_HEADER, rows, 'id="statsTable" class="table"')
+    return HTML_TEMPLATE.format(stat_name, select + table)
+
+
+def event_page(tourn_name, years, meta, rows):
+    (date, par, course) = meta
+    select = '<select id="pastResultsYearSelector">{}</select>'.format(
+        ''.join('<option value="{0}">{0}</option>'.format(y) for y in years))
+    header = ('<div><span class="header-row">Ending: {}</span>'
+              '<span class="header-row">PAR: {}</span>'
+              '<span class="header-row">Course: {}</span></div>'
+              .format(date, par, course))
+    hdrs = EVENT_HEADER[:2] + ['ROUNDS 1 2 3 4'] + EVENT_HEADER[6:]
+    table = _html_table(hdrs, rows, 'class="table-styled js-table"')
+    return HTML_TEMPLATE.format(tourn_name, select + header + table)
+
+
+def _write_html(path, html):
+    html_dir = os.path.dirname(path)
+    if not os.path.exists(html_dir):
+        os.makedirs(html_dir)
+    with open(path, 'w', encoding='utf-8') as h_fl:
+        h_fl.write(html)
+
+
+def write_synthetic_tree(data_path, n_players=200, n_seasons=10, n_stats=20,
+                         n_tourns=10, first_year=2000, seed=0,
+                         write_html=True, write_csvs=True):
+    '''
+    Write a synthetic pga data tree (stats and events html / csv files and
+        meta json files) in the layout StatDownloader and EventDownloader
+        expect. Players have a latent skill that drives both stat ranks and
+        finishing positions so joins and features behave like real data.
+        The csvs hold exactly what process_html would parse from the html.
+    '''
+    rng = np.random.RandomState(seed)
+    players = ['Player{} Synth{}'.format(i, i % 97) for i in range(n_players)]
+    skill = rng.normal(size=n_players)
+    years = list(range(first_year, first_year + n_seasons))
+
+    stat_dir = os.path.join(data_path, 'stats')
+    stat_meta = {}
+    for i in range(n_stats):
+        s_id = str(100 + i)
+        label = 'SyntheticStat{}'.format(i)
+        stat_meta[s_id] = dict(cat_name='Synthetic', cat_abbr='SYN',
+                               stat_name='Synthetic Stat {}'.format(i),
+                               stat_label=label)
+        weight = rng.uniform(0.2, 1.)
+        last_ranks = {}
+        for yr in years:
+            field = rng.rand(n_players) < 0.8
+            idx = np.flatnonzero(field)
+            value = np.round(weight * skill[idx] + rng.normal(size=len(idx)),
+                             1)
+            ranks = _rank_strings(-value)
+            order = np.argsort(-value, kind='stable')
+            rows = []
+            for j in order:
+                name = players[idx[j]]
+                rows.append([ranks[j], last_ranks.get(name, ''), name,
+                             rng.randint(20, 100), '{:.2f}'.format(value[j])])
+            last_ranks = {r[2]: r[0] for r in rows}
+            file_name = '{}.{}'
+            if write_html:
+                _write_html(os.path.join(stat_dir, 'html', label,
+                                         file_name.format(yr, 'html')),
+                            stat_page(label, years, rows))
+            if write_csvs:
+                write_csv(os.path.join(stat_dir, 'csv', label,
+                                       file_name.format(yr, 'csv')),
+                          [STAT_HEADER] + rows)
+    rw.write_dict_to_json(stat_meta, os.path.join(stat_dir,
+                                                  'stat_meta.json'))
+
+    event_dir = os.path.join(data_path, 'events')
+    tourn_meta = {}
+    event_meta = {}
+    for i in range(n_tourns):
+        t_id = str(i + 1)
+        label = 'synthetic-open-{}'.format(i)
+        par = int(rng.choice([70, 71, 72]))
+        course = 'Synthetic Links {}'.format(i)
+        tourn_meta[t_id] = dict(tourn_name='Synthetic Open {}'.format(i),
+                                tourn_label=label, link_head='/synthetic',
+                                sample_year=years[-1])
+        for yr in years:
+            date = '{:02d}/{:02d}/{}'.format(1 + i % 12, 1 + i % 28, yr)
+            meta = (date, par, course)
+            idx = np.flatnonzero(rng.rand(n_players) < 0.6)
+            rounds = np.round(par - skill[idx, None] +
+                              rng.normal(scale=3, size=(len(idx), 4)))
+            rounds = rounds.astype(int)
+            made_cut = rounds[:, :2].sum(axis=1) <= np.percentile(
+                rounds[:, :2].sum(axis=1), 65)
+            total = np.where(made_cut, rounds.sum(axis=1),
+                             rounds[:, :2].sum(axis=1) + 1000)
+            pos = _rank_strings(total)
+            rows = []
+            for j in np.argsort(total, kind='stable'):
+                if made_cut[j]:
+                    r_cells = list(rounds[j])
+                    result = pos[j]
+                    score = int(rounds[j].sum())
+                    to_par = score - 4 * par
+                else:
+                    r_cells = list(rounds[j, :2]) + ['--', '--']
+                    result = rng.choice(['CUT'] * 18 + ['W/D', 'DQ'])
+                    score = int(rounds[j, :2].sum())
+                    to_par = score - 2 * par
+                rows.append([players[idx[j]], result] + r_cells +
+                             [score, to_par, '${:,}'.format(
+                                 int(1e6 / (1 + j))), int(500 / (1 + j))])
+            file_name = '{}.{}'
+            if write_html:
+                _write_html(os.path.join(event_dir, 'html', label,
+                                         file_name.format(yr, 'html')),
+                            event_page(label, years, meta, rows))
+            if write_csvs:
+                write_csv(os.path.join(event_dir, 'csv', label,
+                                       file_name.format(yr, 'csv')),
+                          [EVENT_HEADER] + rows)
+                write_event_meta(os.path.join(event_dir, 'meta', label,
+                                              file_name.format(yr, 'json')),
+                                 meta)
+            event_meta[str(len(event_meta) + 1)] = dict(
+                tourn_id=t_id, tourn_label=label, year=yr, date=date,
+                par=par, course=course)
+    rw.write_dict_to_json(tourn_meta, os.path.join(event_dir,
+                                                   'tourn_meta.json'))
+    rw.write_dict_to_json(event_meta, os.path.join(event_dir,
+                                                   'event_meta.json'))
+    return dict(stat_ids=sorted(stat_meta), tourn_ids=sorted(tourn_meta),
+                years=years)
+
+
+if __name__ == '__main__':
+    # i.e. python synthetic.py /tmp/pga_synthetic
+    write_synthetic_tree(sys.argv[1])
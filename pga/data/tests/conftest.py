@@ -0,0 +1,50 @@
+import os
+import asyncio
+import tempfile
+import threading
+
+# Modules read $DATA at import for their default paths
+os.environ.setdefault('DATA', tempfile.mkdtemp(prefix='pga_data_'))
+
+import pytest  # noqa: E402
+
+from workbench.projects.pga.data.synthetic import \
+    write_synthetic_tree  # noqa: E402
+
+
+@pytest.fixture
+def synthetic_tree(tmp_path):
+    '''
+    Small synthetic stats / events tree with csvs, html and meta files
+    '''
+    data_path = str(tmp_path / 'pga')
+    tree = write_synthetic_tree(data_path, n_players=40, n_seasons=4,
+                                n_stats=3, n_tourns=3)
+    tree['data_path'] = data_path
+    return tree
+
+
+@pytest.fixture
+def serve_app():
+    '''
+    Serve aiohttp apps from a background event loop, so code under test can
+        run its own asyncio.run against them. Returns serve(app) -> url(path)
+    '''
+    from aiohttp.test_utils import TestServer
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    servers = []
+
+    def serve(app):
+        server = TestServer(app, loop=loop)
+        asyncio.run_coroutine_threadsafe(server.start_server(), loop).result()
+        servers.append(server)
+        return lambda path: str(server.make_url(path))
+    yield serve
+    for server in servers:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
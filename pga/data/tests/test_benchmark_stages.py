@@ -0,0 +1,105 @@
+import os
+import shutil
+import pytest
+
+from workbench.projects.pga.data.benchmarks import (HEAVY_MODULES,
+                                                    READ_MODULES, SCALES,
+                                                    import_profile)
+from workbench.projects.pga.data.data_reader import DataReader
+from workbench.projects.pga.data.feature_creator import FeatureCreator
+from workbench.projects.pga.data.synthetic import write_synthetic_tree
+
+pytest.importorskip('pytest_benchmark')
+
+# Stage timings under pytest-benchmark, i.e. to track them across runs
+#   PGA_BENCH_SCALE=small pytest pga/data/tests/test_benchmark_stages.py \
+#       --benchmark-autosave --benchmark-compare \
+#       --benchmark-compare-fail=min:25%
+# The default tiny scale keeps a plain pytest run (or --benchmark-disable)
+# quick enough for CI.
+SCALE = os.getenv('PGA_BENCH_SCALE', 'tiny')
+
+
+@pytest.fixture(scope='module')
+def bench(tmp_path_factory):
+    data_path = str(tmp_path_factory.mktemp('bench') / 'pga')
+    tree = write_synthetic_tree(data_path, **SCALES[SCALE])
+    dr = DataReader(data_path, cache_max_bytes=None)
+    tree['reader'] = dr
+    tree['stat_data'] = dr.build_stat_df(tree['stat_ids'])
+    tree['result_data'] = dr.build_result_df(tree['tourn_ids'])
+    tree['base_data'] = dr.build_base_data(tree['stat_data'],
+                                           tree['result_data'])
+    yield tree
+    dr.ids.close()
+
+
+@pytest.mark.parametrize('module', READ_MODULES)
+def test_import_time(benchmark, module):
+    # Each round imports the module in a fresh python -X importtime
+    times = benchmark.pedantic(import_profile, args=(module,), rounds=3)
+    benchmark.extra_info['import_secs'] = times[module]
+    assert [x for x in HEAVY_MODULES if x in times] == []
+
+
+def _process_html(benchmark, manager, out_dirs):
+    def setup():
+        # process_html skips csvs newer than their html
+        for out_dir in out_dirs:
+            shutil.rmtree(out_dir, ignore_errors=True)
+    report = benchmark.pedantic(manager.process_html, setup=setup, rounds=3)
+    assert report['no_html'] == [] and report['no_data'] == []
+
+
+def test_process_html_stats(benchmark, bench):
+    manager = bench['reader'].stat_manager
+    _process_html(benchmark, manager, [manager.csv_base])
+
+
+def test_process_html_events(benchmark, bench):
+    manager = bench['reader'].result_manager
+    _process_html(benchmark, manager, [manager.csv_base, manager.meta_base])
+
+
+def test_load_csv_stats(benchmark, bench):
+    manager = bench['reader'].stat_manager
+    frames = benchmark(lambda: [manager.load_csv(x, use_store=False)
+                                for x in bench['stat_ids']])
+    assert all(len(x) > 0 for x in frames)
+
+
+def test_load_csv_events(benchmark, bench):
+    manager = bench['reader'].result_manager
+    frames = benchmark(lambda: [manager.load_csv(x, use_store=False)
+                                for x in bench['tourn_ids']])
+    assert all(len(x) > 0 for x in frames)
+
+
+def test_build_stat_df(benchmark, bench):
+    out = benchmark(bench['reader'].build_stat_df, bench['stat_ids'])
+    assert out.equals(bench['stat_data'])
+
+
+def test_build_result_df(benchmark, bench):
+    out = benchmark(bench['reader'].build_result_df, bench['tourn_ids'])
+    assert out.equals(bench['result_data'])
+
+
+def test_build_base_data(benchmark, bench):
+    out = benchmark(bench['reader'].build_base_data, bench['stat_data'],
+                    bench['result_data'])
+    assert out.equals(bench['base_data'])
+
+
+def test_backfill_stats(benchmark, bench):
+    out = benchmark(bench['reader'].backfill_stats, bench['stat_data'])
+    assert len(out) == len(bench['stat_data'])
+
+
+def test_feature_creator(benchmark, bench):
+    def build():
+        fc = FeatureCreator(bench['base_data'].copy())
+        fc.sample_build()
+        return fc.data
+    out = benchmark(build)
+    assert len(out) == len(bench['base_data'])
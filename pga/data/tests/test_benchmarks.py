@@ -0,0 +1,66 @@
+import os
+import pytest
+
+from workbench.projects.pga.data import benchmarks
+from workbench.projects.pga.data.data_reader import DataReader
+
+
+TINY = benchmarks.SCALES['tiny']
+
+
+@pytest.fixture(scope='module')
+def suite_result():
+    return benchmarks.benchmark_suite(TINY, repeat=1)
+
+
+def test_suite_runs(suite_result):
+    assert suite_result['scale'] == 'custom'
+    assert all(n > 0 for n in suite_result['rows'].values())
+    assert set(suite_result['secs']) == {
+        'import_data_reader', 'process_html_stats', 'process_html_events',
+        'load_csv_stats', 'load_csv_events', 'build_stat_df',
+        'build_result_df', 'build_base_data', 'backfill_stats',
+        'feature_creator'}
+    assert all(x > 0 for x in suite_result['secs'].values())
+
+
+def test_regressions_against_history(suite_result, tmp_path):
+    history_path = str(tmp_path / 'history.jsonl')
+    assert benchmarks.check_regressions(suite_result, history_path) == {}
+    benchmarks.record_benchmarks(suite_result, history_path)
+    benchmarks.record_benchmarks(suite_result, history_path)
+    assert len(benchmarks.read_history(history_path, 'custom')) == 2
+    assert benchmarks.check_regressions(suite_result, history_path) == {}
+
+    slower = dict(suite_result, secs=dict(suite_result['secs']))
+    slower['secs']['build_stat_df'] *= 2
+    regressions = benchmarks.check_regressions(slower, history_path)
+    assert list(regressions) == ['build_stat_df']
+    assert regressions['build_stat_df'][2] == pytest.approx(2)
+    # Runs at other sizes are not compared
+    other = dict(slower, params=dict(TINY, n_players=31))
+    assert benchmarks.check_regressions(other, history_path) == {}
+
+
+def test_benchmarks_match_reference(synthetic_tree, tmp_path):
+    data_path = synthetic_tree['data_path']
+    stat_ids, tourn_ids = synthetic_tree['stat_ids'], \
+        synthetic_tree['tourn_ids']
+    for kind, keys in [('stats', ['stat_table']),
+                       ('events', ['event_table', 'event_meta'])]:
+        html_paths = benchmarks.list_html_files(
+            os.path.join(data_path, kind, 'html'))
+        res = benchmarks.benchmark_parsers(html_paths, keys)
+        assert res['lxml']['matches']
+
+    res = benchmarks.benchmark_parallel_load(data_path, stat_ids, tourn_ids,
+                                             worker_counts=(2,))
+    assert all(x['matches'] for x in res)
+
+    dr = DataReader(data_path, cache_max_bytes=None)
+    stat_data = dr.build_stat_df(stat_ids)
+    assert benchmarks.benchmark_backfill(dr, stat_data)['matches']
+    base_data = dr.build_base_data(stat_data, dr.build_result_df(tourn_ids))
+    res = benchmarks.compare_rolling_engines(
+        base_data, 'result', [('mean', 3), ('max', 5), ('count', 2)])
+    assert max(res['max_diff'].values()) < 1e-9
@@ -0,0 +1,33 @@
+import os
+import pandas as pd
+
+from workbench.projects.pga.data.data_reader import DataReader
+
+
+def test_build_matches_in_memory(synthetic_tree, tmp_path):
+    dr = DataReader(synthetic_tree['data_path'], cache_max_bytes=None)
+    stat_ids, tourn_ids = synthetic_tree['stat_ids'], \
+        synthetic_tree['tourn_ids']
+    work_dir = str(tmp_path / 'work')
+    os.makedirs(work_dir)
+    keep_path = os.path.join(work_dir, 'notes.txt')
+    with open(keep_path, 'w') as k_fl:
+        k_fl.write('not the builder')
+
+    cb = dr.chunked(work_dir, n_partitions=4)
+    assert len(cb.build(stat_ids, tourn_ids, backfill_stats=True)) == 4
+    # A second build into an existing output directory replaces it
+    paths = cb.build(stat_ids, tourn_ids, backfill_stats=True)
+    assert os.path.isfile(keep_path)
+    assert not os.path.exists(cb.spill_base)
+    assert paths == cb.output_paths()
+
+    expected = dr.build_base_data(dr.build_stat_df(stat_ids),
+                                  dr.build_result_df(tourn_ids),
+                                  backfill_stats=True)
+    pd.testing.assert_frame_equal(cb.collect()[expected.columns], expected,
+                                  check_dtype=False, check_categorical=False)
+
+    cb.clear()
+    assert cb.output_paths() == []
+    assert os.listdir(work_dir) == ['notes.txt']
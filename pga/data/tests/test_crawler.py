@@ -0,0 +1,123 @@
+import os
+import pytest
+from aiohttp import web
+
+from workbench.projects.pga.data.crawler import Crawler, JobQueue
+from workbench.projects.pga.data.http_cache import HttpCache
+
+
+class PgaStandIn(object):
+    """
+    Local stand-in for the pga site, served from a background event loop so
+        the crawler can run its own asyncio.run against it
+    """
+    def __init__(self):
+        self.hits = {}
+        self.fail_first = 2
+        self.down = False
+        self.not_modified = 0
+        app = web.Application()
+        app.router.add_get('/flaky/{status}/{name}', self.flaky)
+        app.router.add_get('/missing', self.missing)
+        app.router.add_get('/page/{name}', self.page)
+        self.app = app
+
+    def count(self, request):
+        self.hits[request.path] = self.hits.get(request.path, 0) + 1
+        return self.hits[request.path]
+
+    async def flaky(self, request):
+        if self.count(request) <= self.fail_first or self.down:
+            return web.Response(status=int(request.match_info['status']))
+        return web.Response(body=request.path.encode())
+
+    async def missing(self, request):
+        self.count(request)
+        return web.Response(status=404)
+
+    async def page(self, request):
+        self.count(request)
+        etag = '"{}"'.format(request.match_info['name'])
+        if request.headers.get('If-None-Match') == etag:
+            self.not_modified += 1
+            return web.Response(status=304)
+        return web.Response(body=request.path.encode(),
+                            headers={'ETag': etag})
+
+
+@pytest.fixture
+def site(serve_app):
+    stand_in = PgaStandIn()
+    stand_in.url = serve_app(stand_in.app)
+    return stand_in
+
+
+def _crawler(tmp_path, **kwargs):
+    return Crawler(str(tmp_path / 'queue.json'), backoff=0.001, **kwargs)
+
+
+def _part_files(path):
+    return [f for _, _, fls in os.walk(str(path)) for f in fls
+            if f.endswith('.part')]
+
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_retries_transient_status(site, tmp_path, status):
+    path = '/flaky/{}/a'.format(status)
+    out_path = str(tmp_path / 'html' / 'a.html')
+    assert _crawler(tmp_path).download([(site.url(path), out_path)]) == []
+    assert site.hits[path] == site.fail_first + 1
+    with open(out_path, 'rb') as h_fl:
+        assert h_fl.read() == path.encode()
+
+
+def test_not_found_is_dropped(site, tmp_path):
+    crawler = _crawler(tmp_path)
+    url = site.url('/missing')
+    assert crawler.download([(url, str(tmp_path / 'm.html'))]) == [url]
+    assert site.hits['/missing'] == 1
+    assert crawler.queue.pending() == []
+    assert not os.path.exists(str(tmp_path / 'queue.json'))
+
+
+def test_resume_from_persisted_queue(site, tmp_path):
+    site.down = True
+    jobs = [(site.url('/flaky/503/{}'.format(x)),
+             str(tmp_path / 'html' / '{}.html'.format(x))) for x in 'abc']
+    failed = _crawler(tmp_path, max_retries=1).download(jobs)
+    assert sorted(failed) == sorted(u for u, _ in jobs)
+    assert sorted(JobQueue(str(tmp_path / 'queue.json')).pending()) == \
+        sorted(jobs)
+
+    site.down = False
+    crawler = _crawler(tmp_path)
+    assert crawler.resume() == []
+    assert sorted(crawler.changed) == sorted(p for _, p in jobs)
+    assert not os.path.exists(str(tmp_path / 'queue.json'))
+    assert _part_files(tmp_path) == []
+
+
+def test_writes_are_atomic(site, tmp_path):
+    paths = ['/page/{}'.format(i) for i in range(20)]
+    jobs = [(site.url(x), str(tmp_path / 'html' / '{}.html'.format(i)))
+            for i, x in enumerate(paths)]
+    assert _crawler(tmp_path).download(jobs) == []
+    assert _part_files(tmp_path) == []
+    for path, (_, out_path) in zip(paths, jobs):
+        with open(out_path, 'rb') as h_fl:
+            assert h_fl.read() == path.encode()
+
+
+def test_revalidates_with_http_cache(site, tmp_path):
+    cache_path = str(tmp_path / 'http_cache.json')
+    job = (site.url('/page/p1'), str(tmp_path / 'html' / 'p1.html'))
+    crawler = _crawler(tmp_path, cache=HttpCache(cache_path))
+    assert crawler.download([job]) == []
+    assert crawler.changed == [job[1]]
+    mtime = os.path.getmtime(job[1])
+
+    crawler = _crawler(tmp_path, cache=HttpCache(cache_path))
+    assert crawler.download([job]) == []
+    assert site.not_modified == 1
+    assert crawler.changed == []
+    assert os.path.getmtime(job[1]) == mtime
@@ -0,0 +1,155 @@
+import os
+import numpy as np
+import pandas as pd
+
+from workbench.projects.pga.data.data_reader import DataReader, asof_join_stats
+
+
+def _same_year_players(dr, stat_id):
+    '''
+    Two players ranked in the same year of a stat
+    '''
+    sdata = dr.read_stat(stat_id)
+    year = sdata.year.iloc[0]
+    names = sdata['PLAYER NAME'][sdata.year == year].tolist()
+    return year, names[0], names[-1], sdata
+
+
+def _tree_files(path):
+    return sorted(os.path.join(root, x) for root, _, files in os.walk(path)
+                  for x in files)
+
+
+def test_aliased_players_are_merged(synthetic_tree):
+    dr = DataReader(synthetic_tree['data_path'], cache_max_bytes=None)
+    stat_ids = synthetic_tree['stat_ids']
+    year, best, worst, sdata = _same_year_players(dr, stat_ids[0])
+    p_id = dr.ids.add_alias(worst, best)
+
+    out = dr.build_stat_df(stat_ids)
+    assert not out.duplicated(['player_id', 'year']).any()
+    row = out[(out.player_id == p_id) & (out.year == year)]
+    rank_col = 'rank_{}'.format(stat_ids[0])
+    yr_ranks = sdata[sdata.year == year].set_index('PLAYER NAME')[rank_col]
+    assert row[rank_col].iloc[0] == np.float32(yr_ranks[[best, worst]].min())
+    pd.testing.assert_frame_equal(
+        out, dr.combine_stats([dr.load_stat(x) for x in stat_ids]))
+
+
+def test_alias_invalidates_build_cache(synthetic_tree):
+    dr = DataReader(synthetic_tree['data_path'])
+    stat_ids = synthetic_tree['stat_ids']
+    year, best, worst, _ = _same_year_players(dr, stat_ids[0])
+    before = dr.build_stat_df(stat_ids)
+    pd.testing.assert_frame_equal(dr.build_stat_df(stat_ids), before)
+    assert dr.build_cache.counts['hits'] == 1
+
+    p_id = dr.ids.add_alias(worst, best)
+    out = dr.build_stat_df(stat_ids)
+    assert dr.build_cache.counts['hits'] == 1
+    assert len(out) < len(before)
+    assert ((out.player_id == p_id) & (out.year == year)).sum() == 1
+    # A new reader on the same dictionary sees the alias and hits the cache
+    dr = DataReader(synthetic_tree['data_path'])
+    pd.testing.assert_frame_equal(dr.build_stat_df(stat_ids), out)
+    assert dr.build_cache.counts['hits'] == 1
+
+
+def _stats(rows):
+    return pd.DataFrame(rows, columns=['player_name', 'year', 'rank_1',
+                                       'rank_2'])
+
+
+def _results(rows):
+    return pd.DataFrame(rows, columns=['player_name', 'end_date', 'result'])
+
+
+def test_cache_path_leaves_data_path_untouched(synthetic_tree, tmp_path):
+    data_files = _tree_files(synthetic_tree['data_path'])
+    cache_path = str(tmp_path / 'cache')
+    dr = DataReader(synthetic_tree['data_path'], cache_path=cache_path)
+    assert dr.cache_stats()['entries'] == 0
+    assert not os.path.exists(cache_path)
+
+    dr.build_stat_df(synthetic_tree['stat_ids'])
+    assert _tree_files(synthetic_tree['data_path']) == data_files
+    assert os.path.isfile(os.path.join(cache_path, 'id_dictionary.sqlite'))
+    assert dr.cache_stats()['entries'] == 1
+    dr.build_cache.close()
+    dr.ids.close()
+
+    # Without a build cache only the id dictionary is written
+    no_cache = str(tmp_path / 'no_cache')
+    dr = DataReader(synthetic_tree['data_path'], cache_max_bytes=None,
+                    cache_path=no_cache)
+    dr.build_result_df(synthetic_tree['tourn_ids'])
+    assert os.listdir(no_cache) == ['id_dictionary.sqlite']
+
+
+def test_asof_join_uses_only_earlier_seasons():
+    stats = _stats([['a', 2009, 5., 6.], ['a', 2010, 1., 2.]])
+    results = _results([['a', '2010-06-01', 3], ['a', '2011-03-01', 4]])
+    out = asof_join_stats(results, stats).sort_values('end_date')
+    # 2010 stats are final at the end of 2010, after the June event
+    assert out.rank_1.tolist() == [5., 1.]
+    out = asof_join_stats(results, stats.assign(
+        snapshot_date=['2009-12-31', '2010-05-01']))
+    assert out.sort_values('end_date').rank_1.tolist() == [1., 1.]
+
+
+def test_asof_join_gap_limit():
+    stats = _stats([['a', 1990, 7., 8.], ['b', 2008, 3., np.nan],
+                    ['b', 2009, np.nan, 4.]])
+    results = _results([['a', '2010-06-01', 1], ['b', '2010-06-01', 2]])
+
+    def join(**kwargs):
+        out = asof_join_stats(results, stats, **kwargs)
+        return out.set_index('player_name')[['rank_1', 'rank_2']]
+    # Stats more than a season old are not attached by default
+    out = join()
+    assert out.loc['a'].isna().all()
+    assert np.isnan(out.loc['b', 'rank_1']) and out.loc['b', 'rank_2'] == 4.
+    out = join(max_gap=25)
+    assert out.loc['a'].tolist() == [7., 8.]
+    # Fill forward has no limit unless max_gap is passed
+    out = join(fill_forward=True)
+    assert out.loc['a'].tolist() == [7., 8.]
+    assert out.loc['b'].tolist() == [3., 4.]
+    out = join(fill_forward=True, max_gap=1)
+    assert out.loc['a'].isna().all()
+    assert np.isnan(out.loc['b', 'rank_1']) and out.loc['b', 'rank_2'] == 4.
+    out = join(fill_forward=True, max_gap=2)
+    assert out.loc['b'].tolist() == [3., 4.]
+
+
+def test_build_base_data_max_gap(synthetic_tree):
+    dr = DataReader(synthetic_tree['data_path'], cache_max_bytes=None)
+    stats = dr.build_stat_df(synthetic_tree['stat_ids'])
+    results = dr.build_result_df(synthetic_tree['tourn_ids'])
+    # Drop a middle season of stats so the next season's events only have
+    # stats two seasons old
+    gap_year = synthetic_tree['years'][1]
+    stats = stats[stats.year != gap_year]
+    base = dr.build_base_data(stats, results)
+    assert not (base.year == gap_year + 1).any()
+    base = dr.build_base_data(stats, results, max_gap=2)
+    assert (base.year == gap_year + 1).any()
+
+
+def test_backfill_stats_gap_and_inplace(synthetic_tree):
+    dr = DataReader(synthetic_tree['data_path'], cache_max_bytes=None)
+    dr_data = _stats([['a', 2000, 1., 5.], ['a', 2001, np.nan, np.nan],
+                      ['a', 2003, np.nan, 6.], ['b', 2001, np.nan, 2.]])
+    out = dr.backfill_stats(dr_data)
+    assert out.rank_1.tolist()[:3] == [1., 1., 1.]
+    assert np.isnan(out.rank_1.iloc[3])
+    assert out.rank_2.tolist() == [5., 5., 6., 2.]
+    out = dr.backfill_stats(dr_data, max_gap=1)
+    assert out.rank_1.tolist()[:2] == [1., 1.]
+    assert out.rank_1.iloc[2:].isna().all()
+    out = dr.backfill_stats(dr_data, stat_col='rank_1', max_gap=1)
+    assert out.rank_2.isna().sum() == 1
+    # inplace fills the input frame itself
+    shuffled = dr_data.iloc[::-1].copy()
+    assert dr.backfill_stats(shuffled, inplace=True) is shuffled
+    pd.testing.assert_frame_equal(shuffled, dr.backfill_stats(dr_data))
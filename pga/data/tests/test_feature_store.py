@@ -0,0 +1,78 @@
+import os
+import numpy as np
+import pandas as pd
+
+from workbench.projects.pga.data.data_reader import DataReader
+from workbench.projects.pga.data.feature_store import FeatureStore
+
+
+EV_SPECS = [('mean', 3), ('median', 5), ('max', 5), ('std', 4),
+            ('count', 5), ('last', 2), ('ewm', 5)]
+TOURN_SPECS = [('min', 3), ('ewm', 3)]
+
+
+def _base_data(tree):
+    dr = DataReader(tree['data_path'], cache_max_bytes=None)
+    results = dr.build_result_df(tree['tourn_ids'])
+    stats = dr.build_stat_df(tree['stat_ids'])
+    base = results.merge(stats, on=['player_id', 'player_name', 'year'],
+                         how='left')
+    base['result'] = base.result.astype(float)
+    # Null results exercise the skipped values of the windows and ewm
+    base.loc[base.index % 17 == 0, 'result'] = np.nan
+    base['end_date'] = pd.to_datetime(base.end_date)
+    return base
+
+
+def test_appended_season_matches_full_build(synthetic_tree, tmp_path):
+    base = _base_data(synthetic_tree)
+    last_year = synthetic_tree['years'][-1]
+    store_dir = str(tmp_path / 'features')
+    fs = FeatureStore(store_dir, EV_SPECS, TOURN_SPECS)
+    fs.build(base[base.year < last_year])
+    # Reload from disk and append the last season a week at a time
+    new_season = base[base.year == last_year]
+    for end_date in sorted(new_season.end_date.unique()):
+        fs = FeatureStore(store_dir, EV_SPECS, TOURN_SPECS)
+        fs.update(new_season[new_season.end_date == end_date])
+    assert os.path.isfile(fs.state_path)
+    assert len(fs.features) == len(base)
+    assert fs.verify(base)
+
+    full = FeatureStore(str(tmp_path / 'full'), EV_SPECS, TOURN_SPECS)
+    full.build(base)
+    pd.testing.assert_frame_equal(fs.features, full.features,
+                                  check_dtype=False, check_categorical=False)
+
+    row = fs.features.ev_perf_mean_3.last_valid_index()
+    fs.features.loc[row, 'ev_perf_mean_3'] += 1.
+    assert not fs.verify(base)
+
+
+def test_renamed_player_keeps_state(synthetic_tree, tmp_path):
+    base = _base_data(synthetic_tree)
+    last_year = synthetic_tree['years'][-1]
+    player_id = base.player_id.iloc[0]
+    # The last season reports the player under a new name with the same id
+    renamed = base.copy()
+    renamed['player_name'] = renamed.player_name.astype(str)
+    renamed.loc[(renamed.player_id == player_id) &
+                (renamed.year == last_year), 'player_name'] = 'Renamed Player'
+    store_dir = str(tmp_path / 'features')
+    fs = FeatureStore(store_dir, EV_SPECS, TOURN_SPECS)
+    fs.build(renamed[renamed.year < last_year])
+    new_season = renamed[renamed.year == last_year]
+    for end_date in sorted(new_season.end_date.unique()):
+        fs.update(new_season[new_season.end_date == end_date])
+    assert 'player_id' in fs.features.columns
+    assert fs.verify(renamed)
+
+    full = FeatureStore(str(tmp_path / 'full'), EV_SPECS, TOURN_SPECS)
+    full.build(base)
+    feats = fs.features.drop(columns='player_name')
+    pd.testing.assert_frame_equal(feats,
+                                  full.features.drop(columns='player_name'),
+                                  check_dtype=False, check_categorical=False)
+    player = fs.features[fs.features.player_id == player_id]
+    assert (player.player_name[player.year == last_year] ==
+            'Renamed Player').all()
@@ -0,0 +1,62 @@
+import os
+import pytest
+
+from workbench.projects.pga.data.html_parsers import (read_page,
+                                                      read_page_text)
+from workbench.projects.pga.data.synthetic import (STAT_HEADER, event_page,
+                                                   stat_page)
+
+
+SCRIPT = '<script>var rank = "99";</script><style>td {color: red}</style>'
+STAT_ROWS = [['1', '', 'Player A', '60', SCRIPT + '71.20'],
+             ['T2', '3', 'Player B' + SCRIPT, '55', '71.50'],
+             ['T2', '', SCRIPT + 'Player C', '50', '71.50']]
+EVENT_ROWS = [['Player A', '1', 68, 70, 69, 71, 278, -10, '$1,000,000',
+               500],
+              ['Player B' + SCRIPT, 'CUT', 74, 75, '--', '--', 149, 5, '',
+               SCRIPT]]
+
+
+def _write(tmp_path, name, html):
+    path = str(tmp_path / name)
+    with open(path, 'w', encoding='utf-8') as h_fl:
+        h_fl.write(html)
+    return path
+
+
+def _parse(path, backend, keys):
+    parsers, page = read_page(path, backend)
+    return [parsers[k](page) for k in keys]
+
+
+@pytest.mark.parametrize('keys,html', [
+    (['stat_table'], stat_page('Stat', [2019], STAT_ROWS)),
+    (['event_table', 'event_meta'],
+     event_page('Event', [2019], ('03/10/2019', 72, 'Links' + SCRIPT),
+                EVENT_ROWS)),
+])
+def test_backends_match_with_scripts_in_cells(tmp_path, keys, html):
+    path = _write(tmp_path, 'page.html', html)
+    lxml_out = _parse(path, 'lxml', keys)
+    assert lxml_out == _parse(path, 'bs4', keys)
+    assert 'var rank' not in str(lxml_out)
+    parsers, page = read_page_text(html, 'lxml')
+    assert [parsers[k](page) for k in keys] == lxml_out
+
+
+def test_backends_match_on_synthetic_tree(synthetic_tree):
+    for kind, keys in [('stats', ['stat_table']),
+                       ('events', ['event_table', 'event_meta'])]:
+        html_base = os.path.join(synthetic_tree['data_path'], kind, 'html')
+        for root, _, fls in os.walk(html_base):
+            for fl in fls:
+                path = os.path.join(root, fl)
+                assert _parse(path, 'lxml', keys) == \
+                    _parse(path, 'bs4', keys)
+
+
+def test_script_text_is_dropped():
+    parsers, page = read_page_text(stat_page('Stat', [2019], STAT_ROWS))
+    assert parsers['stat_table'](page) == \
+        [STAT_HEADER] + [[c.replace(SCRIPT, '') for c in r]
+                         for r in STAT_ROWS]
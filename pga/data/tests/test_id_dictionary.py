@@ -0,0 +1,29 @@
+import numpy as np
+
+from workbench.projects.pga.data.id_dictionary import IdDictionary
+
+
+def test_shared_dictionary_assigns_new_players_once(tmp_path):
+    db_path = str(tmp_path / 'ids.sqlite')
+    first, second = IdDictionary(db_path), IdDictionary(db_path)
+    first_ids = first.player_ids(['Tiger Woods', 'New Player'])
+    # second loaded before either player existed
+    second_ids = second.player_ids(['New Player', 'Tiger Woods', 'Other'])
+    assert second_ids[0] == first_ids[1] and second_ids[1] == first_ids[0]
+    assert first.player_ids(['other'])[0] == second_ids[2]
+    assert first.player_names(second_ids).tolist() == [
+        'New Player', 'Tiger Woods', 'Other']
+    assert np.array_equal(first.tourn_keys(['5', '7']),
+                          second.tourn_keys(['5', '7']))
+    assert IdDictionary(db_path).player_ids(['x'], add=False)[0] == -1
+
+
+def test_version_sees_aliases_from_other_processes(tmp_path):
+    db_path = str(tmp_path / 'ids.sqlite')
+    first, second = IdDictionary(db_path), IdDictionary(db_path)
+    p_ids = second.player_ids(['Davis Love III', 'Davis Love'])
+    version = second.version()
+    first.add_alias('Davis Love', 'Davis Love III')
+    assert first.version() != version
+    assert second.version() == first.version()
+    assert second.player_ids(['Davis Love'])[0] == p_ids[0]
@@ -0,0 +1,12 @@
+import pytest
+
+from workbench.projects.pga.data.benchmarks import (HEAVY_MODULES,
+                                                    READ_MODULES,
+                                                    check_imports)
+
+
+@pytest.mark.parametrize('module', READ_MODULES)
+def test_read_path_skips_heavy_imports(module):
+    # Each module is imported in a fresh interpreter under -X importtime
+    heavy = ('aiohttp', 'bs4', 'lxml', 'numba') + HEAVY_MODULES
+    assert check_imports([module], heavy)[module]['heavy'] == []
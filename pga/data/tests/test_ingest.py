@@ -0,0 +1,93 @@
+import os
+import threading
+import pytest
+import pandas as pd
+from aiohttp import web
+
+from workbench.projects.pga.data.crawler import Crawler
+from workbench.projects.pga.data.event_downloader import EventDownloader
+from workbench.projects.pga.data.ingest import EventIngest, parse_event_page
+from workbench.projects.pga.data.synthetic import event_page
+
+
+ROWS = [['Player{} Synth{}'.format(i, i), str(i + 1), 68, 70, 69, 71, 278,
+         -10, '$1,000', 50] for i in range(5)]
+# A row with more cells than headers fails in the csv reader
+BAD_ROWS = ROWS[:2] + [ROWS[2] + ['extra']] + ROWS[3:]
+
+
+def _page(rows, year):
+    return event_page('Event', [year], ('03/10/{}'.format(year), 72,
+                                        'Links'), rows).encode()
+
+
+@pytest.fixture
+def event_site(serve_app):
+    async def event(request):
+        return web.Response(body=_page(ROWS, int(request.match_info['year'])))
+
+    async def malformed(request):
+        return web.Response(body=_page(BAD_ROWS, 2030))
+    app = web.Application()
+    app.router.add_get('/event/{t_id}/{year}', event)
+    app.router.add_get('/malformed', malformed)
+    return serve_app(app)
+
+
+def _run(ingest, jobs, timeout=60):
+    '''
+    Run an ingest on a thread so a hang fails the test instead of blocking
+    '''
+    out = {}
+
+    def run():
+        try:
+            out['report'] = ingest.run(jobs)
+        except Exception as err:
+            out['error'] = err
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'ingest did not finish'
+    return out
+
+
+def _ingest(synthetic_tree):
+    ed = EventDownloader(os.path.join(synthetic_tree['data_path'], 'events'),
+                         research=True)
+    # Small queues and batches so the jobs back up behind them
+    return ed, EventIngest(ed, Crawler(backoff=0.001, max_concurrency=4),
+                           queue_size=2, batch_events=4)
+
+
+def test_malformed_page_is_reported(synthetic_tree, event_site):
+    with pytest.raises(pd.errors.ParserError):
+        parse_event_page(_page(BAD_ROWS, 2030))
+    ed, ingest = _ingest(synthetic_tree)
+    years = list(range(2010, 2020))
+    jobs = [(t_id, yr, event_site('/event/{}/{}'.format(t_id, yr)))
+            for t_id in synthetic_tree['tourn_ids'] for yr in years]
+    bad_url = event_site('/malformed')
+    jobs.insert(5, (synthetic_tree['tourn_ids'][0], 2030, bad_url))
+
+    report = _run(ingest, jobs)['report']
+    assert report['no_data'] == [bad_url]
+    assert report['failed'] == []
+    assert report['n_events'] == len(jobs) - 1
+    for t_id in synthetic_tree['tourn_ids']:
+        stored = ed.store.read_partition(t_id)
+        assert set(years).issubset(stored.year.unique())
+        assert 2030 not in stored.year.values
+
+
+def test_failed_stage_stops_the_run(synthetic_tree, event_site):
+    ed, ingest = _ingest(synthetic_tree)
+
+    def write_batch(batch):
+        raise IOError('store unavailable')
+    ingest.write_batch = write_batch
+    jobs = [(t_id, yr, event_site('/event/{}/{}'.format(t_id, yr)))
+            for t_id in synthetic_tree['tourn_ids']
+            for yr in range(2010, 2020)]
+    out = _run(ingest, jobs)
+    assert isinstance(out['error'], IOError)
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from workbench.projects.pga.data.feature_creator import rolling_features
+from workbench.projects.pga.data.kernels import (KERNEL_FUNCS, _get_kernel,
+                                                 _rolling_loop,
+                                                 _rolling_numpy,
+                                                 group_offsets)
+
+
+SPECS = [(f, w) for f in KERNEL_FUNCS for w in (1, 3, 5)]
+
+
+@pytest.fixture
+def grouped_data():
+    # Group sizes from 1 row up to well past the widest window, with nulls
+    rng = np.random.RandomState(0)
+    sizes = [1, 2, 3, 4, 5, 6, 11, 1, 2]
+    players = np.repeat(['p{}'.format(i) for i in range(len(sizes))], sizes)
+    values = rng.normal(size=len(players)).round(1)
+    values[rng.rand(len(values)) < 0.25] = np.nan
+    # A group that is all null
+    values[players == 'p2'] = np.nan
+    return pd.DataFrame({'player_name': players, 'result': values})
+
+
+@pytest.mark.parametrize('kernel', ['numba', 'numpy', 'python'])
+def test_kernel_matches_pandas(grouped_data, monkeypatch, kernel):
+    import workbench.projects.pga.data.kernels as kernels
+    if kernel == 'numba':
+        pytest.importorskip('numba')
+        kernels._rolling_kernel = None
+        assert _get_kernel() is not _rolling_loop
+    else:
+        monkeypatch.setattr(kernels, '_rolling_kernel', dict(
+            numpy=_rolling_numpy, python=_rolling_loop)[kernel])
+    out = rolling_features(grouped_data, 'result', SPECS, engine='kernel')
+    expected = rolling_features(grouped_data, 'result', SPECS,
+                                engine='pandas')
+    pd.testing.assert_frame_equal(out, expected, check_dtype=False)
+
+
+def test_numpy_matches_loop():
+    rng = np.random.RandomState(1)
+    codes = np.repeat(np.arange(50), rng.randint(1, 12, size=50))
+    values = rng.normal(size=len(codes))
+    values[rng.rand(len(values)) < 0.3] = np.nan
+    offsets = group_offsets(codes)
+    func_codes = np.arange(len(KERNEL_FUNCS), dtype=np.int64)
+    for window in (1, 4, 15):
+        np.testing.assert_allclose(
+            _rolling_numpy(values, offsets, window, func_codes),
+            _rolling_loop(values, offsets, window, func_codes))
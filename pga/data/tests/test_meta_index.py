@@ -0,0 +1,83 @@
+import os
+import shutil
+
+from workbench.projects.pga.data import event_downloader
+from workbench.projects.pga.data.event_downloader import EventDownloader
+from workbench.projects.pga.data.stat_downloader import StatDownloader
+
+
+def _event_ids(ed):
+    return {(e['tourn_id'], int(e['year'])): int(e_id)
+            for e_id, e in ed.event_meta.items()}
+
+
+def _spy(monkeypatch, module, name, calls):
+    func = getattr(module, name)
+
+    def spy(path, *args):
+        calls.append(path)
+        return func(path, *args)
+    monkeypatch.setattr(module, name, spy)
+
+
+def test_rebuild_keeps_event_ids_and_skips_unchanged(synthetic_tree,
+                                                    monkeypatch):
+    events_dir = os.path.join(synthetic_tree['data_path'], 'events')
+    ed = EventDownloader(events_dir, research=True)
+    seeded = _event_ids(ed)
+    ed.build_update_meta_files()
+    assert _event_ids(ed) == seeded
+
+    # Add a new season of one tournament
+    t_id = synthetic_tree['tourn_ids'][1]
+    label = ed.tourn_meta[t_id]['tourn_label']
+    last_year = synthetic_tree['years'][-1]
+    for kind, ext in [('csv', 'csv'), ('meta', 'json')]:
+        base = os.path.join(events_dir, kind, label)
+        shutil.copy(os.path.join(base, '{}.{}'.format(last_year, ext)),
+                    os.path.join(base, '{}.{}'.format(last_year + 1, ext)))
+
+    listed, read = [], []
+    _spy(monkeypatch, os, 'listdir', listed)
+    _spy(monkeypatch, event_downloader, 'read_event_meta', read)
+    ed = EventDownloader(events_dir, research=True)
+    ed.build_update_meta_files()
+    new_ids = _event_ids(ed)
+    new_id = new_ids.pop((t_id, last_year + 1))
+    assert new_ids == seeded
+    assert new_id == max(seeded.values()) + 1
+    assert ed.tourn_meta[t_id]['max_year'] == last_year + 1
+    # Only the changed tournament is listed and only its new sidecar read
+    csv_base = os.path.join(events_dir, 'csv')
+    assert [x for x in listed if x.startswith(csv_base)] == \
+        [os.path.join(csv_base, label)]
+    assert read == [os.path.join(events_dir, 'meta', label,
+                                 '{}.json'.format(last_year + 1))]
+
+    del listed[:], read[:]
+    ed = EventDownloader(events_dir, research=True)
+    ed.build_update_meta_files()
+    new_ids[(t_id, last_year + 1)] = new_id
+    assert _event_ids(ed) == new_ids
+    assert [x for x in listed if x.startswith(csv_base)] == []
+    assert read == []
+
+
+def test_stat_meta_skips_unchanged(synthetic_tree, monkeypatch):
+    sd = StatDownloader(os.path.join(synthetic_tree['data_path'], 'stats'),
+                        research=True)
+    sd.update_meta_file()
+    s_id = synthetic_tree['stat_ids'][0]
+    assert sd.stat_meta[s_id]['n_files'] == len(synthetic_tree['years'])
+    csv_dir = os.path.join(sd.csv_base, sd.stat_meta[s_id]['stat_label'])
+    os.remove(os.path.join(csv_dir, '{}.csv'.format(
+        synthetic_tree['years'][0])))
+
+    listed = []
+    _spy(monkeypatch, os, 'listdir', listed)
+    sd = StatDownloader(os.path.join(synthetic_tree['data_path'], 'stats'),
+                        research=True)
+    sd.update_meta_file()
+    assert listed == [csv_dir]
+    assert sd.stat_meta[s_id]['n_files'] == len(synthetic_tree['years']) - 1
+    assert sd.stat_meta[s_id]['min_year'] == synthetic_tree['years'][1]
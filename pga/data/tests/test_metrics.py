@@ -0,0 +1,80 @@
+import json
+import urllib.request
+import pytest
+
+from workbench.projects.pga.data.metrics import Metrics
+
+
+@pytest.fixture
+def metrics():
+    metrics = Metrics(buckets=(0.1, 1.))
+    metrics.inc('pages_parsed', 3, source='events')
+    metrics.inc('pages_parsed', 2, source='events')
+    metrics.inc('pages_parsed', source='stats')
+    metrics.inc('parse_failures', source='a "quoted"\\path\nnext')
+    for value in (0.05, 0.5, 2.):
+        metrics.observe('parse_seconds', value, source='events')
+    with pytest.raises(ValueError):
+        with metrics.timer('build', frame='stat'):
+            raise ValueError('failed build')
+    return metrics
+
+
+def test_report_totals(metrics, tmp_path):
+    report = metrics.report()
+    assert report['counters'] == {
+        'pages_parsed{source="events"}': 5,
+        'pages_parsed{source="stats"}': 1,
+        'parse_failures{source="a \\"quoted\\"\\\\path\\nnext"}': 1,
+        'stage_failures{frame="stat",stage="build"}': 1}
+    hist = report['histograms']['parse_seconds{source="events"}']
+    assert hist['count'] == 3
+    assert hist['sum'] == pytest.approx(2.55)
+    assert hist['mean'] == pytest.approx(0.85)
+    assert (hist['min'], hist['max']) == (0.05, 2.)
+    assert hist['buckets'] == {'0.1': 1, '1.0': 2}
+    stage = report['histograms']['stage_seconds{frame="stat",stage="build"}']
+    assert stage['count'] == 1
+
+    metrics.write_report(str(tmp_path / 'report.json'))
+    with open(str(tmp_path / 'report.json')) as r_fl:
+        assert json.load(r_fl)['counters'] == report['counters']
+    metrics.reset()
+    assert metrics.report()['counters'] == {}
+
+
+def test_prometheus_exposition(metrics, tmp_path):
+    text = metrics.to_prometheus()
+    lines = text.splitlines()
+    assert text.endswith('\n')
+    assert [x for x in lines if x.startswith('# TYPE')] == [
+        '# TYPE pga_pages_parsed_total counter',
+        '# TYPE pga_parse_failures_total counter',
+        '# TYPE pga_stage_failures_total counter',
+        '# TYPE pga_parse_seconds histogram',
+        '# TYPE pga_stage_seconds histogram']
+    assert 'pga_pages_parsed_total{source="events"} 5' in lines
+    assert 'pga_parse_failures_total{source="a \\"quoted\\"\\\\path' \
+        '\\nnext"} 1' in lines
+    assert [x for x in lines if x.startswith('pga_parse_seconds')] == [
+        'pga_parse_seconds_bucket{le="0.1",source="events"} 1',
+        'pga_parse_seconds_bucket{le="1.0",source="events"} 2',
+        'pga_parse_seconds_bucket{le="+Inf",source="events"} 3',
+        'pga_parse_seconds_sum{source="events"} 2.55',
+        'pga_parse_seconds_count{source="events"} 3']
+    # Every sample line is a series name and a number
+    for line in lines:
+        if not line.startswith('#'):
+            float(line.rsplit(' ', 1)[1])
+
+    prom_path = str(tmp_path / 'pga.prom')
+    metrics.write_prometheus(prom_path)
+    with open(prom_path) as p_fl:
+        assert p_fl.read() == text
+    server = metrics.serve_prometheus(port=0)
+    try:
+        url = 'http://127.0.0.1:{}/metrics'.format(server.server_address[1])
+        with urllib.request.urlopen(url, timeout=10) as resp:
+            assert resp.read().decode('utf-8') == text
+    finally:
+        server.shutdown()
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from workbench.projects.pga.data.normalize import (normalize_positions,
+                                                   normalize_stat_ranks)
+
+
+def test_missing_stat_ranks_stay_missing():
+    yr_data = pd.DataFrame({'RANK THIS WEEK': ['1', 'T2', 'T2', '4'],
+                            'RANK LAST WEEK': ['3', np.nan, '1', ''],
+                            'PLAYER NAME': list('abcd')})
+    normalize_stat_ranks(yr_data)
+    assert yr_data['RANK THIS WEEK'].tolist() == [1, 2, 2, 4]
+    assert yr_data['RANK THIS WEEK TIED'].tolist() == [False, True, True,
+                                                       False]
+    assert str(yr_data['RANK LAST WEEK'].dtype) == 'Int32'
+    assert yr_data['RANK LAST WEEK'].isna().tolist() == [False, True, False,
+                                                         True]
+    assert yr_data['RANK LAST WEEK STATUS'].tolist() == [
+        'ranked', 'missing', 'ranked', 'missing']
+    assert (yr_data['RANK THIS WEEK STATUS'] == 'ranked').all()
+
+
+def test_positions_keep_status():
+    ev_data = pd.DataFrame({'POS': ['1', 'T2', 'T2', 'CUT', 'W/D', np.nan]})
+    normalize_positions(ev_data)
+    assert ev_data.POS.tolist() == [1, 2, 2, 4, 4, 4]
+    assert ev_data.POS_status.tolist() == ['made_cut'] * 3 + \
+        ['CUT', 'WD', 'unknown']
@@ -0,0 +1,82 @@
+import os
+import shutil
+import pandas as pd
+import pytest
+
+from workbench.projects.pga.data.stat_downloader import StatDownloader
+from workbench.projects.pga.data.event_downloader import EventDownloader
+
+
+def _downloaders(data_path):
+    sd = StatDownloader(os.path.join(data_path, 'stats'), research=True)
+    ed = EventDownloader(os.path.join(data_path, 'events'), research=True)
+    return sd, sd.stat_meta, ed, ed.tourn_meta
+
+
+def test_store_matches_csv(synthetic_tree):
+    sd, _, ed, _ = _downloaders(synthetic_tree['data_path'])
+    sd.build_parquet_store()
+    ed.build_parquet_store()
+    for s_id in synthetic_tree['stat_ids']:
+        pd.testing.assert_frame_equal(sd.load_csv(s_id),
+                                      sd.load_csv(s_id, use_store=False))
+    for t_id in synthetic_tree['tourn_ids']:
+        pd.testing.assert_frame_equal(ed.load_csv(t_id),
+                                      ed.load_csv(t_id, use_store=False))
+
+
+@pytest.mark.parametrize('kind', ['stats', 'events'])
+def test_csv_years_after_migration_are_loaded(synthetic_tree, tmp_path,
+                                              kind):
+    sd, stat_meta, ed, tourn_meta = _downloaders(synthetic_tree['data_path'])
+    if kind == 'stats':
+        dl, part_id = sd, synthetic_tree['stat_ids'][0]
+        label = stat_meta[part_id]['stat_label']
+    else:
+        dl, part_id = ed, synthetic_tree['tourn_ids'][0]
+        label = tourn_meta[part_id]['tourn_label']
+    last_year = synthetic_tree['years'][-1]
+    csv_path = os.path.join(dl.csv_base, label, '{}.csv'.format(last_year))
+    # Migrate without the last year, then process it as a new csv
+    shutil.move(csv_path, str(tmp_path / 'held.csv'))
+    dl.build_parquet_store([part_id])
+    shutil.move(str(tmp_path / 'held.csv'), csv_path)
+
+    out = dl.load_csv(part_id)
+    assert sorted(out.year.unique()) == synthetic_tree['years']
+    pd.testing.assert_frame_equal(out, dl.load_csv(part_id, use_store=False))
+    pd.testing.assert_frame_equal(
+        dl.load_csv(part_id, year=last_year),
+        dl.load_csv(part_id, year=last_year, use_store=False))
+    pd.testing.assert_frame_equal(
+        dl.load_csv(part_id, min_year=last_year - 1),
+        dl.load_csv(part_id, min_year=last_year - 1, use_store=False))
+
+
+@pytest.mark.parametrize('kind', ['stats', 'events'])
+def test_reprocessed_csv_year_replaces_store(synthetic_tree, kind):
+    sd, stat_meta, ed, tourn_meta = _downloaders(synthetic_tree['data_path'])
+    if kind == 'stats':
+        dl, part_id = sd, synthetic_tree['stat_ids'][0]
+        label = stat_meta[part_id]['stat_label']
+    else:
+        dl, part_id = ed, synthetic_tree['tourn_ids'][0]
+        label = tourn_meta[part_id]['tourn_label']
+    last_year = synthetic_tree['years'][-1]
+    csv_path = os.path.join(dl.csv_base, label, '{}.csv'.format(last_year))
+    dl.build_parquet_store([part_id])
+    # Re-process the stored year as a shorter csv
+    pd.read_csv(csv_path).head(3).to_csv(csv_path, index=False)
+    part_mtime = os.path.getmtime(dl.store.partition_path(part_id))
+    os.utime(csv_path, (part_mtime + 1, part_mtime + 1))
+
+    out = dl.load_csv(part_id)
+    assert (out.year == last_year).sum() == 3
+    assert sorted(out.year.unique()) == synthetic_tree['years']
+    pd.testing.assert_frame_equal(out, dl.load_csv(part_id, use_store=False))
+    pd.testing.assert_frame_equal(
+        dl.load_csv(part_id, year=last_year),
+        dl.load_csv(part_id, year=last_year, use_store=False))
+    # Earlier years still come from the store
+    assert dl.store.fresh_years(part_id, os.path.dirname(csv_path)) == \
+        set(synthetic_tree['years'][:-1])
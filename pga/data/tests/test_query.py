@@ -0,0 +1,82 @@
+import os
+import pandas as pd
+
+from workbench.projects.pga.data.data_reader import DataReader
+from workbench.projects.pga.data.feature_creator import FeatureCreator
+
+
+SPECS = [('mean', 3), ('max', 5)]
+
+
+def _eager(dr, stat_ids, tourn_ids, min_year=None):
+    base = dr.build_base_data(dr.build_stat_df(stat_ids, min_year),
+                              dr.build_result_df(tourn_ids, min_year),
+                              backfill_stats=True)
+    fc = FeatureCreator(base)
+    fc.rolling_performance(SPECS)
+    return fc.data
+
+
+def _query(dr, stat_ids, tourn_ids):
+    return dr.query().stats(stat_ids).events(tourn_ids) \
+        .asof_join(backfill=True).features(SPECS)
+
+
+def _count_loads(dr, monkeypatch):
+    loads = []
+    load_stat = dr.load_stat
+
+    def counted(*args):
+        loads.append(args[0])
+        return load_stat(*args)
+    monkeypatch.setattr(dr, 'load_stat', counted)
+    return loads
+
+
+def test_query_matches_eager_build(synthetic_tree, monkeypatch):
+    dr = DataReader(synthetic_tree['data_path'], cache_max_bytes=None)
+    stat_ids, tourn_ids = synthetic_tree['stat_ids'], \
+        synthetic_tree['tourn_ids']
+    loads = _count_loads(dr, monkeypatch)
+    query = _query(dr, stat_ids, tourn_ids)
+    pd.testing.assert_frame_equal(query.collect(),
+                                  _eager(dr, stat_ids, tourn_ids))
+    assert sorted(loads) == sorted(stat_ids)
+
+    # A later since() and a stat subset are served from the cache
+    min_year = synthetic_tree['years'][1]
+    out = query.since(min_year).collect()
+    pd.testing.assert_frame_equal(out, _eager(dr, stat_ids, tourn_ids,
+                                              min_year))
+    out = _query(dr, stat_ids[:2], tourn_ids).select(
+        ['player_name', 'end_date', 'rank_{}'.format(stat_ids[0])]).collect()
+    assert list(out.columns) == ['player_name', 'end_date',
+                                 'rank_{}'.format(stat_ids[0])]
+    assert len(loads) == len(stat_ids)
+
+
+def test_changed_source_invalidates_cache(synthetic_tree, monkeypatch):
+    dr = DataReader(synthetic_tree['data_path'], cache_max_bytes=None)
+    stat_ids, tourn_ids = synthetic_tree['stat_ids'], \
+        synthetic_tree['tourn_ids']
+    loads = _count_loads(dr, monkeypatch)
+    before = _query(dr, stat_ids, tourn_ids).collect()
+
+    # Re-process a season of one stat with fewer players
+    label = dr.stat_manager.stat_meta[stat_ids[0]]['stat_label']
+    csv_path = os.path.join(dr.stat_manager.csv_base, label, '{}.csv'.format(
+        synthetic_tree['years'][-2]))
+    pd.read_csv(csv_path).head(5).to_csv(csv_path, index=False)
+    mtime = os.path.getmtime(csv_path) + 1
+    os.utime(csv_path, (mtime, mtime))
+
+    after = _query(dr, stat_ids, tourn_ids).collect()
+    assert len(loads) == 2 * len(stat_ids)
+    assert not after.equals(before)
+    pd.testing.assert_frame_equal(after, _eager(dr, stat_ids, tourn_ids))
+
+    # Aliasing players changes their ids
+    names = after.player_name.astype(str).unique()
+    dr.ids.add_alias(names[0], names[1])
+    _query(dr, stat_ids, tourn_ids).collect()
+    assert len(loads) == 3 * len(stat_ids)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from workbench.projects.pga.data.data_reader import DataReader
+
+
+@pytest.fixture
+def stat_tensor(synthetic_tree, tmp_path):
+    dr = DataReader(synthetic_tree['data_path'], cache_max_bytes=None)
+    stat_data = dr.build_stat_df(synthetic_tree['stat_ids'],
+                                 drop_prev_cols=False)
+    # Leave some players out of a season so the tensor has empty cells
+    stat_data = stat_data[(stat_data.index % 7 != 0) |
+                          (stat_data.year == stat_data.year.min())]
+    tensor_dir = str(tmp_path / 'tensor')
+    shape = dr.export_stat_tensor(stat_data, tensor_dir)
+    return stat_data, shape, dr.load_stat_tensor(tensor_dir)
+
+
+def test_values_match_panel(stat_tensor):
+    stat_data, _, tensor = stat_tensor
+    rank_cols = [x for x in stat_data.columns if x.find('rank_') >= 0]
+    assert tensor.stats == rank_cols
+    panel = stat_data.set_index(['player_id', 'year'])[rank_cols]
+    for (p_id, year), row in panel.sample(10, random_state=0).iterrows():
+        p_pos = tensor.player_index([p_id])[0]
+        y_pos = year - tensor.seasons[0]
+        for st_pos, col in enumerate(rank_cols):
+            np.testing.assert_equal(tensor.values[p_pos, y_pos, st_pos],
+                                    np.float32(row[col]))
+    # Every (player, season) missing from the panel is all nan
+    present = np.zeros(tensor.shape[:2], dtype=bool)
+    present[tensor.player_index(panel.index.get_level_values(0).values),
+            panel.index.get_level_values(1).values - tensor.seasons[0]] = True
+    assert not present.all()
+    assert np.isnan(tensor.values[~present]).all()
+    assert np.count_nonzero(~np.isnan(tensor.values)) == \
+        panel.notna().values.sum()
+
+
+def test_reopens_read_only(stat_tensor):
+    stat_data, shape, tensor = stat_tensor
+    assert tensor.shape == tuple(shape)
+    assert not tensor.values.flags.writeable
+    with pytest.raises(ValueError):
+        tensor.values[0, 0, 0] = 1.
+    assert tensor.player_ids.tolist() == sorted(stat_data.player_id.unique())
+    names = dict(zip(stat_data.player_id, stat_data.player_name.astype(str)))
+    assert tensor.player_names.tolist() == [names[x]
+                                            for x in tensor.player_ids]
+    assert tensor.seasons.tolist() == sorted(stat_data.year.unique())
+    with pytest.raises(KeyError):
+        tensor.player_index([-1])
+
+
+def test_select_views(stat_tensor):
+    _, _, tensor = stat_tensor
+    seasons = tensor.seasons
+    values, sel_seasons, stats = tensor.select(tensor.stats[1:3],
+                                               min_year=seasons[1])
+    assert sel_seasons.tolist() == seasons[1:].tolist()
+    assert stats == tensor.stats[1:3]
+    assert np.shares_memory(values, tensor.values)
+    values, _, stats = tensor.select([tensor.stats[2], tensor.stats[0]],
+                                     max_year=seasons[1])
+    assert stats == [tensor.stats[2], tensor.stats[0]]
+    np.testing.assert_array_equal(values[..., 1], tensor.values[:, :2, 0])